@@ -2,7 +2,7 @@
 The cluster configuration management command actions and options.
 """
 import commands.mgr.parser as mp
-from core.objects.svc import ACTION_ASYNC
+from core.objects.actions import ACTION_ASYNC
 from utilities.optparser import OptParser
 
 PROG = "om cluster"
@@ -988,6 +988,10 @@ ACTIONS = {
                 OPT.tag,
             ],
         },
+        "collector_stats": {
+            "msg": "Display the latency histograms of the xmlrpc calls to the "
+                   "collector and the connection pool counters of the daemon.",
+        },
         "collector_search": {
             "msg": "Report the collector objects matching :opt:`--like "
                    "[<type>:]<substring>`, where ``<type>`` is the object type "
@@ -3,7 +3,7 @@ The namespace configuration management command actions and options.
 """
 import commands.mgr.parser as mp
 import commands.svc.parser as svcp
-from core.objects.svc import ACTION_ASYNC
+from core.objects.actions import ACTION_ASYNC
 from utilities.optparser import OptParser
 
 PROG = "om nscfg"
@@ -4,7 +4,7 @@ Secret management command actions and options
 import commands.mgr.parser as mp
 from utilities.optparser import OptParser, Option
 from utilities.storage import Storage
-from core.objects.svc import ACTION_ASYNC
+from core.objects.actions import ACTION_ASYNC
 
 PROG = "om sec"
 
@@ -328,6 +328,12 @@ class CollectorActions(object):
                 e_id = _d["fmt"]["id"] % e
                 print(" %s: %s" % (e_id, e_name))
 
+    def collector_stats(self):
+        data = self.node._daemon_status(silent=True)
+        if not data or "collector" not in data:
+            raise ex.Error("the daemon collector thread is not running")
+        return data["collector"].get("xmlrpc", {}).get("stats", {})
+
     def collector_log(self):
         rpath = "/logs"
         data = {
@@ -1,11 +1,14 @@
 from __future__ import print_function
 
+import bisect
+import copy
 import logging
 import logging.handlers
 import os
 import random
 import socket
 import sys
+import threading
 import time
 from datetime import datetime
 
@@ -29,12 +32,197 @@ try:
 except ImportError:
     import xmlrpc.client as xmlrpclib
 
-def get_proxy(uri):
+# The size above which the request bodies are gzip-encoded, when the
+# node.dbcompression keyword is set.
+GZIP_THRESHOLD = 1024
+
+# The max number of idle connections kept open per collector, and the
+# delay after which an idle connection is closed instead of reused.
+POOL_MAX_IDLE = 4
+POOL_IDLE_TIMEOUT = 60
+
+# The upper bounds of the calls latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ConnectionPool(object):
+    """
+    The idle keep-alive connections to the collectors, shared by all the
+    proxies and threads of the process.
+    """
+    def __init__(self, max_idle=POOL_MAX_IDLE, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle = {}
+        self.created = 0
+        self.reused = 0
+
+    def get(self, key):
+        """
+        Return an idle connection to <key>, or None if the caller must open
+        a new connection.
+        """
+        now = time.time()
+        stale = []
+        conn = None
+        with self.lock:
+            conns = self.idle.get(key, [])
+            while conns:
+                _conn, last = conns.pop()
+                if now - last < self.idle_timeout:
+                    conn = _conn
+                    self.reused += 1
+                    break
+                stale.append(_conn)
+            else:
+                self.created += 1
+        for _conn in stale:
+            _conn.close()
+        return conn
+
+    def put(self, key, conn):
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) < self.max_idle:
+                conns.append((conn, time.time()))
+                return
+        conn.close()
+
+    def status(self):
+        with self.lock:
+            return {
+                "idle": sum(len(conns) for conns in self.idle.values()),
+                "created": self.created,
+                "reused": self.reused,
+            }
+
+
+class CallStats(object):
+    """
+    The latency histograms of the collector calls done by the process,
+    indexed by remote function name.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def add(self, fn, duration, error=False):
+        with self.lock:
+            if fn not in self.calls:
+                self.calls[fn] = {
+                    "count": 0,
+                    "errors": 0,
+                    "time": 0.0,
+                    "histogram": [0] * (len(self.buckets) + 1),
+                }
+            data = self.calls[fn]
+            data["count"] += 1
+            data["time"] += duration
+            data["histogram"][bisect.bisect_left(self.buckets, duration)] += 1
+            if error:
+                data["errors"] += 1
+
+    def dump(self):
+        labels = ["%g" % bucket for bucket in self.buckets] + ["+Inf"]
+        with self.lock:
+            return dict((fn, {
+                "count": data["count"],
+                "errors": data["errors"],
+                "avg": data["time"] / data["count"],
+                "histogram": dict(zip(labels, data["histogram"])),
+            }) for fn, data in self.calls.items())
+
+
+POOL = ConnectionPool()
+STATS = CallStats()
+
+
+def stats():
+    """
+    Return the process collector calls latency histograms and connection
+    pool counters.
+    """
+    return {
+        "calls": STATS.dump(),
+        "pool": POOL.status(),
+    }
+
+
+class PooledTransportMixin(object):
+    """
+    Check out a keep-alive connection from the process connection pool for
+    each request, and return it to the pool after the response is read,
+    so the proxies and threads reuse the established connections instead
+    of paying a new tcp and tls handshake per call.
+
+    The connection in use is thread-local, so the proxies can be shared by
+    the daemon threads.
+
+    The xmlrpclib transports are classic classes on python 2, so the
+    concrete classes call their __init__ explicitly instead of super().
+    """
+    scheme = None
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        return getattr(self._local, "connection", (None, None))
+
+    @_connection.setter
+    def _connection(self, value):
+        self._local.connection = value
+
+    def request(self, host, handler, request_body, verbose=False):
+        key = (self.scheme, str(host))
+        conn = POOL.get(key)
+        if conn is not None:
+            self._connection = (host, conn)
+        try:
+            return super(PooledTransportMixin, self).request(host, handler, request_body, verbose)
+        finally:
+            # the transport closes and forgets the connection on error
+            conn = self._connection[1]
+            self._connection = (None, None)
+            if conn is not None:
+                POOL.put(key, conn)
+
+
+class PooledTransport(PooledTransportMixin, xmlrpclib.Transport):
+    scheme = "http"
+
+    def __init__(self, *args, **kwargs):
+        PooledTransportMixin.__init__(self)
+        xmlrpclib.Transport.__init__(self, *args, **kwargs)
+
+
+class PooledSafeTransport(PooledTransportMixin, xmlrpclib.SafeTransport):
+    scheme = "https"
+
+    def __init__(self, *args, **kwargs):
+        PooledTransportMixin.__init__(self)
+        xmlrpclib.SafeTransport.__init__(self, *args, **kwargs)
+
+
+def get_proxy(uri, compress=False):
+    if uri.startswith("https"):
+        if "context" in kwargs:
+            transport = PooledSafeTransport(context=kwargs["context"])
+        else:
+            # python <2.7.9: no ssl context support
+            transport = PooledSafeTransport()
+    else:
+        transport = PooledTransport()
+    if compress:
+        transport.encode_threshold = GZIP_THRESHOLD
     try:
-        return xmlrpclib.ServerProxy(uri, **kwargs)
+        return xmlrpclib.ServerProxy(uri, transport=transport, allow_none=kwargs.get("allow_none", False))
     except Exception as e:
         if "__init__" in str(e):
-            return xmlrpclib.ServerProxy(uri)
+            return xmlrpclib.ServerProxy(uri, transport=transport)
 
 
 
@@ -88,18 +276,33 @@ def _do_call(fn, args, kwargs, log, proxy, mode="synchronous"):
         buff = getattr(proxy, fn)(*args, **kwargs)
         _e = datetime.now()
         _d = _e - _b
+        STATS.add(fn, _d.total_seconds())
         log.info("call %s done in %d.%03d seconds"%(fn, _d.seconds, _d.microseconds//1000))
         return buff
     except (OSError, Exception) as exc:
         # socket.gaierror (name resolution failure) is a subclass of OSError in py3.3+
         _e = datetime.now()
         _d = _e - _b
+        STATS.add(fn, _d.total_seconds(), error=True)
         log.error("call %s error after %d.%03d seconds: %s"%(fn, _d.seconds, _d.microseconds//1000, exc))
         if hasattr(exc, "faultString"):
             raise ex.Error(getattr(exc, "faultString").split(":", 1)[-1])
         else:
             raise ex.Error(str(exc))
 
+class CallRecorder(object):
+    """
+    A stand-in for the feed proxy, recording the remote calls done by the
+    CollectorRpc wrappers instead of sending them.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.calls.append({"methodName": name, "params": list(args)})
+        return record
+
 class CollectorRpc(object):
     def call(self, *args, **kwargs):
         fn = args[0]
@@ -126,6 +329,46 @@ class CollectorRpc(object):
             return
         return do_call(fn, args, kwargs, self.log, self, mode="synchronous")
 
+    def multicall(self, calls):
+        """
+        Execute the <calls> list of (args, kwargs), with the wrapper name as
+        args[0], in a single system.multicall request.
+
+        Return the list of errors aligned with <calls>, with None for the
+        succeeded calls. Transport errors are raised.
+
+        The wrappers are executed against a recorder, so only the wrappers
+        not using the remote calls results can be batched.
+        """
+        self.init()
+        if self.node.collector_env.dbopensvc is None:
+            raise ex.Error("no collector defined. set 'dbopensvc' in node.conf")
+        if "system.multicall" not in self.proxy_methods:
+            raise ex.Error("the collector does not support system.multicall")
+        batch = copy.copy(self)
+        batch.proxy = CallRecorder()
+        errors = []
+        ranges = []
+        for args, kwargs in calls:
+            start = len(batch.proxy.calls)
+            try:
+                getattr(batch, args[0])(*args[1:], **kwargs)
+                errors.append(None)
+            except Exception as exc:
+                errors.append(exc)
+                del batch.proxy.calls[start:]
+            ranges.append((start, len(batch.proxy.calls)))
+        if not batch.proxy.calls:
+            return errors
+        results = do_call("system.multicall", [batch.proxy.calls], {}, self.log, self.proxy, mode="synchronous")
+        if results is None:
+            raise ex.Error("system.multicall failed")
+        for idx, (start, end) in enumerate(ranges):
+            for result in results[start:end]:
+                if isinstance(result, dict) and "faultString" in result:
+                    errors[idx] = ex.Error(result["faultString"].split(":", 1)[-1])
+        return errors
+
     def __init__(self, node=None):
         self.node = node
         self.proxy = None
@@ -161,7 +404,7 @@ class CollectorRpc(object):
         self.log.debug("get dbopensvc method list")
         try:
             if self.proxy is None:
-                self.proxy = get_proxy(self.node.collector_env.dbopensvc)
+                self.proxy = get_proxy(self.node.collector_env.dbopensvc, compress=self.node.collector_env.dbcompression)
             self.proxy_methods = self.proxy.system.listMethods()
         except Exception as exc:
             self.log.error("get dbopensvc methods: %s", exc)
@@ -176,7 +419,7 @@ class CollectorRpc(object):
         self.log.debug("get dbcompliance method list")
         try:
             if self.comp_proxy is None:
-                self.comp_proxy = get_proxy(self.node.collector_env.dbcompliance)
+                self.comp_proxy = get_proxy(self.node.collector_env.dbcompliance, compress=self.node.collector_env.dbcompression)
             self.comp_proxy_methods = self.comp_proxy.system.listMethods()
         except Exception as exc:
             self.log.error("get dbcompliance methods: %s", exc)
@@ -210,7 +453,7 @@ class CollectorRpc(object):
             self.proxy = get_proxy(DUMMY_URL)
             return
         try:
-            self.proxy = get_proxy(self.node.collector_env.dbopensvc)
+            self.proxy = get_proxy(self.node.collector_env.dbopensvc, compress=self.node.collector_env.dbcompression)
             self.get_methods_dbopensvc()
         except Exception as exc:
             self.log.error("init dbopensvc: %s", exc)
@@ -229,7 +472,7 @@ class CollectorRpc(object):
             self.comp_proxy = get_proxy(DUMMY_URL)
             return
         try:
-            self.comp_proxy = get_proxy(self.node.collector_env.dbcompliance)
+            self.comp_proxy = get_proxy(self.node.collector_env.dbcompliance, compress=self.node.collector_env.dbcompression)
             self.get_methods_dbcompliance()
         except:
             self.comp_proxy = get_proxy(DUMMY_URL)
@@ -272,19 +515,26 @@ class CollectorRpc(object):
         args += [(self.node.collector_env.uuid, Env.nodename)]
         self.proxy.begin_action(*args)
 
-    def end_action(self, path, action, begin, end, cron, alogfile):
+    def end_action(self, path, action, begin, end, cron, alogfile=None, alog=None):
+        """
+        Send the action log and wrap-up entry. The log is read from <alog>
+        if set, or from the <alogfile> file, removed once read.
+        """
         err = 'ok'
         res = None
         res_err = None
         pid = None
         msg = None
         name, namespace, kind = split_path(path)
-        with open(alogfile, 'r') as ofile:
-            lines = ofile.read()
-        try:
-            os.unlink(alogfile)
-        except Exception:
-            pass
+        if alog is not None:
+            lines = alog
+        else:
+            with open(alogfile, 'r') as ofile:
+                lines = ofile.read()
+            try:
+                os.unlink(alogfile)
+            except Exception:
+                pass
         pids = set()
 
         """Example logfile line:
@@ -733,6 +983,17 @@ class CollectorRpc(object):
         args = [json.dumps(data), json.dumps(changes), (self.node.collector_env.uuid, Env.nodename)]
         self.proxy.push_daemon_status(*args)
 
+    def push_daemon_status_delta(self, data, changes=None, gen=None, base_gen=None, sync=True):
+        """
+        Send the nodes and instances status changed since the <base_gen>
+        push, or the full status if <base_gen> is None. The collector
+        returns {"info": "resync"} when it does not hold the <base_gen>
+        status.
+        """
+        import json
+        args = [json.dumps(data), json.dumps(changes), gen, base_gen, (self.node.collector_env.uuid, Env.nodename)]
+        return self.proxy.push_daemon_status_delta(*args)
+
     def push_brocade(self, objects=None, sync=True):
         if objects is None:
             objects = []
@@ -11,6 +11,7 @@ import threading
 import zlib
 import time
 import select
+import struct
 import sys
 from errno import ECONNREFUSED, EPIPE, EBUSY, EALREADY, EAGAIN
 
@@ -23,9 +24,6 @@ class DummyException(Exception):
 
 try:
     import ssl
-    import foreign.h2.connection
-    import foreign.hyper as hyper
-    from foreign.hyper.common.headers import HTTPHeaderMap
     SSLWantReadError = ssl.SSLWantReadError
     SSLError = ssl.SSLError
     ssl.HAS_ALPN # stack on Attribute error on py <3.5 and <2.7.10
@@ -36,8 +34,27 @@ except Exception:
     SSLError = DummyException
     has_ssl = False
 
+_has_h2 = None
+
+def has_h2():
+    """
+    Return True if the h2 client stack is usable.
+
+    The foreign.h2 and foreign.hyper modules are imported on first call
+    instead of on core.comm import, to spare their import time to the
+    commands not talking to a daemon.
+    """
+    global _has_h2
+    if _has_h2 is None:
+        try:
+            import foreign.h2.connection
+            import foreign.hyper
+            _has_h2 = has_ssl
+        except Exception:
+            _has_h2 = False
+    return _has_h2
+
 import foreign.six as six
-import foreign.pyaes as pyaes
 from env import Env
 from utilities.storage import Storage
 from utilities.lazy import lazy
@@ -88,48 +105,90 @@ try:
     from Crypto import __version__ as version
     CRYPTO_MODULE = "pycrypto %s" % version
 
-    def _encrypt(message, key, _iv):
+    def _aes_encrypt(message, key, _iv):
         """
-        Low level encrypter.
+        Low level AES-CBC encrypter, with PKCS7 padding.
         """
-        message = pyaes.util.append_PKCS7_padding(
-            zlib.compress(message)
-        )
+        import foreign.pyaes as pyaes
+        message = pyaes.util.append_PKCS7_padding(message)
         obj = AES.new(key, AES.MODE_CBC, _iv)
         ciphertext = obj.encrypt(message)
         return ciphertext
 
-    def _decrypt(ciphertext, key, _iv):
+    def _aes_decrypt(ciphertext, key, _iv):
         """
-        Low level decrypter.
+        Low level AES-CBC decrypter, with PKCS7 padding.
         """
+        import foreign.pyaes as pyaes
         obj = AES.new(key, AES.MODE_CBC, _iv)
         message = obj.decrypt(ciphertext)
-        return zlib.decompress(pyaes.util.strip_PKCS7_padding(message))
+        return pyaes.util.strip_PKCS7_padding(message)
 except ImportError:
     CRYPTO_MODULE = "fallback"
 
-    def _encrypt(message, key, _iv):
+    def _aes_encrypt(message, key, _iv):
         """
-        Low level encrypter.
+        Low level AES-CBC encrypter, with PKCS7 padding.
         """
+        import foreign.pyaes as pyaes
         obj = pyaes.Encrypter(
             pyaes.AESModeOfOperationCBC(to_bytes(key), iv=_iv)
         )
-        ciphertext = obj.feed(zlib.compress(message))
+        ciphertext = obj.feed(message)
         ciphertext += obj.feed()
         return ciphertext
 
-    def _decrypt(ciphertext, key, _iv):
+    def _aes_decrypt(ciphertext, key, _iv):
         """
-        Low level decrypter.
+        Low level AES-CBC decrypter, with PKCS7 padding.
         """
+        import foreign.pyaes as pyaes
         obj = pyaes.Decrypter(
            pyaes.AESModeOfOperationCBC(to_bytes(key), iv=_iv)
         )
         message = obj.feed(ciphertext)
         message += obj.feed()
-        return zlib.decompress(message)
+        return message
+
+def _encrypt(message, key, _iv):
+    """
+    Low level encrypter.
+    """
+    return _aes_encrypt(zlib.compress(message), key, _iv)
+
+def _decrypt(ciphertext, key, _iv):
+    """
+    Low level decrypter.
+    """
+    return zlib.decompress(_aes_decrypt(ciphertext, key, _iv))
+
+#
+# Binary message frames, used by the heartbeats when all peers support them.
+#
+# magic, version, compression, iv, clustername length, nodename length,
+# ciphertext length, followed by the clustername, nodename and ciphertext.
+#
+FRAME_MAGIC = b"OSVB"
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct(">4sBB16sHHI")
+FRAME_COMPRESS_NONE = 0
+FRAME_COMPRESS_ZLIB = 1
+
+def is_frame(message):
+    """
+    Return True if <message> is a binary message frame.
+    """
+    return isinstance(message, (bytes, bytearray)) and message[:4] == FRAME_MAGIC
+
+def frame_length(buff):
+    """
+    Return the total length of the binary message frame starting <buff>,
+    or None if the header is not fully received yet.
+    """
+    if len(buff) < FRAME_HEADER.size:
+        return
+    _, _, _, _, cn_len, nn_len, data_len = FRAME_HEADER.unpack_from(buff)
+    return FRAME_HEADER.size + cn_len + nn_len + data_len
 
 def get_http2_client_ssl_context(cafile=None, keyfile=None, certfile=None):
     """
@@ -172,6 +231,70 @@ def get_http2_client_ssl_context(cafile=None, keyfile=None, certfile=None):
 
     return ctx
 
+class H2ConnectionPool(object):
+    """
+    The idle h2 connections to the peer listeners, reused by the successive
+    requests to the same endpoint to save the tcp and tls handshakes.
+
+    A connection is checked out by a single request at a time, and put back
+    in the pool when the response is fully read.
+    """
+    def __init__(self, max_idle=4, idle_tmo=60):
+        self.max_idle = max_idle
+        self.idle_tmo = idle_tmo
+        self.lock = threading.Lock()
+        self.conns = {}
+
+    def get(self, key):
+        """
+        Return an idle connection to the <key> endpoint, or None if no
+        usable idle connection is available.
+        """
+        now = time.time()
+        with self.lock:
+            conns = self.conns.get(key, [])
+            while conns:
+                conn, updated = conns.pop()
+                if now - updated < self.idle_tmo and self.usable(conn):
+                    return conn
+                self.discard(conn)
+
+    def put(self, key, conn):
+        with self.lock:
+            conns = self.conns.setdefault(key, [])
+            if len(conns) < self.max_idle:
+                conns.append((conn, time.time()))
+                return
+        self.discard(conn)
+
+    def clear(self):
+        with self.lock:
+            conns = self.conns
+            self.conns = {}
+        for _conns in conns.values():
+            for conn, _ in _conns:
+                self.discard(conn)
+
+    @staticmethod
+    def usable(conn):
+        """
+        An idle connection with data to read was closed or reset by the
+        peer, or received a goaway. Don't reuse it.
+        """
+        try:
+            return conn._sock is not None and not conn._sock.can_read
+        except Exception:
+            return False
+
+    @staticmethod
+    def discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+H2_POOL = H2ConnectionPool()
+
 class Crypt(object):
     """
     A class implement AES encrypt, decrypt and message padding.
@@ -347,10 +470,9 @@ class Crypt(object):
         """
         Validate the message meta, decrypt and return the data.
         """
-        if cluster_name is None:
-            cluster_names = self.cluster_names
-        else:
-            cluster_names = [cluster_name]
+        if is_frame(message):
+            return self.decrypt_frame(message, cluster_name=cluster_name, secret=secret,
+                                      sender_id=sender_id, structured=structured)
         message = bdecode(message).rstrip("\0\x00")
         try:
             message = json.loads(message)
@@ -365,22 +487,11 @@ class Crypt(object):
             return None, None, None
         msg_clustername = message.get("clustername")
         msg_nodename = message.get("nodename")
-        if secret is None:
-            if msg_nodename in self.cluster_drpnodes:
-                cluster_key = self.get_secret(Storage(server=msg_nodename), None)
-            else:
-                cluster_key = self.cluster_key
-        else:
-            cluster_key = secret
-        if cluster_name != "join" and \
-           msg_clustername not in set(["join"]) | self.cluster_names:
-            self.log.warning("discard message from cluster %s, sender %s",
-                             msg_clustername, sender_id)
-            return None, None, None
+        cluster_key = self.get_decrypt_key(msg_clustername, msg_nodename,
+                                           cluster_name=cluster_name,
+                                           secret=secret, sender_id=sender_id)
         if cluster_key is None:
             return None, None, None
-        if msg_nodename is None:
-            return None, None, None
         iv = message.get("iv")
         if iv is None:
             return None, None, None
@@ -396,12 +507,38 @@ class Crypt(object):
             return None, None, None
         if sender_id:
             self.blacklist_clear(sender_id)
+        return self.loads_decrypted(msg_clustername, msg_nodename, data, structured=structured)
+
+    def get_decrypt_key(self, msg_clustername, msg_nodename, cluster_name=None,
+                        secret=None, sender_id=None):
+        """
+        Validate the message meta and return the key to decrypt the message
+        with. Return None if the message must be discarded.
+        """
+        if secret is None:
+            if msg_nodename in self.cluster_drpnodes:
+                cluster_key = self.get_secret(Storage(server=msg_nodename), None)
+            else:
+                cluster_key = self.cluster_key
+        else:
+            cluster_key = secret
+        if cluster_name != "join" and \
+           msg_clustername not in set(["join"]) | self.cluster_names:
+            self.log.warning("discard message from cluster %s, sender %s",
+                             msg_clustername, sender_id)
+            return
+        if msg_nodename is None:
+            return
+        return cluster_key
+
+    @staticmethod
+    def loads_decrypted(msg_clustername, msg_nodename, data, structured=True):
         if not structured:
             try:
                 loaded = json.loads(bdecode(data))
             except ValueError as exc:
                 loaded = data
-            if not isinstance(loaded, foreign.six.text_type):
+            if not isinstance(loaded, six.text_type):
                 loaded = data
             return msg_clustername, msg_nodename, loaded
         try:
@@ -441,6 +578,83 @@ class Crypt(object):
             return (json.dumps(message)+'\0').encode()
         return json.dumps(message)
 
+    def decrypt_frame(self, frame, cluster_name=None, secret=None, sender_id=None, structured=True):
+        """
+        Validate the binary message frame meta, decrypt and return the data.
+        """
+        try:
+            magic, version, compression, iv, cn_len, nn_len, data_len = FRAME_HEADER.unpack_from(frame)
+        except struct.error:
+            self.log.error("truncated message frame from %s", sender_id)
+            return None, None, None
+        if version != FRAME_VERSION:
+            self.log.error("unsupported message frame version %d from %s", version, sender_id)
+            return None, None, None
+        offset = FRAME_HEADER.size
+        msg_clustername = bdecode(bytes(frame[offset:offset+cn_len]))
+        offset += cn_len
+        msg_nodename = bdecode(bytes(frame[offset:offset+nn_len]))
+        offset += nn_len
+        data = bytes(frame[offset:offset+data_len])
+        if len(data) != data_len:
+            self.log.error("truncated message frame from %s", sender_id)
+            return None, None, None
+        cluster_key = self.get_decrypt_key(msg_clustername, msg_nodename or None,
+                                           cluster_name=cluster_name,
+                                           secret=secret, sender_id=sender_id)
+        if cluster_key is None:
+            return None, None, None
+        if self.blacklisted(sender_id):
+            return None, None, None
+        try:
+            data = _aes_decrypt(data, to_bytes(cluster_key), iv)
+            if compression == FRAME_COMPRESS_ZLIB:
+                data = zlib.decompress(data)
+            elif compression != FRAME_COMPRESS_NONE:
+                raise ValueError("unsupported compression %d" % compression)
+        except Exception as exc:
+            self.log.error("decrypt message from %s: %s", msg_nodename, str(exc))
+            self.blacklist(sender_id)
+            return None, None, None
+        if sender_id:
+            self.blacklist_clear(sender_id)
+        return self.loads_decrypted(msg_clustername, msg_nodename, data, structured=structured)
+
+    def encrypt_frame(self, data, cluster_name=None, secret=None):
+        """
+        Encrypt and return data in a binary message frame.
+
+        Unlike encrypt(), the iv and ciphertext are not base64 encoded, and
+        the frame is length-prefixed instead of zero-terminated.
+        """
+        if cluster_name is None:
+            cluster_name = self.cluster_name
+        if secret is None:
+            cluster_key = self.cluster_key
+        else:
+            cluster_key = secret
+        if cluster_key is None:
+            return
+        iv = self.gen_iv()
+        try:
+            data = json.dumps(data).encode()
+        except (UnicodeDecodeError, TypeError):
+            # already binary data
+            pass
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            # the less data to encrypt, the less cpu
+            compression = FRAME_COMPRESS_ZLIB
+            data = compressed
+        else:
+            compression = FRAME_COMPRESS_NONE
+        data = _aes_encrypt(data, to_bytes(cluster_key), iv)
+        cluster_name = to_bytes(cluster_name)
+        nodename = to_bytes(Env.nodename)
+        header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, compression, iv,
+                                   len(cluster_name), len(nodename), len(data))
+        return b"".join([header, cluster_name, nodename, data])
+
     def blacklisted(self, sender_id):
         """
         Return True if the sender's problem count is above threshold.
@@ -596,7 +810,7 @@ class Crypt(object):
         return context
 
     def socket_parms_ux(self, server):
-        if has_ssl:
+        if has_h2():
             return self.socket_parms_ux_h2(server)
         else:
             return self.socket_parms_ux_raw(server)
@@ -624,7 +838,7 @@ class Crypt(object):
         return data
 
     def socket_parms_from_context(self, server):
-        if not has_ssl:
+        if not has_h2():
             raise ex.Error("tls1.2 capable ssl module is required but not available")
         data = Storage()
         context = get_context()
@@ -721,6 +935,26 @@ class Crypt(object):
             certfile=certfile,
         )
 
+    def h2_pool_key(self, sp, timeout=None):
+        """
+        Return the key of the <sp> endpoint connections in the h2 pool, or
+        None if the connections to this endpoint are not pooled.
+
+        Only the inet connections, to peer listeners, are pooled.
+        """
+        if sp.af != socket.AF_INET:
+            return
+        context = sp.context or {}
+        try:
+            cafile = context["cluster"]["certificate_authority"]
+        except (KeyError, TypeError):
+            cafile = None
+        try:
+            user = (context["user"]["client_key"], context["user"]["client_certificate"])
+        except (KeyError, TypeError):
+            user = None
+        return (sp.to, sp.tls, cafile, user, timeout)
+
     def h2c(self, sp=None, **kwargs):
         context = self.get_http2_client_context(sp)
         if isinstance(sp.to, tuple):
@@ -729,6 +963,7 @@ class Crypt(object):
         else:
             host = sp.to
             port = 0
+        import foreign.hyper as hyper
         conn = hyper.HTTP20Connection(host, port=port, ssl_context=context, secure=sp.tls, **kwargs)
         return conn
 
@@ -777,23 +1012,43 @@ class Crypt(object):
             return bdecode(self.cluster_key)
 
     def h2_daemon_request(self, data, server=None, node=None, with_result=True, silent=False,
-                          cluster_name=None, secret=None, timeout=None, sp=None, method="GET"):
+                          cluster_name=None, secret=None, timeout=None, sp=None, method="GET",
+                          deadline=None):
+        """
+        Send a request to the h2 listener described by <sp> and return the
+        decoded response.
+
+        If <deadline> is set, the connection socket operations time out at
+        this time, so the request does not outlive a caller not waiting
+        for its result past the deadline.
+        """
         secret = self.get_secret(sp, secret)
         path = self.h2_path_from_data(data)
         headers = self.h2_headers(node=node, secret=secret, multiplexed=data.get("multiplexed"), af=sp.af)
         body = self.h2_body_from_data(data)
         headers.update({"Content-Length": str(len(body))})
-        conn = self.h2c(sp=sp, timeout=timeout)
+        pool_key = self.h2_pool_key(sp, timeout=timeout)
+        conn = H2_POOL.get(pool_key) if pool_key else None
+        reused = conn is not None
+        if conn is None:
+            conn = self.h2c(sp=sp, timeout=self.h2_timeout(timeout, deadline))
+        elif deadline is not None:
+            conn._sock.settimeout(self.h2_timeout(timeout, deadline))
         elapsed = 0
         while True:
             try:
                 conn.request(method, path, headers=headers, body=body)
-                break
             except AssertionError as exc:
                 raise ex.Error(str(exc))
-            except ConnectionResetError:
-                return {"status": 1, "error": "%s %s connection reset"%(method, path)}
-            except (ConnectionRefusedError, ssl.SSLError, socket.error) as exc:
+            except (ConnectionResetError, ConnectionRefusedError, ssl.SSLError, socket.error) as exc:
+                if reused and not isinstance(exc, socket.timeout):
+                    # the pooled connection went stale. retry with a new one.
+                    H2_POOL.discard(conn)
+                    conn = self.h2c(sp=sp, timeout=self.h2_timeout(timeout, deadline))
+                    reused = False
+                    continue
+                if isinstance(exc, ConnectionResetError):
+                    return {"status": 1, "error": "%s %s connection reset"%(method, path)}
                 try:
                     errno = exc.errno
                 except AttributeError:
@@ -807,11 +1062,54 @@ class Crypt(object):
                     elapsed += PAUSE
                     continue
                 return {"status": 1, "error": "%s"%exc, "errno": errno}
-        resp = conn.get_response()
-        data = resp.read()
+            try:
+                resp = conn.get_response()
+                data = resp.read()
+                break
+            except Exception as exc:
+                if not reused or not self.h2_stale(exc):
+                    raise
+                # the pooled connection was closed by the peer before
+                # the request was read. retry with a new one.
+                H2_POOL.discard(conn)
+                conn = self.h2c(sp=sp, timeout=self.h2_timeout(timeout, deadline))
+                reused = False
+        if pool_key:
+            if deadline is not None:
+                conn._sock.settimeout(timeout)
+            H2_POOL.put(pool_key, conn)
         data = json.loads(bdecode(data))
         return data
 
+    @staticmethod
+    def h2_timeout(timeout, deadline):
+        """
+        Return the h2 connection socket timeout honoring <deadline>.
+        """
+        if deadline is None:
+            return timeout
+        left = max(deadline - time.time(), 0.001)
+        if timeout:
+            return min(timeout, left)
+        return left
+
+    @staticmethod
+    def h2_stale(exc):
+        """
+        Return True if <exc>, raised while reading a response on a reused
+        connection, means the peer closed the connection.
+        """
+        if isinstance(exc, socket.timeout):
+            return False
+        if isinstance(exc, (ConnectionResetError, ssl.SSLError, socket.error)):
+            return True
+        import foreign.hyper as hyper
+        return isinstance(exc, (
+            hyper.common.exceptions.ConnectionResetError,
+            hyper.http20.exceptions.ConnectionError,
+            hyper.http20.exceptions.StreamResetError,
+        ))
+
     def raw_daemon_request(self, data, server=None, node=None, with_result=True, silent=False,
                            cluster_name=None, secret=None, timeout=None, sp=None, method="GET"):
         """
@@ -909,6 +1207,7 @@ class Crypt(object):
         return "/" + data.get("action", "").lstrip("/")
 
     def h2_headers(self, node=None, secret=None, multiplexed=None, af=None):
+        from foreign.hyper.common.headers import HTTPHeaderMap
         headers = HTTPHeaderMap()
         if node:
             if isinstance(node, (tuple, list, set)):
@@ -936,6 +1235,7 @@ class Crypt(object):
             yield e
 
     def h2_daemon_stream(self, *args, **kwargs):
+        import foreign.hyper as hyper
         while True:
             try:
                 for msg in self._h2_daemon_stream(*args, **kwargs):
@@ -28,6 +28,21 @@ DEFER = [
     ("volume", "mnt"),
 ]
 
+# converters with a result not only depending on the config, excluded from
+# the config snapshot
+VOLATILE_CONVERTERS = (
+    "nodes_selector",
+)
+
+# the config files parsed by the process, indexed by path, with their
+# (inode, mtime, size) signature
+CF_CACHE = {}
+
+# the RawConfigParser section header, option line and comment regexps
+SECTION_RE = re.compile(r"\[(?P<header>.+)\]")
+OPTION_RE = re.compile(r"(?P<option>.*?)\s*(?P<vi>=|:)\s*(?P<value>.*)$")
+COMMENTED_SECTION_RE = re.compile(r"\[.+\]")
+
 # supported operators in arithmetic expressions
 operators = {
     ast.Add: op.add,
@@ -172,13 +187,213 @@ def read_cf_comments(fpath):
     return data
 
 
+def copy_value(val):
+    """
+    Return a copy of <val> if mutable, so the config snapshot entries are
+    not altered by the callers.
+    """
+    if isinstance(val, (list, dict, set)):
+        return copy.copy(val)
+    return val
+
+
+def parse_cf_buffer(buff):
+    """
+    Parse an ini-formatted config buffer in a single pass, with the rules
+    of the non-strict python3 RawConfigParser and case-sensitive option
+    names, capturing the comments like read_cf_comments().
+
+    Return a (defaults, sections, comments) tuple.
+    """
+    from collections import OrderedDict
+    defaults = OrderedDict()
+    sections = OrderedDict()
+    comments = {}
+    comment_section = ".header"
+    current = []
+    cursect = {}
+    in_section = False
+    sectname = None
+    optname = None
+    indent_level = 0
+    errors = []
+
+    for lineno, line in enumerate(buff.splitlines(), start=1):
+        value = line.strip()
+
+        # comments
+        if value:
+            if COMMENTED_SECTION_RE.match(value):
+                if current:
+                    comments[comment_section] = current
+                    current = []
+                comment_section = value[1:-1]
+            elif value[0] in (";", "#"):
+                stripped = value.lstrip("#;").strip()
+                if COMMENTED_SECTION_RE.match(stripped):
+                    # add an empty line before a commented section
+                    current.append("")
+                current.append(stripped)
+
+        # keywords
+        if not value:
+            if in_section and optname:
+                # empty lines are part of multi-lines values
+                cursect[optname].append("")
+            continue
+        if value[0] in (";", "#"):
+            continue
+        cur_indent_level = len(line) - len(line.lstrip())
+        if in_section and optname and cur_indent_level > indent_level:
+            # continuation line
+            cursect[optname].append(value)
+            continue
+        indent_level = cur_indent_level
+        mo = SECTION_RE.match(value)
+        if mo:
+            sectname = mo.group("header")
+            if sectname == "DEFAULT":
+                cursect = defaults
+            elif sectname in sections:
+                # not strict: merge the duplicate sections
+                cursect = sections[sectname]
+            else:
+                cursect = sections[sectname] = OrderedDict()
+            in_section = True
+            optname = None
+        elif not in_section:
+            raise ex.Error("line %d: no section header: %s" % (lineno, line))
+        else:
+            mo = OPTION_RE.match(value)
+            if not mo or not mo.group("option"):
+                errors.append("line %d: %s" % (lineno, line))
+                optname = None
+                continue
+            optname = mo.group("option").rstrip()
+            cursect[optname] = [mo.group("value").strip()]
+
+    if current:
+        comments[comment_section] = current
+    if errors:
+        raise ex.Error("parsing errors: %s" % ", ".join(errors))
+    for section in [defaults] + list(sections.values()):
+        for option, value in section.items():
+            section[option] = "\n".join(value).rstrip()
+    return defaults, sections, comments
+
+
+def parse_cf_file(fpath):
+    """
+    Return the parse_cf_buffer() result for the <fpath> file, None if the
+    file does not exist.
+
+    The results are cached, so they must not be modified by the callers.
+    The cache entry is reused as long as the file inode, mtime and size
+    are unchanged.
+    """
+    try:
+        st = os.stat(fpath)
+    except OSError:
+        CF_CACHE.pop(fpath, None)
+        return
+    sig = (st.st_ino, getattr(st, "st_mtime_ns", st.st_mtime), st.st_size)
+    try:
+        cached_sig, data = CF_CACHE[fpath]
+        if cached_sig == sig:
+            return data
+    except KeyError:
+        pass
+    with open(fpath, "rb") as ofile:
+        buff = ofile.read()
+    data = parse_cf_buffer(buff.decode("utf8"))
+    CF_CACHE[fpath] = (sig, data)
+    return data
+
+
+def read_cf_data(fpaths):
+    """
+    Return the (defaults, sections, comments) of the <fpaths> config files,
+    the sections of the later files updating the ones of the former files,
+    like RawConfigParser.read() does. The comments are only returned for a
+    single file.
+    """
+    from collections import OrderedDict
+    defaults = OrderedDict()
+    sections = OrderedDict()
+    comments = {}
+    single = not isinstance(fpaths, (list, tuple))
+    if single:
+        fpaths = [fpaths]
+    for fpath in fpaths:
+        data = parse_cf_file(fpath)
+        if data is None:
+            continue
+        defaults.update(data[0])
+        for section, options in data[1].items():
+            if section in sections:
+                sections[section].update(options)
+            else:
+                sections[section] = OrderedDict(options)
+        if single:
+            comments = data[2]
+    return defaults, sections, comments
+
+
+def merge_cf_comments(data, comments):
+    """
+    Add the <comments> to the "comment" option of their section in <data>,
+    or of the DEFAULT section for the comments of the header or of
+    commented sections.
+    """
+    for section, comments in comments.items():
+        if section in data:
+            if "comment" not in data[section]:
+                data[section]["comment"] = ""
+            else:
+                data[section]["comment"] += "\n"
+            data[section]["comment"] += "\n".join(comments)
+        else:
+            if "DEFAULT" not in data:
+                data["DEFAULT"] = {}
+            if "comment" not in data["DEFAULT"]:
+                data["DEFAULT"]["comment"] = ""
+            else:
+                data["DEFAULT"]["comment"] += "\n"
+            data["DEFAULT"]["comment"] += "\n".join(comments)
+
+
 class ExtConfigMixin(object):
     def __init__(self, default_status_groups=None):
         self.ref_cache = {}
+        self.conf_snapshot = (None, {})
         self.default_status_groups = default_status_groups
 
     def clear_ref_cache(self):
         self.ref_cache = {}
+        self.conf_snapshot = (None, {})
+
+    def get_conf_snapshot(self, cd):
+        """
+        Return the dict of evaluated keywords of the <cd> config data, indexed
+        by conf_get() arguments, or None if <cd> is not the object config.
+
+        The snapshot is bound to the parsed config data, so it is dropped
+        when the config is parsed again, and by clear_ref_cache() on commit
+        and on unset_conf_lazy().
+        """
+        if cd is not self.cd:
+            return
+        snapshot = self.conf_snapshot
+        if snapshot[0] is not cd:
+            snapshot = self.conf_snapshot = (cd, {})
+        return snapshot[1]
+
+    def conf_snapshot_cacheable(self, s, o, t, section, rtype):
+        if t is None and s not in ("labels", "env", "data"):
+            key = self.kwstore[section].getkey(o, rtype)
+            if key is not None:
+                t = key.convert
+        return t not in VOLATILE_CONVERTERS
 
     @lazy
     def has_default_section(self):
@@ -883,9 +1098,7 @@ class ExtConfigMixin(object):
         instead of raising OptNotFound.
         """
         try:
-            return self.conf_get(*args, **kwargs)
-        except ex.OptNotFound as exc:
-            return exc.default
+            return self.conf_lookup(*args, **kwargs)[1]
         except ex.RequiredOptNotFound as exc:
             raise ex.Error(str(exc))
 
@@ -904,10 +1117,36 @@ class ExtConfigMixin(object):
     def conf_get(self, s, o, t=None, scope=None, impersonate=None,
                  use_default=True, cd=None, verbose=True, rtype=None):
         """
-        Handle keyword and section deprecation.
+        Return the evaluated keyword value, or raise OptNotFound with the
+        evaluated keyword default set as the exception 'default' attribute.
+        """
+        found, val = self.conf_lookup(s, o, t=t, scope=scope,
+                                      impersonate=impersonate,
+                                      use_default=use_default, cd=cd,
+                                      verbose=verbose, rtype=rtype)
+        if found:
+            return val
+        raise ex.OptNotFound("keyword %s.%s not found." % (s, o), default=val)
+
+    def conf_lookup(self, s, o, t=None, scope=None, impersonate=None,
+                    use_default=True, cd=None, verbose=True, rtype=None):
+        """
+        Return a (found, value) tuple, value being the evaluated keyword
+        default if not found.
+
+        Serve the result from the config snapshot if possible, else
+        evaluate and record it in the snapshot.
         """
         if cd is None:
             cd = self.cd
+        snapshot = self.get_conf_snapshot(cd)
+        if snapshot is not None:
+            key = (s, o, t, scope, impersonate, use_default, rtype)
+            try:
+                found, val = snapshot[key]
+                return found, copy_value(val)
+            except KeyError:
+                pass
         section = s.split("#")[0]
         if rtype:
             pass
@@ -915,7 +1154,27 @@ class ExtConfigMixin(object):
             section, rtype = self.kwstore.deprecated_sections[section]
         else:
             rtype = self.get_rtype(s, section, cd)
-
+        try:
+            found, val = True, self.conf_get_deprecated(s, o, t=t, scope=scope,
+                                                        impersonate=impersonate,
+                                                        use_default=use_default,
+                                                        cd=cd, verbose=verbose,
+                                                        section=section,
+                                                        rtype=rtype)
+        except ex.OptNotFound as exc:
+            found, val = False, exc.default
+        # a None value is a deferred reference
+        if snapshot is not None and (val is not None or not found) and \
+           self.conf_snapshot_cacheable(s, o, t, section, rtype):
+            snapshot[key] = (found, copy_value(val))
+        return found, val
+
+    def conf_get_deprecated(self, s, o, t=None, scope=None, impersonate=None,
+                            use_default=True, cd=None, verbose=True,
+                            section=None, rtype=None):
+        """
+        Handle keyword and section deprecation.
+        """
         if rtype:
             fkey = ".".join((section, rtype, o))
         else:
@@ -1526,6 +1785,27 @@ class ExtConfigMixin(object):
         self.clear_ref_cache()
         if cf is None:
             cf = self.paths.cf
+        if six.PY2:
+            return self.parse_config_file_compat(cf)
+        try:
+            defaults, sections, comments = read_cf_data(cf)
+        except Exception as exc:
+            import traceback
+            traceback.print_stack()
+            raise ex.Error("error parsing %s: %s" % (cf, exc))
+        from collections import OrderedDict
+        data = OrderedDict()
+        if defaults:
+            data["DEFAULT"] = defaults
+        data.update(sections)
+        merge_cf_comments(data, comments)
+        return data
+
+    def parse_config_file_compat(self, cf):
+        """
+        The RawConfigParser-based parser, used on python2 where its rules
+        differ from the parse_cf_buffer() ones.
+        """
         try:
             config = read_cf(cf)
         except Exception as exc:
@@ -1556,23 +1836,7 @@ class ExtConfigMixin(object):
                     tmpsection[option] = config.get(section, option)
             data[section] = tmpsection
 
-        comments = read_cf_comments(cf)
-        for section, comments in comments.items():
-            if section in data:
-                if "comment" not in data[section]:
-                    data[section]["comment"] = ""
-                else:
-                    data[section]["comment"] += "\n"
-                data[section]["comment"] += "\n".join(comments)
-            else:
-                if "DEFAULT" not in data:
-                    data["DEFAULT"] = {}
-                if "comment" not in data["DEFAULT"]:
-                    data["DEFAULT"]["comment"] = ""
-                else:
-                    data["DEFAULT"]["comment"] += "\n"
-                data["DEFAULT"]["comment"] += "\n".join(comments)
-
+        merge_cf_comments(data, read_cf_comments(cf))
         return data
 
     def is_volatile(self):
@@ -1597,6 +1861,8 @@ class ExtConfigMixin(object):
             cf = self.paths.cf
         if not isinstance(cd, dict):
             return
+        # the config data may have been changed in place
+        self.clear_ref_cache()
         if "metadata" in cd:
             del cd["metadata"]
         if hasattr(self, "new_id") and "id" not in cd.get("DEFAULT", {}):
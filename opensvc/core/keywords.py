@@ -83,10 +83,17 @@ class Keyword(object):
     def __lt__(self, o):
         return self.section + self.keyword < o.section + o.keyword
 
-    def __getattribute__(self, attr):
-        if attr == "default":
-            return copy.copy(object.__getattribute__(self, attr))
-        return object.__getattribute__(self, attr)
+    @property
+    def default(self):
+        # return a copy of the mutable defaults, so the callers can't alter
+        # the keyword definition
+        if isinstance(self._default, (list, dict, set)):
+            return copy.copy(self._default)
+        return self._default
+
+    @default.setter
+    def default(self, value):
+        self._default = value
 
     def deprecated(self):
         if self.keyword in self.top.deprecated_keywords:
@@ -445,6 +452,7 @@ class KeywordStore(dict):
         self.provision = provision
         self.has_default_section = has_default_section
         self.modules = set()
+        self.drivers = []
 
         for keyword in keywords or []:
             sections = keyword.get("sections", [keyword.get("section")])
@@ -458,7 +466,7 @@ class KeywordStore(dict):
                             "keyword": prefix+keyword["keyword"],
                             "text": keyword["text"].replace("{prefix}", prefix),
                         })
-                        self += Keyword(**data)
+                        self.__iadd_keyword__(Keyword(**data))
                     except KeyError as exc:
                         raise ex.Error("misformatted keyword definition: %s: %s" % (exc, data))
 
@@ -472,6 +480,16 @@ class KeywordStore(dict):
         return n
 
     def register_driver(self, driver_group, driver_basename, keywords=None, driver_basename_aliases=None, **kwargs):
+        """
+        Merge the keywords of a driver, and record the registration for the
+        drivers keywords index.
+        """
+        self.drivers.append((driver_group, driver_basename, keywords, driver_basename_aliases, kwargs))
+        self._register_driver(driver_group, driver_basename, keywords=keywords, driver_basename_aliases=driver_basename_aliases, **kwargs)
+
+    def _register_driver(self, driver_group, driver_basename, keywords=None, driver_basename_aliases=None, **kwargs):
+        if kwargs.get("name"):
+            self.modules.add(kwargs["name"])
         keywords = [
             dict(k, section=driver_group, rtype=driver_basename) for k in keywords
         ]
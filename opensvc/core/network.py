@@ -10,7 +10,6 @@ import foreign.six as six
 from env import Env
 from utilities.files import makedirs
 from utilities.lazy import lazy
-from utilities.net.ipaddress import ip_network, ip_address, summarize_address_range
 from utilities.render.color import formatter
 
 
@@ -199,6 +198,7 @@ class NetworksMixin(object):
         return nets
 
     def node_subnet(self, name, nodename=None, config=None):
+        from utilities.net.ipaddress import ip_network, summarize_address_range
         if nodename is None:
             nodename = Env.nodename
         if not config:
@@ -274,6 +274,7 @@ class NetworksMixin(object):
         return routes
 
     def network_overlaps(self, name, nets=None):
+        from utilities.net.ipaddress import ip_network
         def get_val(key, net):
             try:
                 return net["config"][key]
@@ -463,6 +464,7 @@ class NetworksMixin(object):
         return data
 
     def network_status_data(self, name=None):
+        from utilities.net.ipaddress import ip_network, ip_address
         data = {}
         nets = self.networks_data()
         ipdata = self.network_ip_data()
@@ -49,14 +49,6 @@ from utilities.render.color import formatter
 from utilities.storage import Storage
 from utilities.string import bdecode
 
-try:
-    from foreign.six.moves.urllib.request import Request, urlopen
-    from foreign.six.moves.urllib.error import HTTPError
-    from foreign.six.moves.urllib.parse import urlencode
-except ImportError:
-    # pylint false positive
-    pass
-
 
 if six.PY2:
     BrokenPipeError = IOError
@@ -565,7 +557,8 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
     def collector_env(self):
         """
         Return the collector connection elements parsed from the node config
-        node.uuid, node.dbopensvc and node.dbcompliance as a Storage().
+        node.uuid, node.dbopensvc, node.dbcompliance and node.dbcompression
+        as a Storage().
         """
         data = Storage()
         url = self.oget("node", "dbopensvc")
@@ -628,6 +621,7 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
             data.uuid = node_uuid
         else:
             data.uuid = ""
+        data.dbcompression = self.oget("node", "dbcompression")
         return data
 
     def call(self, *args, **kwargs):
@@ -2560,6 +2554,8 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
                 kwargs = {}
         else:
             raise ex.Error("refuse to submit auth tokens through a non-encrypted transport")
+        from foreign.six.moves.urllib.request import urlopen
+        from foreign.six.moves.urllib.error import HTTPError
         try:
             f = urlopen(request, **kwargs)
         except HTTPError as e:
@@ -2636,6 +2632,7 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
         Make a request to the collector's rest api
         """
         import base64
+        from foreign.six.moves.urllib.request import Request
         api = self.collector_api(path=path)
         url = api["url"]
         if not url.startswith("https"):
@@ -2694,6 +2691,7 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
         """
         A chunked download method
         """
+        from foreign.six.moves.urllib.request import Request, urlopen
         request = Request(url)
         kwargs = {}
         kwargs = self.set_ssl_context(kwargs)
@@ -2708,6 +2706,9 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
         """
         Make a request to the collector's rest api
         """
+        from foreign.six.moves.urllib.request import urlopen
+        from foreign.six.moves.urllib.error import HTTPError
+        from foreign.six.moves.urllib.parse import urlencode
         if data is not None and get_method == "GET":
             if len(data) == 0 or not isinstance(data, dict):
                 data = None
@@ -2746,6 +2747,8 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
         """
         Download bulk chunked data from the collector's rest api
         """
+        from foreign.six.moves.urllib.request import urlopen
+        from foreign.six.moves.urllib.error import HTTPError
         request = self.collector_request(rpath)
         kwargs = {}
         kwargs = self.set_ssl_context(kwargs)
@@ -2968,6 +2971,7 @@ class Node(Crypt, ExtConfigMixin, NetworksMixin):
             raise ex.Error("--interactive is set but input fd is not a tty")
 
         def get_href(ref):
+            from foreign.six.moves.urllib.request import urlopen
             ref = ref.strip("[]")
             try:
                 response = urlopen(ref)
@@ -410,6 +410,13 @@ KEYWORDS = [
         "default": True,
         "text": "If true and dbopensvc is set, the objects action logs are reported to the collector. Set to false to disable log reporting to the collector, event if dbopensvc is set."
     },
+    {
+        "section": "node",
+        "keyword": "dbcompression",
+        "convert": "boolean",
+        "default": False,
+        "text": "If true, the xmlrpc request bodies larger than 1 KB are gzip-encoded before being sent to the collector. Only set if the collector accepts gzip-encoded requests."
+    },
     {
         "section": "node",
         "keyword": "branch",
@@ -670,6 +677,20 @@ If not set, or set to ``true``, the reboot flag is removed before reboot, and a
         "default": 1214,
         "text": """The port the daemon listener must listen on. In pull action mode, the collector sends a tcp packet to the server to notify there are actions to unqueue. The opensvc daemon executes the :c-action:`dequeue actions` node action upon receive. The :kw:`listener.port` parameter is sent to the collector upon :c-action:`pushasset`. The collector uses this port to notify the node."""
     },
+    {
+        "section": "listener",
+        "keyword": "max_workers",
+        "convert": "integer",
+        "default": 32,
+        "text": "The maximum number of threads executing the api request handlers. The listener sockets are served by a single event loop thread, which submits the handlers execution to this pool of workers."
+    },
+    {
+        "section": "listener",
+        "keyword": "multiplex_timeout",
+        "convert": "duration",
+        "default": 300,
+        "text": "A duration expression, like ``1m``, defining how long the listener waits for the nodes responses to a request multiplexed to a node selection. The nodes not responding in time are reported with an error in the partial result."
+    },
     {
         "section": "listener",
         "keyword": "openid_well_known",
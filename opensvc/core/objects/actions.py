@@ -0,0 +1,79 @@
+"""
+The asynchronous actions of the objects, with their orchestration target
+and progress states.
+
+Kept out of core.objects.svc so the commands parsers can load it without
+importing the objects classes.
+"""
+
+ACTION_ASYNC = {
+    "abort": {
+        "target": "aborted",
+        "progress": "aborting",
+    },
+    "delete": {
+        "target": "deleted",
+        "progress": "deleting",
+        "local": True,
+    },
+    "freeze": {
+        "target": "frozen",
+        "progress": "freezing",
+        "local": True,
+    },
+    "giveback": {
+        "target": "placed",
+        "progress": "placing",
+    },
+    "move": {
+        "target": "placed@",
+        "progress": "placing@",
+    },
+    "provision": {
+        "target": "provisioned",
+        "progress": "provisioning",
+        "local": True,
+    },
+    "purge": {
+        "target": "purged",
+        "progress": "purging",
+        "local": True,
+    },
+    "shutdown": {
+        "target": "shutdown",
+        "progress": "shutting",
+        "local": True,
+    },
+    "start": {
+        "target": "started",
+        "progress": "starting",
+        "local": True,
+    },
+    "stop": {
+        "target": "stopped",
+        "progress": "stopping",
+        "local": True,
+    },
+    "switch": {
+        "target": "placed@",
+        "progress": "placing@",
+    },
+    "takeover": {
+        "target": "placed@",
+        "progress": "placing@",
+    },
+    "toc": {
+        "progress": "tocing",
+        "local": True,
+    },
+    "thaw": {
+        "target": "thawed",
+        "progress": "thawing",
+        "local": True,
+    },
+    "unprovision": {
+        "target": "unprovisioned",
+        "progress": "unprovisioning",
+        "local": True,
+    },
+}
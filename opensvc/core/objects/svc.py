@@ -11,6 +11,7 @@ import signal
 import shutil
 import sys
 import tempfile
+import threading
 import time
 from errno import ECONNREFUSED
 
@@ -18,16 +19,19 @@ import core.exceptions as ex
 import core.logger
 import core.status
 import utilities.lock
+import utilities.sysstate
 from core.comm import Crypt, DEFAULT_DAEMON_TIMEOUT
 from core.contexts import want_context
 from core.extconfig import ExtConfigMixin
 from core.freezer import Freezer
 from core.node import Node
+from core.objects.actions import ACTION_ASYNC
 from core.objects.pg import PgMixin
 from core.resource import Resource
 from core.resourceset import ResourceSet
 from core.scheduler import SchedOpts, Scheduler, sched_action
 from env import Env, Paths
+from foreign.six.moves import queue
 from utilities.converters import *
 from utilities.drivers import driver_import
 from utilities.fcache import fcache
@@ -74,78 +78,6 @@ ACTION_ANY_NODE = (
     "unset",
 )
 
-ACTION_ASYNC = {
-    "abort": {
-        "target": "aborted",
-        "progress": "aborting",
-    },
-    "delete": {
-        "target": "deleted",
-        "progress": "deleting",
-        "local": True,
-    },
-    "freeze": {
-        "target": "frozen",
-        "progress": "freezing",
-        "local": True,
-    },
-    "giveback": {
-        "target": "placed",
-        "progress": "placing",
-    },
-    "move": {
-        "target": "placed@",
-        "progress": "placing@",
-    },
-    "provision": {
-        "target": "provisioned",
-        "progress": "provisioning",
-        "local": True,
-    },
-    "purge": {
-        "target": "purged",
-        "progress": "purging",
-        "local": True,
-    },
-    "shutdown": {
-        "target": "shutdown",
-        "progress": "shutting",
-        "local": True,
-    },
-    "start": {
-        "target": "started",
-        "progress": "starting",
-        "local": True,
-    },
-    "stop": {
-        "target": "stopped",
-        "progress": "stopping",
-        "local": True,
-    },
-    "switch": {
-        "target": "placed@",
-        "progress": "placing@",
-    },
-    "takeover": {
-        "target": "placed@",
-        "progress": "placing@",
-    },
-    "toc": {
-        "progress": "tocing",
-        "local": True,
-    },
-    "thaw": {
-        "target": "thawed",
-        "progress": "thawing",
-        "local": True,
-    },
-    "unprovision": {
-        "target": "unprovisioned",
-        "progress": "unprovisioning",
-        "local": True,
-    },
-}
-
 TOP_STATUS_GROUPS = [
     "overall",
     "avail",
@@ -2830,8 +2762,8 @@ class Svc(PgMixin, BaseSvc):
     @lazy
     def full_kwstore(self):
         from .svcdict import KEYS, SECTIONS, DATA_SECTIONS
-        from utilities.drivers import load_drivers
-        load_drivers(SECTIONS + DATA_SECTIONS)
+        from utilities.drivers import load_drivers_keywords
+        load_drivers_keywords(KEYS, SECTIONS + DATA_SECTIONS)
         return KEYS
 
     def load_driver(self, driver_group, driver_basename):
@@ -2871,6 +2803,10 @@ class Svc(PgMixin, BaseSvc):
     def stonith(self):
         return self.oget("DEFAULT", "stonith")
 
+    @lazy
+    def status_workers(self):
+        return self.oget("DEFAULT", "status_workers")
+
     @lazy
     def comment(self):
         return self.oget("DEFAULT", "comment")
@@ -3835,11 +3771,68 @@ class Svc(PgMixin, BaseSvc):
         sets, as a dict of status indexed by resourceset id.
         """
         self.setup_environ()
-        rsets_status = {}
-        for rset in self.get_resourcesets(groups):
-            rsets_status[rset.rid] = rset.status(refresh=refresh)
+        rsets = self.get_resourcesets(groups)
+        with utilities.sysstate.window():
+            if self.status_workers > 1:
+                self.eval_resources_status(rsets, refresh=refresh)
+                # the resources status is now cached
+                refresh = False
+            rsets_status = {}
+            for rset in rsets:
+                rsets_status[rset.rid] = rset.status(refresh=refresh)
         return rsets_status
 
+    def eval_resources_status(self, rsets, refresh=False):
+        """
+        Evaluate the status of the resources of <rsets> in a pool of
+        <status_workers> threads.
+
+        The members of a resourceset are evaluated in sequence by the same
+        worker, unless the subset is parallel. The resources whose driver
+        sets serialize_status are evaluated after the pool is done.
+        """
+        jobs = queue.Queue()
+        serialized = []
+        for rset in rsets:
+            resources = []
+            for resource in rset.resources:
+                if resource.is_disabled():
+                    continue
+                if not self.encap and resource.encap:
+                    continue
+                if resource.serialize_status:
+                    serialized.append(resource)
+                elif rset.parallel:
+                    jobs.put([resource])
+                else:
+                    resources.append(resource)
+            if resources:
+                jobs.put(resources)
+
+        def worker():
+            while True:
+                try:
+                    resources = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                for resource in resources:
+                    try:
+                        resource.status(refresh=refresh)
+                    except Exception as exc:
+                        # the sequential aggregation will retry
+                        resource.log.debug("parallel status evaluation: %s", exc)
+
+        workers = []
+        for _ in range(min(self.status_workers, jobs.qsize())):
+            thr = threading.Thread(target=worker)
+            thr.daemon = True
+            thr.start()
+            workers.append(thr)
+        for thr in workers:
+            thr.join()
+        for resource in serialized:
+            resource.status(refresh=refresh)
+
     def need_encap_resource_monitor(self):
         for res in self.encap_resources.values():
             if res.monitor or res.restart:
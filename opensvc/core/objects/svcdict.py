@@ -205,6 +205,14 @@ KEYWORDS = [
         "default": "@10",
         "text": "The service status evaluation schedule. See ``usr/share/doc/schedule`` for the schedule syntax."
     },
+    {
+        "section": "DEFAULT",
+        "keyword": "status_workers",
+        "convert": "integer",
+        "default": 1,
+        "text": "The maximum number of threads evaluating the resources status concurrently. The default ``1`` evaluates the resources status in sequence. With a higher value, the resourcesets are evaluated concurrently, the member resources of a subset are evaluated concurrently only if the subset ``parallel`` keyword is set, and the resources whose driver does not support concurrent status evaluation are evaluated in sequence after the others.",
+        "example": "4"
+    },
     {
         "section": "DEFAULT",
         "keyword": "sync_schedule",
@@ -15,6 +15,7 @@ import utilities.lock
 import core.exceptions as ex
 import utilities.devices
 import utilities.render.color
+import utilities.sysstate
 from env import Env
 from core.capabilities import capabilities
 from utilities.naming import factory
@@ -43,6 +44,10 @@ class Resource(object):
     refresh_provisioned_on_provision = False
     refresh_provisioned_on_unprovision = False
 
+    # Set by drivers whose status evaluation must not run concurrently with
+    # the other resources status evaluation (see status_workers).
+    serialize_status = False
+
     def __init__(self,
                  rid=None,
                  type=None,
@@ -476,6 +481,9 @@ class Resource(object):
                 self.log.info("ignore %s error on optional resource", action)
             else:
                 raise
+        finally:
+            # the action may have changed the system state
+            utilities.sysstate.invalidate()
 
     def status_stdby(self, status):
         """
@@ -848,6 +848,90 @@ class Scheduler(object):
             raise ex.AbortAction
         return [option.section for option in sched_options], data["delay"]
 
+    def get_next_due(self, action, now=None, lasts=None):
+        """
+        Return the earliest date, not before <now>, at which the <action>
+        validation can succeed, or None if it can not succeed with the
+        current configuration and last run dates.
+
+        The days, weeks and months constraints and the exclusions are not
+        evaluated, so the validation can still fail at the returned date,
+        but it can not succeed before.
+        """
+        if action not in self.scheduler_actions:
+            return
+        if now is None:
+            now = datetime.datetime.now()
+        sched_options = self.scheduler_actions[action]
+        if not isinstance(sched_options, list):
+            sched_options = [sched_options]
+        dues = []
+        for sopt in sched_options:
+            due = self._get_next_due(action, sopt, now, lasts=lasts)
+            if due is not None:
+                dues.append(due)
+        if not dues:
+            return
+        return min(dues)
+
+    def _get_next_due(self, action, sopt, now, lasts=None):
+        if sopt.req_collector and not self.node.collector_env.dbopensvc:
+            return
+        if sopt.schedule_option is None:
+            return now
+        last = self.get_last(sopt.fname)
+        if sopt.fname and lasts:
+            try:
+                cluster_last = lasts[sopt.section][action]["last"]
+            except (KeyError, ValueError):
+                cluster_last = 0
+            if cluster_last:
+                cluster_last = datetime.datetime.fromtimestamp(cluster_last)
+                if not last or cluster_last > last:
+                    last = cluster_last
+        try:
+            schedules = self.sched_get_schedule(sopt.section, sopt.schedule_option)
+        except Exception:
+            return
+        dues = []
+        for schedule in schedules:
+            if schedule["exclude"]:
+                continue
+            for timerange in schedule["timeranges"]:
+                try:
+                    due = self._timerange_next_due(timerange, now, last)
+                except Exception:
+                    continue
+                if due is not None:
+                    dues.append(due)
+        if not dues:
+            return
+        return min(dues)
+
+    def _timerange_next_due(self, timerange, now, last):
+        """
+        Return the earliest date, not before <now>, in <timerange> and
+        satisfying its interval constraint with the <last> run date.
+        """
+        if timerange["interval"] == 0:
+            return
+        due = now
+        if last is not None:
+            due = max(due, last + datetime.timedelta(minutes=timerange["interval"]))
+        begin = self._time_to_minutes(timerange["begin"])
+        end = self._time_to_minutes(timerange["end"])
+        minutes = self._time_to_minutes(due)
+        if begin <= end and minutes > end:
+            due += datetime.timedelta(days=1)
+        elif begin <= end and minutes < begin:
+            pass
+        elif begin > end and end < minutes < begin:
+            pass
+        else:
+            # in timerange
+            return due
+        return due.replace(hour=begin // 60, minute=begin % 60, second=0, microsecond=0)
+
     def action_timestamps(self, action, rids=None, success=False):
         sched_options = self.scheduler_actions[action]
         tsfiles = []
@@ -2,31 +2,183 @@
 Collector Thread
 """
 import sys
+import json
 import logging
+import os
+import shutil
+import tempfile
 import time
 
 import daemon.shared as shared
 from env import Env
 
+# The max number of spooled collector rpc calls. The oldest calls are
+# dropped first.
 MAX_QUEUED = 1000
 
+# The max number of failed sends of a spooled call before dropping it.
+MAX_ATTEMPTS = 5
+
+# The max number of calls sent in a single system.multicall request.
+MULTICALL_MAX = 50
+
+# The rpc wrappers not using the remote calls results, which can be sent
+# in a system.multicall request.
+MULTICALL_FNS = (
+    "begin_action",
+    "end_action",
+    "push_resinfo",
+    "push_status",
+)
+
+# The delays before retrying to send the spooled calls after a collector
+# error, doubled on each consecutive error.
+BACKOFF_MIN = 2
+BACKOFF_MAX = 300
+
+
+def coalesce_key(args):
+    """
+    Return the key identifying the spooled calls superseded by the <args>
+    call, or None if the call supersedes no other call.
+    """
+    try:
+        if args[0] == "push_resinfo":
+            return args[0], sorted(set(str(val[0]) for val in args[1]))
+        if args[0] == "push_status":
+            return args[0], args[1]
+    except (IndexError, TypeError):
+        pass
+
+
+class XmlrpcSpool(object):
+    """
+    The collector rpc calls waiting to be sent, oldest first, persisted in
+    <fpath> to survive a daemon restart.
+    """
+    def __init__(self, fpath=None, max_queued=MAX_QUEUED):
+        self.fpath = fpath
+        self.max_queued = max_queued
+        self.calls = []
+        self.dirty = False
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.calls)
+
+    def load(self):
+        if self.fpath is None:
+            return
+        try:
+            with open(self.fpath, "r") as ofile:
+                calls = json.load(ofile)
+        except (IOError, OSError, ValueError):
+            return
+        for call in calls:
+            try:
+                args, kwargs, attempts = call
+            except (TypeError, ValueError):
+                continue
+            self.add(args, kwargs, attempts)
+
+    def save(self):
+        if self.fpath is None or not self.dirty:
+            return
+        tmpf = tempfile.NamedTemporaryFile(delete=False, dir=os.path.dirname(self.fpath))
+        fpath = tmpf.name
+        tmpf.close()
+        with open(fpath, "w") as ofile:
+            json.dump(self.calls, ofile)
+        shutil.move(fpath, self.fpath)
+        self.dirty = False
+
+    def add(self, args, kwargs, attempts=0):
+        if not args:
+            return
+        key = coalesce_key(args)
+        if key is not None:
+            for idx, call in enumerate(self.calls):
+                if coalesce_key(call[0]) == key:
+                    del self.calls[idx]
+                    self.coalesced += 1
+                    break
+        self.calls.append([args, kwargs, attempts])
+        overlimit = len(self.calls) - self.max_queued
+        if overlimit > 0:
+            del self.calls[:overlimit]
+            self.dropped += overlimit
+        self.dirty = True
+
+    def batch(self, multicall=False):
+        """
+        Return the oldest calls to send in a single request. The calls
+        already failed are sent alone, so they can not fail a whole batch
+        again.
+        """
+        args, _, attempts = self.calls[0]
+        if not multicall or attempts or args[0] not in MULTICALL_FNS:
+            return self.calls[:1]
+        calls = []
+        for call in self.calls[:MULTICALL_MAX]:
+            if call[2] or call[0][0] not in MULTICALL_FNS:
+                break
+            calls.append(call)
+        return calls
+
+    def done(self, calls, errors):
+        """
+        Unspool the <calls> sent, except the failed calls not yet tried
+        MAX_ATTEMPTS times. Return the number of failed calls.
+        """
+        failed = 0
+        for call, error in zip(calls, errors):
+            if error is not None:
+                failed += 1
+                call[2] += 1
+                if call[2] < MAX_ATTEMPTS:
+                    continue
+                self.dropped += 1
+            else:
+                self.sent += 1
+            self.calls.remove(call)
+        self.dirty = True
+        return failed
+
+    def status(self):
+        return {
+            "queued": len(self.calls),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
 class Collector(shared.OsvcThread):
     name = "collector"
     update_interval = 300
     min_update_interval = 10
     min_ping_interval = 60
+    spool = None
+    xmlrpc_errors = 0
+    xmlrpc_next_try = 0
 
     def reset(self):
         self.last_comm = None
         self.last_config = {}
         self.last_status = {}
         self.last_status_changed = set()
+        self.status_gen = 0
+        self.pushed_gen = None
 
     def run(self):
         self.set_tid()
         self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.collector"), {"node": Env.nodename, "component": self.name})
         self.log.info("collector started")
         self.reset()
+        self.spool = XmlrpcSpool(os.path.join(Env.paths.pathvar, "collector_xmlrpc_spool.json"))
+        self.spool.load()
 
         while True:
             if self.stopped():
@@ -43,25 +195,35 @@ class Collector(shared.OsvcThread):
         """
         last_status = {}
         last_status_changed = set()
+        parents = []
 
-        def add_parents(_path, done=None):
+        def get_parents():
             """
-            Propagate change to the service parents
+            Return the index of the parents of each service, built on first
+            use.
             """
-            if done is None:
-                done = []
-            if _path in done:
-                # break recursion loop
-                return
-            for nodename, ndata in data["nodes"].items():
+            if parents:
+                return parents[0]
+            index = {}
+            for ndata in data["nodes"].values():
                 for path, sdata in ndata.get("services", {}).get("status", {}).items():
-                    slaves = sdata.get("slaves", []) + sdata.get("scaler_slaves", [])
-                    if _path not in slaves:
-                        continue
+                    for slave in sdata.get("slaves", []) + sdata.get("scaler_slaves", []):
+                        index.setdefault(slave, set()).add(path)
+            parents.append(index)
+            return index
+
+        def add_parents(_path):
+            """
+            Propagate change to the service parents
+            """
+            index = get_parents()
+            todo = [_path]
+            while todo:
+                for path in index.get(todo.pop(), ()):
                     if path in last_status_changed:
                         continue
                     last_status_changed.add(path)
-                    add_parents(path, done=done+[_path])
+                    todo.append(path)
 
         for path, nodename in self.last_status:
             if path is None:
@@ -114,40 +276,132 @@ class Collector(shared.OsvcThread):
             self.log.info("the collector is reachable")
             self.reset()
 
+    def status(self, **kwargs):
+        data = shared.OsvcThread.status(self, **kwargs)
+        if self.spool is not None:
+            data["xmlrpc"] = self.spool.status()
+            data["xmlrpc"]["errors"] = self.xmlrpc_errors
+            data["xmlrpc"]["next_try"] = self.xmlrpc_next_try
+            data["xmlrpc"]["stats"] = self.rpc_stats()
+        return data
+
+    @staticmethod
+    def rpc_stats():
+        from core.collector.rpc import stats
+        return stats()
+
     def do(self):
         self.reload_config()
         self.init_collector()
         if shared.NODE.collector.disabled():
-            self.queue_limit()
+            self.spool_xmlrpc()
         else:
             self.run_collector()
             self.unqueue_xmlrpc()
         if not self.stopped():
             with shared.COLLECTOR_TICKER:
-                shared.COLLECTOR_TICKER.wait(self.update_interval)
+                shared.COLLECTOR_TICKER.wait(self.wait_delay())
 
-    def queue_limit(self):
-        overlimit = len(shared.COLLECTOR_XMLRPC_QUEUE) - MAX_QUEUED
-        if overlimit > 0:
-            #self.log.warning("drop %d queued messages", overlimit)
-            for _ in range(overlimit):
-                shared.COLLECTOR_XMLRPC_QUEUE.pop()
+    def wait_delay(self):
+        if self.spool and self.xmlrpc_next_try:
+            return max(min(self.update_interval, self.xmlrpc_next_try - time.time()), 1)
+        return self.update_interval
 
-    def unqueue_xmlrpc(self):
+    def spool_xmlrpc(self):
+        """
+        Move the rpc calls queued by the listener to the spool.
+
+        The end_action log files are embedded in the spooled calls, so the
+        calls can be retried, and removed once the spool is saved.
+        """
+        alogfiles = []
         while True:
             try:
                 args, kwargs = shared.COLLECTOR_XMLRPC_QUEUE.pop()
             except IndexError:
                 break
-            if len(args) == 0:
-                continue
+            if args and args[0] == "end_action":
+                args, kwargs, alogfile = self.embed_action_log(args, kwargs)
+                if alogfile:
+                    alogfiles.append(alogfile)
+            self.spool.add(args, kwargs)
+        if self.save_spool():
+            for alogfile in alogfiles:
+                try:
+                    os.unlink(alogfile)
+                except OSError:
+                    pass
+
+    def embed_action_log(self, args, kwargs):
+        """
+        Return the end_action <args> and <kwargs> with the action log file
+        content passed as the "alog" keyword, and the log file path.
+        """
+        args = list(args)
+        kwargs = dict(kwargs)
+        if len(args) > 6:
+            alogfile = args.pop(6)
+        else:
+            alogfile = kwargs.pop("alogfile", None)
+        if alogfile is None or "alog" in kwargs:
+            return args, kwargs, None
+        try:
+            with open(alogfile, "r") as ofile:
+                kwargs["alog"] = ofile.read()
+        except (IOError, OSError) as exc:
+            self.log.warning("read the action log %s: %s", alogfile, exc)
+            kwargs["alog"] = ""
+        return args, kwargs, alogfile
+
+    def save_spool(self):
+        try:
+            self.spool.save()
+        except Exception as exc:
+            self.log.error("save the collector rpc spool: %s", exc)
+            return False
+        return True
+
+    def unqueue_xmlrpc(self):
+        """
+        Send the spooled rpc calls, batched in system.multicall requests if
+        the collector supports it. On collector error, retry later with an
+        exponential backoff.
+        """
+        self.spool_xmlrpc()
+        if not self.spool or time.time() < self.xmlrpc_next_try:
+            return
+        multicall = "system.multicall" in shared.NODE.collector.proxy_methods
+        while self.spool:
+            calls = self.spool.batch(multicall)
             try:
-                #self.log.info("call %s", args[0])
-                shared.NODE.collector.call(*args, **kwargs)
+                if multicall and len(calls) > 1:
+                    errors = shared.NODE.collector.multicall([call[:2] for call in calls])
+                else:
+                    args, kwargs, _ = calls[0]
+                    shared.NODE.collector.call(*args, **kwargs)
+                    errors = [None]
             except Exception as exc:
-                self.log.error("call %s: %s", args[0], exc)
-                time.sleep(0.2)
+                self.log.error("call %s: %s", ",".join(sorted(set(call[0][0] for call in calls))), exc)
+                self.spool.done(calls, [exc] * len(calls))
+                self.xmlrpc_backoff()
                 shared.NODE.collector.disable()
+                break
+            for call, error in zip(calls, errors):
+                if error is not None:
+                    self.log.error("call %s: %s", call[0][0], error)
+            if self.spool.done(calls, errors):
+                self.xmlrpc_backoff()
+                break
+        else:
+            self.xmlrpc_errors = 0
+            self.xmlrpc_next_try = 0
+        self.save_spool()
+
+    def xmlrpc_backoff(self):
+        delay = min(BACKOFF_MIN * 2 ** self.xmlrpc_errors, BACKOFF_MAX)
+        self.xmlrpc_errors += 1
+        self.xmlrpc_next_try = time.time() + delay
+        self.log.info("retry the collector rpc calls in %d seconds", delay)
 
     def send_containerinfo(self, path):
         if path not in shared.SERVICES:
@@ -173,7 +427,14 @@ class Collector(shared.OsvcThread):
                 self.log.error("call push_config: %s", exc)
                 shared.NODE.collector.disable()
 
+    @staticmethod
+    def delta_supported():
+        return "push_daemon_status_delta" in shared.NODE.collector.proxy_methods
+
     def send_daemon_status(self, data):
+        if self.delta_supported():
+            self.send_daemon_status_delta(data)
+            return
         if self.last_status_changed:
             self.log.info("send daemon status, %d changes", len(self.last_status_changed))
         else:
@@ -185,12 +446,87 @@ class Collector(shared.OsvcThread):
             shared.NODE.collector.disable()
         self.last_comm = time.time()
 
+    def send_daemon_status_delta(self, data):
+        """
+        Send only the nodes and instances changed since the last push, or
+        the full daemon status if the collector does not hold the last
+        pushed generation.
+        """
+        changes = list(self.last_status_changed)
+        self.status_gen += 1
+        if self.pushed_gen is None or not changes:
+            self.log.info("send daemon status gen %d, resync", self.status_gen)
+            result = self.call_push_daemon_status_delta(data, changes, None)
+        else:
+            self.log.info("send daemon status gen %d, %d changes", self.status_gen, len(changes))
+            result = self.call_push_daemon_status_delta(self.get_delta(data, changes), changes, self.pushed_gen)
+            if result and result.get("info") == "resync":
+                self.log.info("delta rejected, collector ask for resync")
+                self.status_gen += 1
+                result = self.call_push_daemon_status_delta(data, changes, None)
+        self.last_comm = time.time()
+
+    def call_push_daemon_status_delta(self, data, changes, base_gen):
+        try:
+            result = shared.NODE.collector.call("push_daemon_status_delta", data, changes,
+                                                self.status_gen, base_gen)
+        except Exception as exc:
+            self.log.error("call push_daemon_status_delta: %s", exc)
+            shared.NODE.collector.disable()
+            # the collector state is unknown: resync on next push
+            self.pushed_gen = None
+            return
+        self.pushed_gen = self.status_gen
+        return result
+
+    @staticmethod
+    def get_delta(data, changes):
+        """
+        Return the subset of the <data> daemon status concerned by the
+        <changes>, formatted as "<path>", "<path>@<nodename>" and
+        "@<nodename>". The removed nodes and instances are absent from the
+        delta, and the collector deduces their removal from the changes.
+        """
+        delta = dict((key, value) for key, value in data.items() if key not in ("nodes", "services"))
+        delta["nodes"] = {}
+        delta["services"] = {}
+
+        def delta_node(nodename):
+            if nodename not in delta["nodes"]:
+                delta["nodes"][nodename] = {
+                    "frozen": data["nodes"][nodename].get("frozen"),
+                    "services": {
+                        "config": {},
+                        "status": {},
+                    },
+                }
+            return delta["nodes"][nodename]
+
+        for change in changes:
+            path, _, nodename = change.partition("@")
+            if not nodename:
+                if path in data["services"]:
+                    delta["services"][path] = data["services"][path]
+                continue
+            if nodename not in data["nodes"]:
+                continue
+            ndelta = delta_node(nodename)
+            if not path:
+                continue
+            for key in ("status", "config"):
+                try:
+                    ndelta["services"][key][path] = data["nodes"][nodename]["services"][key][path]
+                except KeyError:
+                    pass
+        return delta
+
     def ping(self, data):
         self.log.debug("ping the collector")
         try:
             result = shared.NODE.collector.call("daemon_ping")
             if result and result.get("info") == "resync":
                 self.log.info("ping rejected, collector ask for resync")
+                self.pushed_gen = None
                 self.send_daemon_status(data)
         except Exception as exc:
             self.log.error("call daemon_ping: %s", exc)
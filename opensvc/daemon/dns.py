@@ -12,8 +12,8 @@ import json
 import re
 import time
 
-import foreign.six as six
 import daemon.shared as shared
+from daemon.listener import Poller, POLL_READ, POLL_WRITE
 from env import Env
 from utilities.storage import Storage
 from utilities.naming import split_path
@@ -25,10 +25,112 @@ PTR_SUFFIX_LEN = 14
 PTR6_SUFFIX = ".ip6.arpa."
 PTR6_SUFFIX_LEN = 10
 
-if six.PY2:
-    MAKEFILE_KWARGS = {"bufsize": 0}
-else:
-    MAKEFILE_KWARGS = {"buffering": None}
+# The max size of a request line.
+MAX_REQUEST_SIZE = 1024 * 1024
+
+# The delay after which the connections without request are closed.
+CLIENT_IDLE_TMO = 60
+
+RECV_SIZE = 65536
+
+
+class DnsClient(object):
+    """
+    A PowerDNS remote backend connection, with its pending request and
+    response buffers.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.rbuff = b""
+        self.wbuff = b""
+        self.last = time.time()
+
+
+class ZoneIndex(object):
+    """
+    The dns records contributed by each object instance, and the records
+    merged by name.
+
+    Updating the contribution of an instance only merges again the names
+    it contributed to, before and after the update.
+
+    Record kinds:
+
+    * a: qname => set of addresses
+    * srv: qname => set of srv contents
+    * ptr: qname => list of targets
+    * rev: reverse zone name => True
+    """
+    kinds = ("a", "srv", "ptr", "rev")
+
+    def __init__(self):
+        self.markers = {}
+        self.contribs = {}
+        self.owners = dict((kind, {}) for kind in self.kinds)
+        self.records = dict((kind, {}) for kind in self.kinds)
+
+    def keys(self):
+        return list(self.contribs)
+
+    def changed(self, key, marker):
+        return self.markers.get(key) != marker or key not in self.contribs
+
+    def update(self, key, marker, contribs):
+        dirty = self.unlink(key)
+        self.markers[key] = marker
+        self.contribs[key] = contribs
+        for kind, names in contribs.items():
+            for qname, values in names.items():
+                self.owners[kind].setdefault(qname, {})[key] = values
+                dirty.add((kind, qname))
+        self.merge(dirty)
+
+    def remove(self, key):
+        self.merge(self.unlink(key))
+        self.markers.pop(key, None)
+
+    def unlink(self, key):
+        dirty = set()
+        for kind, names in self.contribs.pop(key, {}).items():
+            for qname in names:
+                del self.owners[kind][qname][key]
+                dirty.add((kind, qname))
+        return dirty
+
+    def merge(self, dirty):
+        for kind, qname in dirty:
+            owners = self.owners[kind].get(qname)
+            if not owners:
+                self.owners[kind].pop(qname, None)
+                self.records[kind].pop(qname, None)
+                continue
+            keys = sorted(owners)
+            if kind == "a":
+                merged = set()
+                for key in keys:
+                    merged |= owners[key]
+            elif kind == "srv":
+                # avoid multiple SRV entries pointing to the same ip:port
+                merged = set()
+                uends = set()
+                for key in keys:
+                    for content in owners[key]:
+                        uend = content.split(" ", 2)[-1]
+                        if uend in uends:
+                            continue
+                        uends.add(uend)
+                        merged.add(content)
+            elif kind == "ptr":
+                merged = []
+                for key in keys:
+                    for target in owners[key]:
+                        if target not in merged:
+                            merged.append(target)
+            else:
+                merged = True
+            self.records[kind][qname] = merged
+
 
 class Dns(shared.OsvcThread):
     name = "dns"
@@ -38,26 +140,36 @@ class Dns(shared.OsvcThread):
         self.set_tid()
         self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.dns"), {"node": Env.nodename, "component": self.name})
         self.wait_monitor()
-        self.cache = {}
         if not os.path.exists(Env.paths.dnsuxsockd):
             os.makedirs(Env.paths.dnsuxsockd)
         try:
-            if os.path.isdir(Env.paths.dnsuxsock):
-                shutil.rmtree(Env.paths.dnsuxsock)
-            else:
-                os.unlink(Env.paths.dnsuxsock)
-        except Exception:
-            pass
-        try:
-            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-            self.sock.bind(Env.paths.dnsuxsock)
-            self.sock.listen(1)
-            self.sock.settimeout(self.sock_tmo)
+            self.listen(Env.paths.dnsuxsock)
         except socket.error as exc:
             self.alert("error", "bind %s error: %s", Env.paths.dnsuxsock, exc)
             return
-
         self.log.info("listening on %s", Env.paths.dnsuxsock)
+        self.setup_zone()
+        self.serve()
+        sys.exit(0)
+
+    def listen(self, path):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+        except Exception:
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(128)
+        self.sock.setblocking(0)
+
+    def setup_zone(self):
+        self.index = ZoneIndex()
+        self.index_lock = threading.RLock()
+        self.index_gens = {}
+        self.index_key = None
 
         self.zone = "%s." % self.cluster_name.strip(".")
         self.suffix = ".%s" % self.zone
@@ -77,21 +189,33 @@ class Dns(shared.OsvcThread):
         self.stats = Storage({
             "sessions": Storage({
                 "accepted": 0,
+                "alive": 0,
                 "tx": 0,
                 "rx": 0,
             }),
         })
 
+    def serve(self):
+        """
+        Serve the PowerDNS remote backend requests until the thread is
+        stopped.
+        """
+        self.poller = Poller()
+        self.poller.set(self.sock.fileno(), POLL_READ, None)
+        self.clients = {}
+        self.last_janitor = 0
         while True:
             try:
                 self.do()
             except Exception as exc:
                 self.log.exception(exc)
             if self.stopped():
-                self.log.debug("stop event received (%d handler threads to join)", len(self.threads))
-                self.join_threads()
+                self.log.debug("stop event received (%d clients to close)", len(self.clients))
+                for client in list(self.clients.values()):
+                    self.close_client(client)
+                self.poller.close()
                 self.sock.close()
-                sys.exit(0)
+                return
 
     def wait_monitor(self):
         while True:
@@ -99,18 +223,6 @@ class Dns(shared.OsvcThread):
                 break
             time.sleep(0.2)
 
-    def cache_key(self):
-        data = self.get_gen(inc=False)
-        key = []
-        for node in self.cluster_nodes:
-            try:
-                key.append(data[node])
-            except KeyError:
-                continue
-            except AttributeError:
-                break
-        return tuple(key)
-
     def status(self, **kwargs):
         data = shared.OsvcThread.status(self, **kwargs)
         if hasattr(self, "stats"):
@@ -118,97 +230,127 @@ class Dns(shared.OsvcThread):
         return data
 
     def do(self):
-        self.reload_config()
-        self.janitor_procs()
-        self.janitor_threads()
+        now = time.time()
+        if now - self.last_janitor >= self.sock_tmo:
+            self.last_janitor = now
+            self.reload_config()
+            self.janitor_procs()
+            self.janitor_clients(now)
+        for client, readable, writable in self.poller.select(self.sock_tmo):
+            if client is None:
+                self.accept()
+                continue
+            if readable:
+                self.client_read(client)
+            if writable and client.fd in self.clients:
+                self.client_write(client)
 
-        try:
-            conn, addr = self.sock.accept()
-            #self.log.info("accept connection")
-            self.stats.sessions.accepted += 1
-        except socket.timeout:
-            return
-        try:
-            thr = threading.Thread(target=self.handle_client, args=(conn,))
-            thr.start()
-            self.threads.append(thr)
-        except RuntimeError as exc:
-            self.log.warning(exc)
-            conn.close()
-
-    def handle_client(self, conn):
-        # todo: change implementation to avoid socket.makefile with non blocking mode
-        conn.settimeout(self.sock_tmo)
-        cr = conn.makefile("r", **MAKEFILE_KWARGS)
-        cw = conn.makefile("w", **MAKEFILE_KWARGS)
-        try:
-            self._handle_client(conn, cr, cw)
-        except Exception as exc:
-            self.log.exception(exc)
-        finally:
-            try:
-                cr.close()
-            except socket.error:
-                pass
-            try:
-                cw.close()
-            except socket.error:
-                pass
-            try:
-                conn.close()
-            except socket.error:
-                pass
-            sys.exit(0)
-
-    def _handle_client(self, conn, cr, cw):
-        chunks = []
-        buff_size = 4096
+    def accept(self):
         while True:
             try:
-                data = cr.readline()
-            except socket.timeout as exc:
-                break
+                conn, _ = self.sock.accept()
             except socket.error as exc:
-                self.log.info("%s", exc)
-                break
-            if len(data) == 0:
-                #self.log.info("no more data")
-                break
-
-            self.log.debug("received %s", data)
-
-            try:
-                data = bdecode(data)
-                data = json.loads(data)
-            except Exception as exc:
-                self.log.error(exc)
-                data = None
+                if exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return
+                raise
+            conn.setblocking(0)
+            client = DnsClient(conn)
+            self.clients[client.fd] = client
+            self.poller.set(client.fd, POLL_READ, client)
+            self.stats.sessions.accepted += 1
+            self.stats.sessions.alive = len(self.clients)
 
-            if self.stopped():
-                self.log.info("stop event received (handler thread)")
-                break
+    def close_client(self, client):
+        self.poller.unregister(client.fd)
+        self.clients.pop(client.fd, None)
+        self.stats.sessions.alive = len(self.clients)
+        try:
+            client.sock.close()
+        except socket.error:
+            pass
 
-            if data is None or not isinstance(data, dict):
-                continue
+    def janitor_clients(self, now):
+        """
+        Close the connections idle for more than CLIENT_IDLE_TMO.
+        """
+        for client in list(self.clients.values()):
+            if now - client.last > CLIENT_IDLE_TMO:
+                self.close_client(client)
 
+    def client_read(self, client):
+        try:
+            data = client.sock.recv(RECV_SIZE)
+        except socket.error as exc:
+            if exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.log.info("%s", exc)
+            self.close_client(client)
+            return
+        if not data:
+            self.close_client(client)
+            return
+        client.last = time.time()
+        self.stats.sessions.rx += len(data)
+        client.rbuff += data
+        if b"\n" not in client.rbuff:
+            if len(client.rbuff) > MAX_REQUEST_SIZE:
+                self.log.warning("request too large, close the connection")
+                self.close_client(client)
+            return
+        # pipelined requests are answered in order
+        lines = client.rbuff.split(b"\n")
+        client.rbuff = lines.pop()
+        for line in lines:
+            message = self.handle_request(line)
+            if message is not None:
+                client.wbuff += message
+        self.client_write(client)
+
+    def client_write(self, client):
+        while client.wbuff:
             try:
-                result = self.router(data)
-            except Exception as exc:
-                self.log.error("dns request: %s => handler error: %s", data, exc)
-                return {"error": "unexpected backend error", "result": False}
-            if result is not None:
-                message = json.dumps(result) + "\n"
-                try:
-                    cw.write(message)
-                    cw.flush()
-                except socket.error as exc:
-                    if exc.errno != errno.EPIPE:
-                        raise
-                    self.log.info("client died (broken pipe)")
+                sent = client.sock.send(client.wbuff)
+            except socket.error as exc:
+                if exc.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
                     break
-                self.log.debug("replied %s", message)
-                message_len = len(message)
-                self.stats.sessions.tx += message_len
+                if exc.args[0] != errno.EPIPE:
+                    self.log.info("%s", exc)
+                else:
+                    self.log.info("client died (broken pipe)")
+                self.close_client(client)
+                return
+            self.stats.sessions.tx += sent
+            client.wbuff = client.wbuff[sent:]
+        if client.wbuff:
+            self.poller.set(client.fd, POLL_READ | POLL_WRITE, client)
+        else:
+            self.poller.set(client.fd, POLL_READ, client)
+
+    def handle_request(self, line):
+        """
+        Return the encoded response to a json request line, or None if no
+        response is due.
+        """
+        if not line.strip():
+            return
+        self.log.debug("received %s", line)
+        try:
+            data = json.loads(bdecode(line))
+        except Exception as exc:
+            self.log.error(exc)
+            return
+        if not isinstance(data, dict):
+            return
+        try:
+            result = self.router(data)
+        except Exception as exc:
+            self.log.error("dns request: %s => handler error: %s", data, exc)
+            result = {"error": "unexpected backend error", "result": False}
+        if result is None:
+            return
+        message = json.dumps(result) + "\n"
+        self.log.debug("replied %s", message)
+        return message.encode()
 
     #########################################################################
     #
@@ -290,7 +432,7 @@ class Dns(shared.OsvcThread):
 
     def lookup_pattern(self, suffix):
         data = []
-        for qname, contents in self.a_records().items():
+        for qname, contents in list(self.a_records().items()):
             if not qname.endswith(suffix):
                 continue
             for content in contents:
@@ -315,7 +457,7 @@ class Dns(shared.OsvcThread):
             data += self.zone_ns_records(suffix)
         else:
             data += self.zone_ns_records(self.zone)
-        for qname, contents in self.a_records().items():
+        for qname, contents in list(self.a_records().items()):
             if suffix and not qname.endswith(suffix):
                 continue
             for content in contents:
@@ -325,7 +467,7 @@ class Dns(shared.OsvcThread):
                     "content": content,
                     "ttl": 60
                 })
-        for qname, contents in self.srv_records().items():
+        for qname, contents in list(self.srv_records().items()):
             if suffix and not qname.endswith(suffix):
                 continue
             for content in contents:
@@ -335,7 +477,7 @@ class Dns(shared.OsvcThread):
                     "content": content,
                     "ttl": 60
                 })
-        for qname, contents in self.ptr_records().items():
+        for qname, contents in list(self.ptr_records().items()):
             if suffix and not qname.endswith(suffix):
                 continue
             for content in contents:
@@ -380,20 +522,12 @@ class Dns(shared.OsvcThread):
         return [self.zone]
 
     def soa_records_rev(self):
-        addrs = set([PTR_SUFFIX[1:]])
-        for addr in set(self.svc_ips()):
-            z1 = ".".join(reversed(addr.split(".")[:-1]))+PTR_SUFFIX
-            z2 = ".".join(reversed(addr.split(".")[:-2]))+PTR_SUFFIX
-            z3 = ".".join(reversed(addr.split(".")[:-3]))+PTR_SUFFIX
-            addrs.add(z1)
-            addrs.add(z2)
-            addrs.add(z3)
-        return addrs
+        return self.zone_records("rev")
 
     def soa_record(self, parameters):
         qname = parameters.get("qname").lower()
         if qname.endswith(PTR_SUFFIX):
-            if qname not in self.soa_records_rev():
+            if qname != PTR_SUFFIX[1:] and qname not in self.soa_records_rev():
                 return []
         elif qname != self.zone:
             return []
@@ -447,122 +581,183 @@ class Dns(shared.OsvcThread):
         } for addr in self.a_records().get(qname, [])]
 
     def ptr_records(self):
-        data = self.get_cache("ptr")
-        if data is not None:
-            return data
-        names = {}
-        key = self.cache_key()
-        for nodename in self.cluster_nodes:
-            try:
-                node = shared.CLUSTER_DATA[nodename]
-            except KeyError:
-                continue
-            status = node.get("services", {}).get("status", {})
-            for path, svc in status.items():
-                name, namespace, kind = split_path(path)
-                if kind != "svc":
-                    continue
-                if not namespace:
-                    namespace = "root"
-                for rid, resource in status[path].get("resources", {}).items():
-                    addr = resource.get("info", {}).get("ipaddr")
-                    if addr is None:
-                        continue
-                    qname = "%s%s" % (
-                        ".".join(reversed(addr.split("."))),
-                        PTR_SUFFIX,
-                    )
-                    if qname not in names:
-                        names[qname] = []
-                    try:
-                        hostname = resource.get("info", {}).get("hostname").split(".")[0].lower()
-                    except Exception:
-                        hostname = None
-                    gen_name = "%s.%s.%s.%s." % (name, namespace, kind, self.cluster_name)
-                    gen_name = gen_name.lower()
-                    if hostname and hostname != name:
-                        target = "%s.%s" % (hostname, gen_name)
-                    else:
-                        target = "%s" % gen_name
-                    if target in names[qname]:
-                        continue
-                    names[qname].append(target)
-        self.set_cache(key, "ptr", names)
-        return names
+        return self.zone_records("ptr")
 
-    def set_cache(self, key, kind, data):
-        if key not in self.cache:
-            self.cache = {}
-        self.cache[key] = {kind: data}
+    def a_records(self):
+        return self.zone_records("a")
 
-    def get_cache(self, kind):
-        key = self.cache_key()
-        if key not in self.cache:
-            self.cache = {}
-            return
-        if kind not in self.cache[key]:
-            return
-        return self.cache[key].get(kind)
+    def srv_records(self):
+        return self.zone_records("srv")
 
-    @staticmethod
-    def unique_name(addr):
-        return addr.replace(".", "-").replace(":", "-")
+    def zone_records(self, kind):
+        """
+        Return the <kind> records, indexed by qname, after applying the
+        instances changes to the zone index.
+        """
+        with self.index_lock:
+            self.update_index()
+        return self.index.records[kind]
 
-    def a_records(self):
-        data = self.get_cache("a")
-        if data is not None:
-            return data
-        names = {}
-        key = self.cache_key()
-        for nodename in self.cluster_nodes:
-            try:
-                node = shared.CLUSTER_DATA[nodename]
-            except KeyError:
+    def update_index(self):
+        """
+        Update the zone index contributions of the instances of the nodes
+        whose data generation changed since the last update.
+        """
+        try:
+            gens = self.get_gen(inc=False)
+        except AttributeError:
+            gens = {}
+        nodes = [nodename for nodename in self.cluster_nodes if nodename in shared.CLUSTER_DATA]
+        key = (
+            self.cluster_name,
+            tuple(shared.NODE.dns),
+            tuple((nodename, gens.get(nodename)) for nodename in nodes),
+        )
+        if key == self.index_key and all(gen is not None for _, gen in key[2]):
+            return
+        if self.index_key is None or self.index_key[0] != self.cluster_name:
+            self.index = ZoneIndex()
+            self.index_gens = {}
+        if self.index.changed(("", "ns"), key[1]):
+            self.index.update(("", "ns"), key[1], {"a": self.dns_a_records()})
+        for nodename in set(self.index_gens) - set(nodes):
+            for path in self.index_gens.pop(nodename)[1]:
+                self.index.remove((nodename, path))
+        for nodename, gen in key[2]:
+            if gen is not None and self.index_gens.get(nodename, (None,))[0] == gen:
                 continue
+            node = shared.CLUSTER_DATA[nodename]
             status = node.get("services", {}).get("status", {})
-            for path, svc in status.items():
-                name, namespace, kind = split_path(path)
-                if kind != "svc":
+            weight = node.get("stats", {}).get("score", 10)
+            paths = set()
+            for path, svc in list(status.items()):
+                paths.add(path)
+                marker = (svc.get("csum") or svc.get("updated"), weight)
+                if marker[0] is not None and not self.index.changed((nodename, path), marker):
                     continue
-                if namespace:
-                    namespace = namespace.lower()
-                else:
-                    namespace = "root"
-                scaler_slave = svc.get("scaler_slave")
-                if scaler_slave:
-                    _name = name[name.index(".")+1:]
-                else:
-                    _name = name
+                self.index.update((nodename, path), marker, self.instance_records(nodename, path, svc, weight))
+            for path in self.index_gens.get(nodename, (None, set()))[1] - paths:
+                self.index.remove((nodename, path))
+            self.index_gens[nodename] = (gen, paths)
+        self.index_key = key
 
-                zone = "%s.%s.%s." % (namespace, kind, self.cluster_name)
-                qname = "%s.%s" % (_name, zone)
-                if qname not in names:
-                    names[qname] = set()
+    def instance_records(self, nodename, path, svc, weight):
+        """
+        Return the records contributed by the <path> instance on
+        <nodename>, in the ZoneIndex format.
+        """
+        data = {
+            "a": {},
+            "srv": {},
+            "ptr": {},
+            "rev": {},
+        }
+        name, namespace, kind = split_path(path)
+        resources = svc.get("resources", {})
+        for resource in resources.values():
+            addr = resource.get("info", {}).get("ipaddr")
+            if addr is None:
+                continue
+            for i in (1, 2, 3):
+                data["rev"][".".join(reversed(addr.split(".")[:-i]))+PTR_SUFFIX] = True
+        if kind != "svc":
+            return data
+        if namespace:
+            namespace = namespace.lower()
+        else:
+            namespace = "root"
+        scaler_slave = svc.get("scaler_slave")
+        if scaler_slave:
+            _name = name[name.index(".")+1:]
+        else:
+            _name = name
+
+        zone = "%s.%s.%s." % (namespace, kind, self.cluster_name)
+        qname = "%s.%s" % (_name, zone)
+        local_zone = "%s.%s.%s.node.%s." % (namespace, kind, nodename, self.cluster_name)
+        local_qname = "%s.%s" % (_name, local_zone)
+        gen_name = ("%s.%s.%s.%s." % (name, namespace, kind, self.cluster_name)).lower()
+
+        def add(_kind, _qname, value):
+            if _kind == "ptr":
+                values = data[_kind].setdefault(_qname, [])
+                if value not in values:
+                    values.append(value)
+            else:
+                data[_kind].setdefault(_qname, set()).add(value)
 
-                local_zone = "%s.%s.%s.node.%s." % (namespace, kind, nodename, self.cluster_name)
-                local_qname = "%s.%s" % (_name, local_zone)
-                if local_qname not in names:
-                    names[local_qname] = set()
+        for rid, resource in resources.items():
+            info = resource.get("info", {})
+            addr = info.get("ipaddr")
+            if addr is None:
+                continue
 
-                for rid, resource in status.get(path, {}).get("resources", {}).items():
-                    addr = resource.get("info", {}).get("ipaddr")
-                    if addr is None:
+            # forward
+            hostname = info.get("hostname")
+            add("a", qname, addr)
+            add("a", local_qname, addr)
+            add("a", self.unique_name(addr) + "." + qname, addr)
+            if hostname:
+                add("a", hostname.split(".")[0] + "." + qname, addr)
+
+            # reverse
+            add("ptr", "%s%s" % (".".join(reversed(addr.split("."))), PTR_SUFFIX),
+                self.ptr_target(name, hostname, gen_name))
+
+            # services
+            for expose in info.get("expose", []):
+                if "#" in expose:
+                    # expose data by reference
+                    expose_data = resources.get(expose, {}).get("info")
+                    try:
+                        port = expose_data["port"]
+                        proto = expose_data["protocol"]
+                    except (KeyError, TypeError):
                         continue
-                    hostname = resource.get("info", {}).get("hostname")
-                    names[qname].add(addr)
-                    names[local_qname].add(addr)
-                    rname = self.unique_name(addr) + "." + qname
-                    if rname not in names:
-                        names[rname] = set()
-                    names[rname].add(addr)
-                    if hostname:
-                        name = hostname.split(".")[0] + "." + qname
-                        if name not in names:
-                            names[name] = set()
-                        names[name].add(addr)
-        names.update(self.dns_a_records())
-        self.set_cache(key, "a", names)
-        return names
+                else:
+                    # expose data inline
+                    try:
+                        port, proto = re.split("[/-]", expose.split(":")[0])
+                        port = int(port)
+                    except Exception as exc:
+                        continue
+                target = "%s.%s.%s.%s.%s." % (self.unique_name(addr), _name, namespace, kind, self.cluster_name)
+                content = "%(prio)d %(weight)d %(port)d %(target)s" % {
+                    "prio": 0,
+                    "weight": weight,
+                    "port": port,
+                    "target": target,
+                }
+                for srv_qname in self.srv_qnames(port, proto, _name, namespace, kind):
+                    add("srv", srv_qname, content)
+        return data
+
+    @staticmethod
+    def ptr_target(name, hostname, gen_name):
+        try:
+            hostname = hostname.split(".")[0].lower()
+        except Exception:
+            hostname = None
+        if hostname and hostname != name:
+            return "%s.%s" % (hostname, gen_name)
+        return gen_name
+
+    def srv_qnames(self, port, proto, name, namespace, kind):
+        qnames = set()
+        qnames.add("_%s._%s.%s.%s.%s.%s." % (str(port), proto, name, namespace, kind, self.cluster_name))
+        try:
+            serv = socket.getservbyport(port)
+            qnames.add("_%s._%s.%s.%s.%s.%s." % (serv, proto, name, namespace, kind, self.cluster_name))
+        except (socket.error, OSError) as exc:
+            # port/proto not found
+            pass
+        except Exception as exc:
+            self.log.warning("port %d resolution failed: %s", port, exc)
+        return qnames
+
+    @staticmethod
+    def unique_name(addr):
+        return addr.replace(".", "-").replace(":", "-")
 
     def dns_a_records(self):
         names = {}
@@ -570,96 +765,3 @@ class Dns(shared.OsvcThread):
             dns = "ns%d.%s." % (i, self.cluster_name)
             names[dns] = set([ip])
         return names
-
-    def srv_records(self):
-        data = self.get_cache("srv")
-        if data is not None:
-            return data
-        names = {}
-        key = self.cache_key()
-        for nodename in self.cluster_nodes:
-            try:
-                node = shared.CLUSTER_DATA[nodename]
-            except KeyError:
-                continue
-            status = node.get("services", {}).get("status", {})
-            weight = node.get("stats", {}).get("score", 10)
-            for path, svc in status.items():
-                name, namespace, kind = split_path(path)
-                if kind != "svc":
-                    continue
-                if namespace:
-                    namespace = namespace.lower()
-                else:
-                    namespace = "root"
-                scaler_slave = svc.get("scaler_slave")
-                if scaler_slave:
-                    _name = name[name.index(".")+1:]
-                else:
-                    _name = name
-                for rid, resource in status[path].get("resources", {}).items():
-                    addr = resource.get("info", {}).get("ipaddr")
-                    if addr is None:
-                        continue
-                    for expose in resource.get("info", {}).get("expose", []):
-                        if "#" in expose:
-                            # expose data by reference
-                            expose_data = status[path].get("resources", {}).get(expose, {}).get("info")
-
-                            try:
-                                port = expose_data["port"]
-                                proto = expose_data["protocol"]
-                            except (KeyError, TypeError):
-                                continue
-                        else:
-                            # expose data inline
-                            try:
-                                port, proto = re.split("[/-]", expose.split(":")[0])
-                                port = int(port)
-                            except Exception as exc:
-                                continue
-                        qnames = set()
-                        qnames.add("_%s._%s.%s.%s.%s.%s." % (str(port), proto, _name, namespace, kind, self.cluster_name))
-                        try:
-                            serv = socket.getservbyport(port)
-                            qnames.add("_%s._%s.%s.%s.%s.%s." % (serv, proto, _name, namespace, kind, self.cluster_name))
-                        except (socket.error, OSError) as exc:
-                            # port/proto not found
-                            pass
-                        except Exception as exc:
-                            self.log.warning("port %d resolution failed: %s", port, exc)
-                        target = "%s.%s.%s.%s.%s." % (self.unique_name(addr), _name, namespace, kind, self.cluster_name)
-                        content = "%(prio)d %(weight)d %(port)d %(target)s" % {
-                            "prio": 0,
-                            "weight": weight,
-                            "port": port,
-                            "target": target,
-                        }
-                        for qname in qnames:
-                            if qname not in names:
-                                names[qname] = set()
-                            uend = " %d %s" % (port, target)
-                            if any([True for c in names[qname] if c.endswith(uend)]):
-                                # avoid multiple SRV entries pointing to the same ip:port
-                                continue
-                            names[qname].add(content)
-        self.set_cache(key, "srv", names)
-        return names
-
-    def svc_ips(self):
-        addrs = []
-        for nodename in self.cluster_nodes:
-            try:
-                node = shared.CLUSTER_DATA[nodename]
-            except KeyError:
-                continue
-            status = node.get("services", {}).get("status", {})
-            for path, svc in status.items():
-                for rid, resource in status[path].get("resources", {}).items():
-                    addr = resource.get("info", {}).get("ipaddr")
-                    if addr is None:
-                        continue
-                    addrs.append(addr)
-        return addrs
-
-
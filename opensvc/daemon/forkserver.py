@@ -0,0 +1,363 @@
+"""
+Pre-forked runner of the scheduled actions.
+
+Starting a new python interpreter for each scheduled task means importing
+the code base again for each task. The forkserver process imports the
+commands, objects and drivers modules once, then forks a child per job
+received from the scheduler. Each child executes the job as "om" would,
+so the tasks keep running in their own process, with the same options,
+timeouts and exit codes.
+
+The scheduler and the forkserver exchange json lines over the forkserver
+stdin and stdout:
+
+    scheduler => forkserver   {"id": 1, "argv": ["svc", "-s", ...], "env": {...}}
+    forkserver => scheduler   {"id": 1, "pid": 1234}
+    forkserver => scheduler   {"id": 1, "returncode": 0}
+"""
+import errno
+import importlib
+import json
+import os
+import select
+import signal
+import sys
+import time
+from subprocess import Popen, PIPE
+
+# The modules imported by the forkserver before accepting jobs. The
+# scheduler adds the drivers modules already imported by the daemon.
+PRELOAD = [
+    "core.node",
+    "core.objects.svc",
+    "commands.node",
+    "commands.svc",
+]
+
+# The max delay for the forkserver to acknowledge a job with the pid of
+# the forked child.
+SUBMIT_TMO = 5
+
+
+class ForkServerError(Exception):
+    pass
+
+
+def preload(modnames):
+    for modname in modnames:
+        try:
+            importlib.import_module(modname)
+        except Exception:
+            pass
+
+
+def run_command(argv):
+    """
+    Execute the "om" <argv> command in the current process, and return its
+    exit code.
+    """
+    if argv[0] == "node":
+        from commands.node import main
+        return main(argv=argv[1:])
+    elif argv[0] == "svc":
+        from commands.svc import Mgr
+        os.environ["OSVC_KIND"] = argv[0]
+        return Mgr()(argv=argv[1:])
+    raise ValueError("unsupported command: %s" % " ".join(argv))
+
+
+def om_main_path():
+    """
+    The sys.argv[0] of a "python -m opensvc" command, which some actions
+    use to format their log entries.
+    """
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "__main__.py")
+
+
+def returncode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def send(wfd, data):
+    buff = (json.dumps(data) + "\n").encode()
+    while buff:
+        buff = buff[os.write(wfd, buff):]
+
+
+def child(job, run, fds):
+    """
+    The forked child part. Never returns.
+    """
+    ret = 1
+    try:
+        for fd in fds:
+            os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.environ.update(job.get("env") or {})
+        sys.argv = [om_main_path()] + job["argv"]
+        ret = run(job["argv"])
+    except SystemExit as exc:
+        ret = exc.code
+    except BaseException:
+        ret = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        if ret is None:
+            ret = 0
+        elif not isinstance(ret, int):
+            ret = 1
+        os._exit(ret)
+
+
+def reap(children, wfd):
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError as exc:
+            if exc.errno == errno.EINTR:
+                continue
+            break
+        if pid == 0:
+            break
+        job_id = children.pop(pid, None)
+        if job_id is None:
+            continue
+        send(wfd, {"id": job_id, "returncode": returncode(status)})
+
+
+def serve(rfd, wfd, run=run_command):
+    """
+    Fork a child executing run(argv) for each job read from <rfd>, and
+    report the child pid and exit code to <wfd>. Return when <rfd> is
+    closed.
+    """
+    import fcntl
+    buff = b""
+    children = {}
+
+    # wake up the select() on children termination
+    sigr, sigw = os.pipe()
+    for fd in (sigr, sigw):
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def on_sigchld(*args):
+        try:
+            os.write(sigw, b".")
+        except OSError:
+            pass
+
+    signal.signal(signal.SIGCHLD, on_sigchld)
+    while True:
+        try:
+            readable = select.select([rfd, sigr], [], [], 1)[0]
+        except (select.error, OSError) as exc:
+            if exc.args[0] != errno.EINTR:
+                raise
+            readable = []
+        if sigr in readable:
+            try:
+                os.read(sigr, 4096)
+            except OSError:
+                pass
+        if rfd in readable:
+            data = os.read(rfd, 65536)
+            if not data:
+                return
+            buff += data
+            while b"\n" in buff:
+                line, buff = buff.split(b"\n", 1)
+                job = json.loads(line.decode())
+                pid = os.fork()
+                if pid == 0:
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    child(job, run, (rfd, wfd, sigr, sigw))
+                children[pid] = job["id"]
+                send(wfd, {"id": job["id"], "pid": pid})
+        reap(children, wfd)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    # keep the protocol pipes away from the stdio the imported modules
+    # may write to
+    rfd = os.dup(0)
+    wfd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    preload(argv)
+    try:
+        serve(rfd, wfd)
+    except KeyboardInterrupt:
+        pass
+
+
+class ForkServerProc(object):
+    """
+    A job executed by the forkserver, with the subset of the Popen()
+    interface the daemon threads procs janitoring uses.
+    """
+    def __init__(self, forkserver, job_id):
+        self.forkserver = forkserver
+        self.job_id = job_id
+        self.pid = None
+        self.returncode = None
+
+    def poll(self):
+        if self.returncode is None:
+            self.forkserver.poll()
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is not None or self.pid is None:
+            return
+        os.kill(self.pid, signal.SIGKILL)
+
+    @staticmethod
+    def communicate():
+        return None, None
+
+
+class ForkServer(object):
+    """
+    The scheduler side of the forkserver process.
+    """
+    def __init__(self, cmd=None, preload=None, env=None):
+        if cmd is None:
+            from env import Env
+            cmd = Env.om[:-1] + [Env.package + ".daemon.forkserver"]
+        self.cmd = cmd
+        self.preload = preload or []
+        self.env = env
+        self.proc = None
+        self.buff = b""
+        self.jobs = {}
+        self.seq = 0
+        self.started = 0
+        self.submitted = 0
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.stop()
+        self.proc = Popen(self.cmd + self.preload, stdin=PIPE, stdout=PIPE,
+                          close_fds=True, env=self.env)
+        self.buff = b""
+        self.started = time.time()
+
+    def stop(self):
+        """
+        Close the forkserver stdin, so it exits. The jobs it forked are not
+        interrupted, but their exit code is lost, so the caller is expected
+        to kill them first.
+        """
+        if self.proc is None:
+            return
+        proc = self.proc
+        self.proc = None
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        for _ in range(10):
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+        else:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        self.fail_jobs()
+
+    def fail_jobs(self):
+        for proc in self.jobs.values():
+            proc.returncode = 1
+        self.jobs = {}
+
+    def submit(self, argv, env=None):
+        """
+        Ask the forkserver to execute the "om" <argv> command with the
+        <env> environment variables set, and return the ForkServerProc.
+        """
+        if not self.alive():
+            raise ForkServerError("forkserver is not running")
+        self.seq += 1
+        proc = ForkServerProc(self, self.seq)
+        self.jobs[proc.job_id] = proc
+        try:
+            self.proc.stdin.write((json.dumps({"id": proc.job_id, "argv": argv, "env": env or {}}) + "\n").encode())
+            self.proc.stdin.flush()
+        except (IOError, OSError) as exc:
+            del self.jobs[proc.job_id]
+            raise ForkServerError("forkserver job submit error: %s" % exc)
+        timeout = time.time() + SUBMIT_TMO
+        while proc.pid is None and proc.returncode is None:
+            remaining = timeout - time.time()
+            if remaining <= 0:
+                self.stop()
+                raise ForkServerError("forkserver job submit timeout")
+            self.poll(remaining)
+        if proc.pid is None:
+            raise ForkServerError("forkserver died before starting the job")
+        self.submitted += 1
+        return proc
+
+    def poll(self, timeout=0):
+        """
+        Process the messages sent by the forkserver, waiting at most
+        <timeout> seconds for the first one.
+        """
+        if self.proc is None:
+            return
+        fd = self.proc.stdout.fileno()
+        while True:
+            try:
+                readable = select.select([fd], [], [], timeout)[0]
+            except (select.error, OSError) as exc:
+                if exc.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not readable:
+                return
+            data = os.read(fd, 65536)
+            if not data:
+                self.stop()
+                return
+            self.buff += data
+            while b"\n" in self.buff:
+                line, self.buff = self.buff.split(b"\n", 1)
+                self.handle(json.loads(line.decode()))
+            timeout = 0
+
+    def handle(self, msg):
+        try:
+            proc = self.jobs[msg["id"]]
+        except KeyError:
+            return
+        if "pid" in msg:
+            proc.pid = msg["pid"]
+        if "returncode" in msg:
+            proc.returncode = msg["returncode"]
+            del self.jobs[msg["id"]]
+
+    def status(self):
+        return {
+            "pid": self.proc.pid if self.proc else None,
+            "started": self.started,
+            "running": len(self.jobs),
+            "submitted": self.submitted,
+        }
+
+
+if __name__ == "__main__":
+    main()
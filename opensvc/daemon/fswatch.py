@@ -0,0 +1,312 @@
+"""
+Change detection of the objects configuration and status.json files.
+
+The monitor used to glob all the configuration files and stat every
+configuration and status.json file on each pass. On Linux, the watcher
+receives inotify events for the etc/, etc/namespaces/* and var/ object
+directories, and records the paths of the objects with a changed file,
+so the monitor only re-checksums, rebuilds and reloads those.
+
+A full rescan is requested on startup, on inotify queue overflow, on
+object directory creation or removal, periodically as a safety net, and
+on every pass when inotify is not available, which is the former polling
+behaviour.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import time
+
+from env import Env
+from utilities.naming import fmt_path, split_path, svc_pathcf, svc_pathvar
+from utilities.string import bdecode, bencode
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | \
+             IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# the kinds subdirectories of the root namespace config directory
+ROOT_CONFIG_KINDS = ("vol", "cfg", "sec", "usr")
+
+# the maximum interval between two full rescans, in seconds
+FULL_RESCAN_INTERVAL = 300
+
+CONFIG = "config"
+STATUS = "status"
+
+
+class Inotify(object):
+    """
+    A minimal ctypes binding of the linux inotify api, with a non-blocking
+    file descriptor.
+    """
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, bencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """
+        Return the list of pending (wd, mask, name) events.
+        """
+        events = []
+        while True:
+            try:
+                buff = os.read(self.fd, 65536)
+            except OSError as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    break
+                raise
+            if not buff:
+                break
+            offset = 0
+            while offset < len(buff):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(buff, offset)
+                offset += EVENT_HEADER.size
+                name = buff[offset:offset+length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, bdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd < 0:
+            return
+        os.close(self.fd)
+        self.fd = -1
+
+
+def config_path(fpath):
+    """
+    Return the path of the object configured by the <fpath> file, or None if
+    <fpath> is not an object configuration file.
+    """
+    if not fpath.endswith(".conf"):
+        return
+    prefix = os.path.join(Env.paths.pathetcns, "")
+    if fpath.startswith(prefix):
+        parts = fpath[len(prefix):-5].split(os.sep)
+        if parts[-1] == "namespace" and len(parts) == 2:
+            path = parts[0] + "/"
+        elif len(parts) == 3:
+            path = "/".join(parts)
+        else:
+            return
+    else:
+        prefix = os.path.join(Env.paths.pathetc, "")
+        if not fpath.startswith(prefix):
+            return
+        parts = fpath[len(prefix):-5].split(os.sep)
+        if len(parts) > 2:
+            return
+        path = "/".join(parts)
+    try:
+        path = fmt_path(*split_path(path))
+        if svc_pathcf(path) != fpath:
+            return
+    except ValueError:
+        return
+    return path
+
+
+def status_path(fpath):
+    """
+    Return the path of the object with the <fpath> status.json, or None if
+    <fpath> is not an object status.json.
+    """
+    if os.path.basename(fpath) != "status.json":
+        return
+    nsprefix = os.path.join(Env.paths.pathvar, "namespaces", "")
+    prefix = os.path.join(Env.paths.pathvar, "")
+    if fpath.startswith(nsprefix):
+        parts = os.path.dirname(fpath)[len(nsprefix):].split(os.sep)
+        if len(parts) != 3:
+            return
+        path = "/".join(parts)
+    elif fpath.startswith(prefix):
+        parts = os.path.dirname(fpath)[len(prefix):].split(os.sep)
+        if len(parts) != 2:
+            return
+        path = fmt_path(parts[1], None, parts[0])
+    else:
+        return
+    try:
+        if svc_pathvar(path, "status.json") != fpath:
+            return
+    except ValueError:
+        return
+    return path
+
+
+class FileWatcher(object):
+    """
+    Record the paths of the objects with a changed configuration file or
+    status.json, for the monitor thread.
+    """
+    def __init__(self):
+        self.inotify = None
+        self.trees = []
+        self.wds = {}
+        self.dirs = {}
+        self.changed = {CONFIG: set(), STATUS: set()}
+        self.full = {CONFIG: True, STATUS: True}
+        self.last_full = {CONFIG: 0, STATUS: 0}
+
+    def start(self):
+        """
+        Setup the inotify watches. Return False if inotify is not available,
+        in which case every pass is a full rescan.
+        """
+        if not Env.sysname == "Linux":
+            return False
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError):
+            # AttributeError: no inotify_init1 in the libc
+            self.inotify = None
+            return False
+        self.trees = [
+            # (root, depth, first level subdirectories filter, tracked files)
+            (Env.paths.pathetc, 1, ROOT_CONFIG_KINDS, CONFIG),
+            (Env.paths.pathetcns, 2, None, CONFIG),
+            (Env.paths.pathvar, 2, Env.kinds, STATUS),
+            (os.path.join(Env.paths.pathvar, "namespaces"), 3, None, STATUS),
+        ]
+        self.add_trees()
+        return True
+
+    def stop(self):
+        if self.inotify is None:
+            return
+        self.inotify.close()
+        self.inotify = None
+        self.wds = {}
+        self.dirs = {}
+
+    def add_trees(self):
+        for tree in self.trees:
+            self.add_dir(tree[0], tree, 0)
+
+    def add_dir(self, dpath, tree, level):
+        root, depth, subdirs, _ = tree
+        if dpath not in self.dirs:
+            try:
+                wd = self.inotify.add_watch(dpath, WATCH_MASK)
+            except OSError:
+                # not created yet, retried on full rescans
+                return
+            self.wds[wd] = (dpath, tree, level)
+            self.dirs[dpath] = wd
+        if level >= depth:
+            return
+        try:
+            names = os.listdir(dpath)
+        except OSError:
+            return
+        for name in names:
+            if level == 0 and subdirs is not None and name not in subdirs:
+                continue
+            path = os.path.join(dpath, name)
+            if path in self.dirs or not os.path.isdir(path):
+                continue
+            self.add_dir(path, tree, level + 1)
+
+    def collect(self):
+        """
+        Read the pending events and record the changed objects.
+        """
+        if self.inotify is None:
+            return
+        try:
+            events = self.inotify.read()
+        except OSError:
+            self.request_full_rescan()
+            return
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, the watched directories may be stale too
+                self.request_full_rescan()
+                continue
+            try:
+                dpath, tree, level = self.wds[wd]
+            except KeyError:
+                continue
+            if mask & IN_IGNORED:
+                # the watched directory was removed
+                del self.wds[wd]
+                self.dirs.pop(dpath, None)
+                self.full[tree[3]] = True
+                continue
+            if not name:
+                continue
+            fpath = os.path.join(dpath, name)
+            if mask & IN_ISDIR:
+                # object or namespace directory created or removed. the files
+                # created before the new watch have no events.
+                self.full[tree[3]] = True
+                continue
+            if tree[3] == CONFIG:
+                path = config_path(fpath)
+            else:
+                path = status_path(fpath)
+            if path is not None:
+                self.changed[tree[3]].add(path)
+
+    def request_full_rescan(self):
+        self.full[CONFIG] = True
+        self.full[STATUS] = True
+
+    def pop(self, kind):
+        """
+        Return the set of object paths with a changed <kind> file since the
+        previous call, or None if the caller must rescan all objects.
+        """
+        self.collect()
+        now = time.time()
+        if self.inotify is None or self.full[kind] or now - self.last_full[kind] > FULL_RESCAN_INTERVAL:
+            if self.inotify is not None:
+                # watch the directories created since the last rescan
+                self.add_trees()
+            self.full[kind] = False
+            self.last_full[kind] = now
+            self.changed[kind] = set()
+            return
+        paths = self.changed[kind]
+        self.changed[kind] = set()
+        return paths
+
+    def changed_configs(self):
+        return self.pop(CONFIG)
+
+    def changed_status(self):
+        return self.pop(STATUS)
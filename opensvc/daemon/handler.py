@@ -15,6 +15,9 @@ class BaseHandler(object):
     prototype = []
     stream = False
     multiplex = "on-demand"
+    # set on the handlers holding the request for a long time, so they
+    # don't consume the listener workers pool slots
+    blocking = False
 
     def rbac(self, nodename, thr=None, **kwargs):
         options = self.parse_options(kwargs)
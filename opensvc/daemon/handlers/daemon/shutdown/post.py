@@ -14,6 +14,7 @@ class Handler(daemon.handler.BaseHandler):
     Beware, once shutdown, you won't be able to start the daemon from the api.
     This handler is meant to be used by the node shutdown sequence only.
     """
+    blocking = True
     routes = (
         ("POST", "daemon_shutdown"),
         (None, "daemon_shutdown"),
@@ -10,6 +10,7 @@ class Handler(daemon.handler.BaseHandler):
     A daemon stop leaves the services instances in their current state.
     The daemon announces a maintenance period to its peers before going offline, so the peers won't takeover services until the maintenance grace period expires.
     """
+    blocking = True
     routes = (
         ("POST", "daemon_stop"),
         (None, "daemon_stop"),
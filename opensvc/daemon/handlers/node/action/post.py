@@ -12,6 +12,7 @@ class Handler(daemon.handler.BaseHandler):
     """
     Execute a node action.
     """
+    blocking = True
     routes = (
         ("POST", "node_action"),
         (None, "node_action"),
@@ -10,6 +10,7 @@ class Handler(daemon.handler.BaseHandler):
     Freeze the node and shutdown all running object instances.
     Return only when done.
     """
+    blocking = True
     routes = (
         ("POST", "node_drain"),
         (None, "node_drain"),
@@ -69,6 +69,7 @@ class Handler(daemon.handler.BaseHandler, daemon.rbac.ObjectCreateMixin):
     """
     Execute an object instance action.
     """
+    blocking = True
     routes = (
         ("POST", "object_action"),
         ("POST", "service_action"),
@@ -11,6 +11,7 @@ class Handler(daemon.handler.BaseHandler, daemon.rbac.ObjectCreateMixin):
     """
     Create new objects.
     """
+    blocking = True
     routes = (
         ("POST", "object_create"),
         ("POST", "create"),
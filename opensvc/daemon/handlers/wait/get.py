@@ -21,6 +21,7 @@ class Handler(daemon.handler.BaseHandler):
     The <duration> is capped to 30 seconds.
     Upon timeout, it is up to the caller to re-submit the request until the condition becomes true.
     """
+    blocking = True
     routes = (
         ("GET", "wait"),
     )
@@ -155,7 +156,7 @@ class Handler(daemon.handler.BaseHandler):
     def match(self, jsonpath_expr, oper, val, msg):
         kind = msg.get("kind")
         if kind == "patch":
-            if self.eval_condition(jsonpath_expr, oper, val, shared.LAST_DAEMON_STATUS):
+            if self.eval_condition(jsonpath_expr, oper, val, shared.DAEMON_STATUS):
                 return True
         elif kind == "event":
             if self.eval_condition(jsonpath_expr, oper, val, msg):
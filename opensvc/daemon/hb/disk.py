@@ -8,14 +8,20 @@ import stat
 import errno
 import contextlib
 import json
+import struct
 import time
 
 import daemon.shared as shared
 import core.exceptions as ex
+from core.comm import is_frame
 from env import Env
 from .hb import Hb
 from utilities.string import bdecode
 
+# binary message frames slots: magic, updated, frame length
+SLOT_MAGIC = b"OSVD"
+SLOT_HEADER = struct.Struct(">4sdI")
+
 class HbDisk(Hb):
     """
     A class factorizing common methods and properties for the disk
@@ -146,12 +152,19 @@ class HbDisk(Hb):
         return self.METASIZE + slot * self.SLOTSIZE
 
     def read_slot(self, slot, fo=None):
+        """
+        Return the (updated, message) tuple stored in <slot>.
+        """
         offset = self.slot_offset(slot)
         fo.seek(offset, os.SEEK_SET)
         fo.readinto(self.slot_buff)
+        if self.slot_buff[:4] == SLOT_MAGIC:
+            _, updated, length = SLOT_HEADER.unpack_from(self.slot_buff)
+            return updated, self.slot_buff[SLOT_HEADER.size:SLOT_HEADER.size+length]
         data = bdecode(self.slot_buff[:])
         end = data.index("\0")
-        return data[:end]
+        slot_data = json.loads(data[:end])
+        return slot_data["updated"], slot_data["msg"]
 
     def write_slot(self, slot, data, fo=None):
         if len(data) > self.SLOTSIZE:
@@ -254,10 +267,13 @@ class HbDiskTx(HbDisk):
         if message is None:
             return
 
-        data = (json.dumps({
-            "msg": message,
-            "updated": time.time(),
-        })+'\0').encode()
+        if is_frame(message):
+            data = SLOT_HEADER.pack(SLOT_MAGIC, time.time(), message_bytes) + message
+        else:
+            data = (json.dumps({
+                "msg": message,
+                "updated": time.time(),
+            })+'\0').encode()
         try:
             self.write_slot(slot, data, fo=fo)
             self.set_last()
@@ -321,8 +337,8 @@ class HbDiskRx(HbDisk):
             if data["slot"] < 0:
                 continue
             try:
-                slot_data = json.loads(self.read_slot(data["slot"], fo=fo))
-                _clustername, _nodename, _data = self.decrypt(slot_data["msg"])
+                updated, message = self.read_slot(data["slot"], fo=fo)
+                _clustername, _nodename, _data = self.decrypt(message)
                 if _clustername != self.cluster_name:
                     continue
                 if _nodename is None:
@@ -334,7 +350,6 @@ class HbDiskRx(HbDisk):
                     self.log.warning("node %s has written its data in node %s "
                                      "reserved slot", _nodename, nodename)
                     nodename = _nodename
-                updated = slot_data["updated"]
                 last_updated = self.last_updated.get(nodename)
                 if last_updated is not None and last_updated == updated:
                     # remote tx has not rewritten its slot
@@ -345,7 +360,7 @@ class HbDiskRx(HbDisk):
                     continue
                 self.last_updated[nodename] = updated
                 self.store_rx_data(_data, nodename)
-                self.push_stats(len(slot_data))
+                self.push_stats(len(message))
                 self.set_last(nodename)
             except Exception as exc:
                 self.push_stats()
@@ -150,11 +150,33 @@ class Hb(shared.OsvcThread):
             addr = intf.ipaddr
         return addr
 
+    def frames_supported(self):
+        """
+        Return True if all the heartbeat peers announce a compat version
+        supporting the binary message frames.
+        """
+        for nodename in self.hb_nodes:
+            if nodename == Env.nodename:
+                continue
+            try:
+                compat = shared.CLUSTER_DATA[nodename]["compat"]
+            except KeyError:
+                return False
+            if not isinstance(compat, int) or compat < shared.HB_FRAME_COMPAT_VERSION:
+                return False
+        return True
+
+    def hb_encrypt(self, data, frame=False):
+        if frame:
+            return self.encrypt_frame(data)
+        return self.encrypt(data, encode=False)
+
     def get_message(self, nodename=None):
         begin, num = self.get_oldest_gen(nodename)
         if num == 0:
             # we're alone for now. don't send a full status payload.
             # sent a presence announce payload instead.
+            # the peers compat version is unknown, so use the json format.
             self.log.debug("ping node %s", nodename if nodename else "*")
             message = self.encrypt({
                 "kind": "ping",
@@ -164,6 +186,7 @@ class Hb(shared.OsvcThread):
                 "updated": time.time(), # for hb and relay readers
             }, encode=False)
             return message, len(message) if message else 0
+        frame = self.frames_supported()
         if begin == 0 or begin > shared.GEN:
             self.log.debug("send full node data to %s", nodename if nodename else "*")
             try:
@@ -172,30 +195,54 @@ class Hb(shared.OsvcThread):
                 # no pertinent data to send yet (pre-init)
                 self.log.debug("no pertinent data to send yet (pre-init)")
                 return None, 0
-            if shared.HB_MSG is not None:
-                return shared.HB_MSG, shared.HB_MSG_LEN
+            try:
+                return shared.HB_MSG[frame]
+            except KeyError:
+                pass
             with shared.HB_MSG_LOCK:
                 with shared.CLUSTER_DATA_LOCK:
-                    shared.HB_MSG = self.encrypt(shared.CLUSTER_DATA[Env.nodename], encode=False)
-                if shared.HB_MSG is None:
-                    shared.HB_MSG_LEN = 0
-                else:
-                    shared.HB_MSG_LEN = len(shared.HB_MSG)
-                return shared.HB_MSG, shared.HB_MSG_LEN
+                    message = self.hb_encrypt(shared.CLUSTER_DATA[Env.nodename], frame=frame)
+                if message is None:
+                    return None, 0
+                shared.HB_MSG[frame] = message, len(message)
+                return shared.HB_MSG[frame]
         else:
-            #self.log.info("send gen %d-%d deltas to %s", begin, shared.GEN, nodename if nodename else "*")
+            return self.get_patch_message(begin, frame=frame)
+
+    def get_patch_message(self, begin, frame=False):
+        """
+        Return the encrypted message of the local dataset deltas more
+        recent than <begin>, and its length.
+
+        The message is cached for all the heartbeat tx threads, so the
+        deltas are serialized and encrypted once per generation.
+        """
+        gen = self.get_gen()
+        key = (begin, tuple(sorted(gen.items())), frame)
+        with shared.HB_MSG_LOCK:
+            try:
+                return shared.HB_PATCH_MSG_CACHE[key]
+            except KeyError:
+                pass
+            #self.log.info("send gen %d-%d deltas", begin, shared.GEN)
             data = {}
-            for gen, delta in shared.GEN_DIFF.items():
-                if gen <= begin:
+            for _gen, delta in list(shared.GEN_DIFF.items()):
+                if _gen <= begin:
                     continue
-                data[gen] = delta
-            message = self.encrypt({
+                data[_gen] = delta
+            message = self.hb_encrypt({
                 "kind": "patch",
                 "deltas": data,
-                "gen": self.get_gen(),
+                "gen": gen,
                 "updated": time.time(), # for hb and relay readers
-            }, encode=False)
-            return message, len(message) if message else 0
+            }, frame=frame)
+            if message is None:
+                return None, 0
+            if [_key for _key in shared.HB_PATCH_MSG_CACHE if _key[1] != key[1]]:
+                # messages of outdated generations can not be served again
+                shared.HB_PATCH_MSG_CACHE.clear()
+            shared.HB_PATCH_MSG_CACHE[key] = message, len(message)
+            return shared.HB_PATCH_MSG_CACHE[key]
 
     def store_rx_data(self, data, nodename):
         if data is None:
@@ -11,6 +11,7 @@ import time
 
 import core.exceptions as ex
 import daemon.shared as shared
+from core.comm import is_frame
 from env import Env
 from utilities.chunker import chunker
 from utilities.string import bdecode
@@ -19,6 +20,10 @@ from .hb import Hb
 MAX_MESSAGES = 100
 MAX_FRAGMENTS = 1000
 
+# binary message frames fragments: magic, message id, index, total
+FRAGMENT_MAGIC = b"OSVF"
+FRAGMENT_HEADER = struct.Struct(">4s16sHH")
+
 class HbMcast(Hb):
     """
     A class factorizing common methods and properties for the multicast
@@ -172,17 +177,21 @@ class HbMcastTx(HbMcast):
         #self.log.info("sending to %s:%s", self.addr, self.port)
         try:
             idx = 1
-            mid = str(uuid.uuid4())
+            mid = uuid.uuid4()
             total = message_bytes // self.max_data
             if message_bytes % self.max_data:
                 total += 1
+            frame = is_frame(message)
             for chunk in chunker(message, self.max_data):
-                payload = (json.dumps({
-                    "id": mid,
-                    "i": idx,
-                    "n": total,
-                    "c": chunk,
-                }) + "\0").encode()
+                if frame:
+                    payload = FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, mid.bytes, idx, total) + chunk
+                else:
+                    payload = (json.dumps({
+                        "id": str(mid),
+                        "i": idx,
+                        "n": total,
+                        "c": chunk,
+                    }) + "\0").encode()
                 sent = self.sock.sendto(payload, self.group)
                 #self.log.info("send %s %d/%d", mid, idx, total)
                 idx += 1
@@ -284,20 +293,27 @@ class HbMcastRx(HbMcast):
             self.fragments = {}
             return
 
-        try:
-            payload = json.loads(bdecode(data).rstrip("\0\x00"))
-        except (ValueError, TypeError) as exc:
-            # old format ? try decrypt. will blacklist if failed.
-            handle(data, addr)
-            return
+        if data[:4] == FRAGMENT_MAGIC:
+            try:
+                _, mid, idx, total = FRAGMENT_HEADER.unpack_from(data)
+            except struct.error:
+                return
+            chunk = data[FRAGMENT_HEADER.size:]
+        else:
+            try:
+                payload = json.loads(bdecode(data).rstrip("\0\x00"))
+            except (ValueError, TypeError) as exc:
+                # old format ? try decrypt. will blacklist if failed.
+                handle(data, addr)
+                return
 
-        try:
-            mid = payload["id"]
-            chunk = payload["c"]
-            idx = payload["i"]
-            total = payload["n"]
-        except KeyError:
-            return
+            try:
+                mid = payload["id"]
+                chunk = payload["c"]
+                idx = payload["i"]
+                total = payload["n"]
+            except KeyError:
+                return
 
         # verify message DoS
         if addr not in self.fragments:
@@ -322,9 +338,7 @@ class HbMcastRx(HbMcast):
             return
 
         #self.log.debug("message %s complete", mid)
-        message = ""
-        for idx in sorted(self.fragments[addr][mid].keys()):
-            message += self.fragments[addr][mid][idx]
+        message = chunk[:0].join([self.fragments[addr][mid][idx] for idx in sorted(self.fragments[addr][mid].keys())])
         handle(message, addr)
         self.fragments[addr] = {}
 
@@ -1,12 +1,15 @@
 """
 Relay Heartbeat
 """
+import base64
 import sys
 import os
 
 import daemon.shared as shared
 import core.exceptions as ex
+from core.comm import is_frame, to_bytes
 from env import Env
+from utilities.string import bdecode
 from .hb import Hb
 
 class HbRelay(Hb):
@@ -105,6 +108,9 @@ class HbRelayTx(HbRelay):
             self.set_beating()
 
     def send(self, message):
+        if is_frame(message):
+            # the relay stores the message as a string
+            message = bdecode(base64.urlsafe_b64encode(message))
         request = {
             "action": "relay_tx",
             "options": {
@@ -202,6 +208,9 @@ class HbRelayRx(HbRelay):
             raise ex.Error("no data in response reading relay slot %s" % nodename)
         if resp.get("updated") is None:
             raise ex.Error("no 'updated' key in response reading relay slot %s" % nodename)
+        if not resp["data"].startswith("{"):
+            # base64 encoded binary message frame
+            return resp.get("updated"), base64.urlsafe_b64decode(to_bytes(resp["data"]))
         try:
             # python3
             return resp.get("updated"), bytes(resp["data"], "ascii")
@@ -9,6 +9,7 @@ import time
 import foreign.six as six
 import core.exceptions as ex
 import daemon.shared as shared
+from core.comm import FRAME_HEADER, FRAME_MAGIC, frame_length, is_frame
 from env import Env
 from .hb import Hb
 
@@ -132,7 +133,10 @@ class HbUcastTx(HbUcast):
             sock.settimeout(self.sock_tmo)
             sock.bind((self.peer_config[Env.nodename]["addr"], 0))
             sock.connect((config["addr"], config["port"]))
-            sock.sendall((message+"\0").encode())
+            if is_frame(message):
+                sock.sendall(message)
+            else:
+                sock.sendall((message+"\0").encode())
             self.set_last(nodename)
             self.push_stats(message_bytes)
         except socket.timeout as exc:
@@ -239,11 +243,30 @@ class HbUcastRx(HbUcast):
     def _handle_client(self, conn, addr):
         chunks = []
         buff_size = 4096
+        size = 0
+        length = None
         while True:
             chunk = conn.recv(buff_size)
-            if chunk:
-                chunks.append(chunk)
-            if not chunk or chunk.endswith(b"\x00"):
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if length is None:
+                # binary frames are length-prefixed, json messages are
+                # zero-terminated. a frame header can end with a zero
+                # byte, so don't look for the terminator until the
+                # leading bytes tell the message is not a frame.
+                head = six.b("").join(chunks)
+                if head[:len(FRAME_MAGIC)] != FRAME_MAGIC[:size]:
+                    length = -1
+                elif size >= FRAME_HEADER.size:
+                    length = frame_length(head)
+            if length is None:
+                continue
+            if length >= 0:
+                if size >= length:
+                    break
+            elif chunk.endswith(b"\x00"):
                 break
         data = six.b("").join(chunks)
         self.push_stats(len(data))
@@ -17,9 +17,16 @@ import uuid
 import fnmatch
 import re
 import datetime
+import threading
 from foreign.six.moves.urllib.parse import urlparse, parse_qs # pylint: disable=import-error
 from subprocess import Popen
-from errno import EADDRINUSE, ECONNRESET, EPIPE
+from errno import EADDRINUSE, EAGAIN, ECONNRESET, EINTR, EPIPE, EWOULDBLOCK
+
+try:
+    import selectors
+except ImportError:
+    # python2
+    selectors = None
 
 try:
     import ssl
@@ -28,8 +35,10 @@ try:
     from foreign.h2.connection import H2Connection
     from foreign.hyper.common.headers import HTTPHeaderMap
     has_ssl = True
+    SSL_WANT = (ssl.SSLWantReadError, ssl.SSLWantWriteError)
 except Exception:
     has_ssl = False
+    SSL_WANT = ()
 
 try:
     import foreign.jwt as jwt
@@ -44,7 +53,7 @@ import core.exceptions as ex
 from foreign.six.moves import queue
 from env import Env
 from utilities.storage import Storage
-from core.comm import Headers
+from core.comm import Headers, has_h2
 from utilities.chunker import chunker
 from utilities.naming import split_path, fmt_path, factory, split_fullname
 from utilities.files import makedirs
@@ -52,6 +61,7 @@ from utilities.drivers import driver_import
 from utilities.lazy import set_lazy, lazy, unset_lazy
 from utilities.converters import print_duration
 from utilities.string import bencode, bdecode
+from daemon.workers import WorkerPool
 
 if six.PY2:
     class _ConnectionResetError(Exception):
@@ -85,6 +95,146 @@ class DontClose(Exception):
     pass
 
 
+POLL_READ = 1
+POLL_WRITE = 2
+
+
+class Poller(object):
+    """
+    The sockets readiness multiplexer of the listener event loop.
+
+    Use the selectors module if available, fallback to select.select()
+    on python2.
+    """
+    def __init__(self):
+        self.fds = {}
+        if selectors:
+            self.selector = selectors.DefaultSelector()
+        else:
+            self.selector = None
+
+    def set(self, fd, events, data):
+        """
+        Watch the <events> readiness of <fd>, and return <data> in the
+        select() result when ready. A zero <events> stops the watch.
+        """
+        if not events:
+            self.unregister(fd)
+            return
+        current = self.fds.get(fd)
+        if current and current[0] == events and current[1] is data:
+            return
+        self.fds[fd] = (events, data)
+        if not self.selector:
+            return
+        mask = 0
+        if events & POLL_READ:
+            mask |= selectors.EVENT_READ
+        if events & POLL_WRITE:
+            mask |= selectors.EVENT_WRITE
+        if current:
+            self.selector.modify(fd, mask, data)
+        else:
+            self.selector.register(fd, mask, data)
+
+    def unregister(self, fd):
+        if self.fds.pop(fd, None) is None:
+            return
+        if not self.selector:
+            return
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+
+    def select(self, timeout):
+        """
+        Return the list of (data, readable, writable) of the ready fds.
+        """
+        if self.selector:
+            try:
+                ready = self.selector.select(timeout)
+            except (OSError, select.error) as exc:
+                if exc.args and exc.args[0] == EINTR:
+                    return []
+                raise
+            return [(key.data, bool(mask & selectors.EVENT_READ), bool(mask & selectors.EVENT_WRITE)) for key, mask in ready]
+        rfds = [fd for fd, (events, _) in self.fds.items() if events & POLL_READ]
+        wfds = [fd for fd, (events, _) in self.fds.items() if events & POLL_WRITE]
+        try:
+            rfds, wfds, _ = select.select(rfds, wfds, [], timeout)
+        except (OSError, select.error) as exc:
+            if exc.args and exc.args[0] == EINTR:
+                return []
+            raise
+        return [(self.fds[fd][1], fd in rfds, fd in wfds) for fd in set(rfds) | set(wfds)]
+
+    def close(self):
+        self.fds = {}
+        if self.selector:
+            self.selector.close()
+
+
+class SharedEvent(dict):
+    """
+    An event, as queued to the events subscribers.
+
+    The same SharedEvent is queued to all the subscribers of a filtering
+    group, so it must be considered read-only. Its encodings are cached,
+    so the event is serialized once per group instead of once per
+    subscriber.
+    """
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.encodings = {}
+
+    @classmethod
+    def freeze(cls, event):
+        """
+        Return a SharedEvent snapshot of <event>, so the subscribers are
+        not affected by later changes of the daemon data referenced by
+        <event>.
+        """
+        buff = json.dumps(event)
+        shared_event = cls(json.loads(buff))
+        shared_event.encodings["json"] = buff
+        return shared_event
+
+    def derive(self, **kwargs):
+        """
+        Return a new SharedEvent with the <kwargs> keys replaced, sharing
+        the other values with this event.
+        """
+        shared_event = SharedEvent(self)
+        shared_event.update(kwargs)
+        return shared_event
+
+    def encode(self, fmt, fn):
+        """
+        Return the <fmt> encoding of the event, computed by fn(event) on
+        first use.
+        """
+        try:
+            return self.encodings[fmt]
+        except KeyError:
+            pass
+        buff = fn(self)
+        self.encodings[fmt] = buff
+        return buff
+
+    def to_json(self):
+        return self.encode("json", json.dumps)
+
+
+def dumps(data):
+    """
+    Json encode <data>, using the SharedEvent encodings cache.
+    """
+    if isinstance(data, SharedEvent):
+        return data.to_json()
+    return json.dumps(data)
+
+
 class Listener(shared.OsvcThread):
     name = "listener"
     events_grace_period = True
@@ -103,6 +253,7 @@ class Listener(shared.OsvcThread):
     port = -1
     addr = ""
     handlers = {}
+    workers = None
 
     @lazy
     def certfs(self):
@@ -254,6 +405,19 @@ class Listener(shared.OsvcThread):
                 "clients": Storage({})
             }),
         })
+        self.sessions = {}
+        self.pending_sessions = set()
+        self.pending_lock = threading.Lock()
+        self.poller = Poller()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.poller.set(self.wakeup_r.fileno(), POLL_READ, self.wakeup_r)
+        self.workers = WorkerPool(
+            name="listener.worker",
+            max_workers=shared.NODE.oget("listener", "max_workers"),
+            log=self.log,
+        )
 
         self.register_handlers()
         self.setup_socks()
@@ -269,6 +433,10 @@ class Listener(shared.OsvcThread):
             if self.stopped():
                 for sock in self.sockmap.values():
                     sock.close()
+                for session in list(self.sessions.values()):
+                    self.close_session(session)
+                self.workers.stop()
+                self.poller.close()
                 self.join_threads()
                 if Env.sysname == "Linux":
                     self.certfs.stop()
@@ -281,6 +449,8 @@ class Listener(shared.OsvcThread):
             "port": self.port,
             "addr": self.addr,
         }
+        if self.workers:
+            data["workers"] = self.workers.status()
         return data
 
     def reconfigure(self):
@@ -288,6 +458,7 @@ class Listener(shared.OsvcThread):
         unset_lazy(self, "ca")
         unset_lazy(self, "cert")
         unset_lazy(self, "certfs")
+        self.workers.max_workers = shared.NODE.oget("listener", "max_workers")
         self.setup_socks()
 
     def register_handlers(self):
@@ -346,65 +517,170 @@ class Listener(shared.OsvcThread):
             self.janitor_threads()
             self.janitor_events()
             self.janitor_relay()
-        self.last_janitors = ts
+            self.janitor_sessions()
+            self.last_janitors = ts
+
+        self.update_sessions()
+        for data, readable, writable in self.poller.select(JANITORS_INTERVAL):
+            if data is self.wakeup_r:
+                self.drain_wakeup()
+            elif isinstance(data, ClientHandler):
+                self.serve_session(data, readable, writable)
+            else:
+                self.accept(data)
+
+    def accept(self, sock):
+        fd = sock.fileno()
+        try:
+            conn = None
+            conn, addr = sock.accept()
+            self.stats.sessions.accepted += 1
+            if fd == self.sockux.fileno():
+                tls = False
+                addr = ["local"]
+                scheme = "raw"
+                encrypted = False
+            elif fd == self.sockuxh2.fileno():
+                tls = False
+                addr = ["local"]
+                scheme = "h2"
+                encrypted = False
+            elif fd == self.sock.fileno():
+                scheme = "raw"
+                tls = False
+                encrypted = True
+            elif fd == self.tls_sock.fileno():
+                scheme = "h2"
+                tls = True
+                encrypted = False
+            else:
+                print("bug")
+                conn.close()
+                return
+            if addr[0] not in self.stats.sessions.clients:
+                self.stats.sessions.clients[addr[0]] = Storage({
+                    "accepted": 0,
+                    "auth_validated": 0,
+                    "tx": 0,
+                    "rx": 0,
+                })
+            self.stats.sessions.clients[addr[0]].accepted += 1
+            #self.log.info("accept %s", str(addr))
+        except socket.timeout:
+            return
+        except socket.error as exc:
+            if exc.args and exc.args[0] in (EAGAIN, EWOULDBLOCK):
+                # another client connection raced us
+                return
+            if conn:
+                conn.close()
+            raise
+        except ConnectionAbortedError:
+            if conn:
+                conn.close()
+            return
+        except Exception as exc:
+            self.log.exception(exc)
+            if conn:
+                conn.close()
+            return
+        try:
+            session = ClientHandler(self, conn, addr, encrypted, scheme, tls, self.tls_context)
+            session.open()
+        except Exception as exc:
+            self.log.warning("init client session: %s", exc)
+            conn.close()
+            return
+        self.sessions[session.fd] = session
+        self.poller.set(session.fd, session.poll_events(), session)
+
+    #########################################################################
+    #
+    # Client sessions event loop
+    #
+    #########################################################################
 
-        fds = select.select([fno for fno in self.sockmap], [], [], self.sock_tmo)
-        if self.sock_tmo and fds == ([], [], []):
+    def wakeup(self, session=None):
+        """
+        Ask the event loop to refresh the poll events of <session>, and
+        interrupt the loop select if called from a worker thread.
+        """
+        if session is not None:
+            with self.pending_lock:
+                self.pending_sessions.add(session)
+        if threading.current_thread() is self:
             return
-        for fd in fds[0]:
-            sock = self.sockmap[fd]
+        try:
+            self.wakeup_w.send(b"\0")
+        except socket.error:
+            # the wakeup socket buffer is full: the loop is already
+            # due to wake up
+            pass
+
+    def drain_wakeup(self):
+        while True:
             try:
-                conn = None
-                conn, addr = sock.accept()
-                self.stats.sessions.accepted += 1
-                if fd == self.sockux.fileno():
-                    tls = False
-                    addr = ["local"]
-                    scheme = "raw"
-                    encrypted = False
-                elif fd == self.sockuxh2.fileno():
-                    tls = False
-                    addr = ["local"]
-                    scheme = "h2"
-                    encrypted = False
-                elif fd == self.sock.fileno():
-                    scheme = "raw"
-                    tls = False
-                    encrypted = True
-                elif fd == self.tls_sock.fileno():
-                    scheme = "h2"
-                    tls = True
-                    encrypted = False
-                else:
-                    print("bug")
-                    continue
-                if addr[0] not in self.stats.sessions.clients:
-                    self.stats.sessions.clients[addr[0]] = Storage({
-                        "accepted": 0,
-                        "auth_validated": 0,
-                        "tx": 0,
-                        "rx": 0,
-                    })
-                self.stats.sessions.clients[addr[0]].accepted += 1
-                #self.log.info("accept %s", str(addr))
-            except socket.timeout:
-                continue
-            except ConnectionAbortedError:
-                if conn:
-                    conn.close()
+                if not self.wakeup_r.recv(4096):
+                    return
+            except socket.error:
+                return
+
+    def update_sessions(self):
+        """
+        Apply the poll events changes and close requests submitted by the
+        workers.
+        """
+        with self.pending_lock:
+            sessions = self.pending_sessions
+            self.pending_sessions = set()
+        for session in sessions:
+            if session.fd not in self.sessions:
                 continue
-            except Exception as exc:
-                self.log.exception(exc)
-                if conn:
-                    conn.close()
+            if session.must_close():
+                self.close_session(session)
                 continue
+            self.poller.set(session.fd, session.poll_events(), session)
+
+    def serve_session(self, session, readable, writable):
+        try:
+            if writable:
+                session.on_writable()
+            if readable:
+                session.on_readable()
+        except Close:
+            session.closing = True
+        except Exception as exc:
+            session.log_exception(exc)
+            session.closing = True
+        if session.must_close():
+            self.close_session(session)
+        else:
+            self.poller.set(session.fd, session.poll_events(), session)
+
+    def close_session(self, session):
+        self.poller.unregister(session.fd)
+        self.sessions.pop(session.fd, None)
+        session.close()
+
+    def janitor_sessions(self):
+        """
+        Execute the streams pushers and drop the clients not sending their
+        request in time.
+        """
+        now = time.time()
+        for session in list(self.sessions.values()):
             try:
-                thr = ClientHandler(self, conn, addr, encrypted, scheme, tls, self.tls_context)
-                thr.start()
-                self.threads.append(thr)
-            except RuntimeError as exc:
-                self.log.warning(exc)
-                conn.close()
+                session.push()
+                if session.expired(now):
+                    session.log.warning("timeout waiting for data")
+                    session.closing = True
+            except Exception as exc:
+                session.log_exception(exc)
+                session.closing = True
+            if session.must_close():
+                self.close_session(session)
+            else:
+                self.poller.set(session.fd, session.poll_events(), session)
 
     def janitor_crl(self):
         if not self.tls_sock:
@@ -460,6 +736,9 @@ class Listener(shared.OsvcThread):
         """
         Send queued events to all subscribed clients.
 
+        The subscribers are grouped by event filter, so each event is
+        filtered and serialized once per group.
+
         Don't dequeue messages during the first 2 seconds of the listener lifetime,
         so clients have a chance to reconnect after a daemon restart and loose an
         event.
@@ -469,62 +748,103 @@ class Listener(shared.OsvcThread):
                 self.events_grace_period = False
             else:
                 return
-        done = []
+        groups = None
         while True:
             try:
                 event = shared.EVENT_Q.get(False, 0)
             except queue.Empty:
                 break
-            to_remove = []
-            for idx, thr in enumerate(self.events_clients):
-                if thr not in self.threads:
-                    to_remove.append(idx)
-                    continue
-                fevent = self.filter_event(event, thr)
+            if event is None:
+                continue
+            if groups is None:
+                groups = self.events_clients_groups()
+            if not groups:
+                continue
+            # make a single copy to avoid being replaced while queued
+            event = SharedEvent.freeze(event)
+            for (selector, namespaces), thrs in groups.items():
+                fevent = self.filter_event(event, selector=selector, namespaces=namespaces)
                 if fevent is None:
                     continue
-                # make a copy to avoid being replaced while queued
-                fevent = json.loads(json.dumps(fevent))
-                if thr.h2conn:
-                    if not thr.events_stream_ids:
-                        to_remove.append(idx)
-                        continue
-                thr.event_queue.put(fevent)
-            for idx in to_remove:
+                for thr in thrs:
+                    thr.event_queue.put(fevent)
+
+    def events_clients_groups(self):
+        """
+        Drop the gone subscribers, and return the others grouped by
+        (selector, namespaces). The (None, None) group is the unfiltered
+        events subscribers.
+        """
+        groups = {}
+        for thr in list(self.events_clients):
+            if thr.closed or (thr.h2conn and not thr.events_stream_ids):
                 try:
-                    del self.events_clients[idx]
-                except IndexError:
+                    self.events_clients.remove(thr)
+                except ValueError:
                     pass
+                continue
+            if thr.selector in (None, "**") and (thr.usr is False or "root" in thr.usr_grants):
+                # root and no selector => fast path
+                key = (None, None)
+            else:
+                key = (thr.selector, frozenset(thr.get_namespaces()))
+            if key not in groups:
+                groups[key] = []
+            groups[key].append(thr)
+        return groups
 
-    def filter_event(self, event, thr):
+    def filter_event(self, event, selector=None, namespaces=None):
+        """
+        Return the <event> view visible to the subscribers of a (selector,
+        namespaces) group, or None if the event is not visible. The
+        <event> is not modified.
+        """
         if event is None:
             return
-        if thr.selector in (None, "**") and (thr.usr is False or "root" in thr.usr_grants):
-            # root and no selector => fast path
+        if selector is None and namespaces is None:
             return event
-        namespaces = thr.get_namespaces()
+        namespaces = set(namespaces)
         kind = event.get("kind")
         if kind == "full":
             return event
         elif kind == "patch":
-            return self.filter_patch_event(event, thr, namespaces)
+            return self.filter_patch_event(event, selector, namespaces)
         elif kind == "event":
-            return self.filter_event_event(event, thr, namespaces)
+            return self.filter_event_event(event, selector, namespaces)
 
-    def filter_event_event(self, event, thr, namespaces):
-        def valid(change):
-            try:
-                path = event["data"]["path"]
-            except KeyError:
-                return True
-            if thr.selector and not self.match_object_selector(thr.selector, namespaces=namespaces, path=path):
-                return False
-            return False
-        if valid(event):
+    def filter_event_event(self, event, selector, namespaces):
+        try:
+            path = event["data"]["path"]
+        except (KeyError, TypeError):
             return event
-        return None
+        if not self.match_object_selector(selector, namespaces=namespaces, path=path):
+            return
+        return event
+
+    def filter_patch_event(self, event, selector, namespaces):
+        """
+        Return a copy of the <event> patch with only the changes visible
+        to the (selector, namespaces) group. The <event> is not modified.
+        """
+        def filter_daemon_status(data):
+            return self.filter_daemon_status(data, namespaces=namespaces, selector=selector)
+
+        def change_path(change):
+            try:
+                key = change[0]
+                if key[0] != "monitor":
+                    return
+                if key[1] == "services":
+                    return key[2]
+                if key[1] == "nodes" and key[3] == "services" and key[4] in ("status", "config"):
+                    return key[5]
+            except (IndexError, KeyError, TypeError):
+                pass
+
+        def filter_paths(value):
+            keep = set(self.object_selector(selector or "**", namespaces=namespaces, paths=list(value)))
+            return dict((k, v) for k, v in value.items() if k in keep)
 
-    def filter_patch_event(self, event, thr, namespaces):
         def filter_change(change):
             try:
                 key, value = change
@@ -538,21 +858,21 @@ class Listener(shared.OsvcThread):
             if key_len == 0:
                 if value is None:
                     return change
-                value = self.filter_daemon_status(value, namespaces=namespaces, selector=thr.selector)
+                value = filter_daemon_status(value)
                 return [key, value]
             elif key[0] == "monitor":
                 if key_len == 1:
                     if value is None:
                         return change
-                    value = self.filter_daemon_status({"monitor": value}, namespaces=namespaces, selector=thr.selector)["monitor"]
+                    value = filter_daemon_status({"monitor": value})["monitor"]
                     return [key, value]
                 if key[1] == "services":
                     if key_len == 2:
                         if value is None:
                             return change
-                        value = dict((k, v) for k, v in value.items() if self.match_object_selector(thr.selector, namespaces=namespaces, path=k))
+                        value = filter_paths(value)
                         return [key, value]
-                    if self.match_object_selector(thr.selector, namespaces=namespaces, path=key[2]):
+                    if key[2] in selected:
                         return change
                     else:
                         return
@@ -560,26 +880,26 @@ class Listener(shared.OsvcThread):
                     if key_len == 2:
                         if value is None:
                             return change
-                        value = self.filter_daemon_status({"monitor": {"nodes": value}}, namespaces=namespaces, selector=thr.selector)["monitor"]["nodes"]
+                        value = filter_daemon_status({"monitor": {"nodes": value}})["monitor"]["nodes"]
                         return [key, value]
                     if key_len == 3:
                         if value is None:
                             return change
-                        value = self.filter_daemon_status({"monitor": {"nodes": {key[2]: value}}}, namespaces=namespaces, selector=thr.selector)["monitor"]["nodes"][key[2]]
+                        value = filter_daemon_status({"monitor": {"nodes": {key[2]: value}}})["monitor"]["nodes"][key[2]]
                         return [key, value]
                     if key[3] == "services":
                         if key_len == 4:
                             if value is None:
                                 return change
-                            value = self.filter_daemon_status({"monitor": {"nodes": {key[2]: {"services": value}}}}, namespaces=namespaces, selector=thr.selector)["monitor"]["nodes"][key[2]]["services"]
+                            value = filter_daemon_status({"monitor": {"nodes": {key[2]: {"services": value}}}})["monitor"]["nodes"][key[2]]["services"]
                             return [key, value]
                         if key[4] == "status":
                             if key_len == 5:
                                 if value is None:
                                     return change
-                                value = dict((k, v) for k, v in value.items() if self.match_object_selector(thr.selector, namespaces=namespaces, path=k))
+                                value = filter_paths(value)
                                 return [key, value]
-                            if self.match_object_selector(thr.selector, namespaces=namespaces, path=key[5]):
+                            if key[5] in selected:
                                 return change
                             else:
                                 return
@@ -587,24 +907,29 @@ class Listener(shared.OsvcThread):
                             if key_len == 5:
                                 if value is None:
                                     return change
-                                value = dict((k, v) for k, v in value.items() if self.match_object_selector(thr.selector, namespaces=namespaces, path=k))
+                                value = filter_paths(value)
                                 return [key, value]
-                            if self.match_object_selector(thr.selector, namespaces=namespaces, path=key[5]):
+                            if key[5] in selected:
                                 return change
                             else:
                                 return
             return change
 
+        data = event.get("data", [])
+        # evaluate the selector on all the changed paths at once
+        paths = set(change_path(change) for change in data)
+        paths.discard(None)
+        selected = set(self.object_selector(selector or "**", namespaces=namespaces, paths=list(paths)))
+
         changes = []
-        for change in event.get("data", []):
+        for change in data:
             filtered_change = filter_change(change)
             if filtered_change:
                 changes.append(filtered_change)
             #    print("ACCEPT", thr.usr.name if thr.usr else "", filtered_change)
             #else:
             #    print("DROP  ", thr.usr.name if thr.usr else "", change)
-        event["data"] = changes
-        return event
+        return event.derive(data=changes)
 
     def bind_inet(self, sock, addr, port):
         """
@@ -633,14 +958,7 @@ class Listener(shared.OsvcThread):
             self.tls_port = port
             self.tls_addr = addr
         elif port != self.tls_port or addr != self.tls_addr:
-            try:
-                self.tls_sock.close()
-            except socket.error:
-                pass
-            try:
-                del self.sockmap[self.tls_sock.fileno()]
-            except KeyError:
-                pass
+            self.close_listening_sock(self.tls_sock)
             self.tls_port = port
             self.tls_addr = addr
         else:
@@ -666,7 +984,7 @@ class Listener(shared.OsvcThread):
             self.log.info("failed tls listener init: %s", exc)
             return
         self.log.info("listening on %s:%s using http/2 tls with client auth", self.tls_addr, self.tls_port)
-        self.sockmap[self.tls_sock.fileno()] = self.tls_sock
+        self.watch_listening_sock(self.tls_sock)
 
     def setup_sock(self):
         port = shared.NODE.oget("listener", "port")
@@ -675,14 +993,7 @@ class Listener(shared.OsvcThread):
             self.port = port
             self.addr = addr
         elif port != self.port or addr != self.addr:
-            try:
-                self.sock.close()
-            except socket.error:
-                pass
-            try:
-                del self.sockmap[self.sock.fileno()]
-            except KeyError:
-                pass
+            self.close_listening_sock(self.sock)
             self.port = port
             self.addr = addr
         else:
@@ -701,7 +1012,7 @@ class Listener(shared.OsvcThread):
             self.alert("error", "bind aes listener %s:%d error: %s", self.addr, self.port, exc)
             return
         self.log.info("listening on %s:%s using aes encryption", self.addr, self.port)
-        self.sockmap[self.sock.fileno()] = self.sock
+        self.watch_listening_sock(self.sock)
 
     def setup_sockux_h2(self):
         if os.name == "nt":
@@ -727,7 +1038,7 @@ class Listener(shared.OsvcThread):
             self.alert("error", "bind http/2 listener %s error: %s", Env.paths.lsnruxh2sock, exc)
             return
         self.log.info("listening on %s using http/2", Env.paths.lsnruxh2sock)
-        self.sockmap[self.sockuxh2.fileno()] = self.sockuxh2
+        self.watch_listening_sock(self.sockuxh2)
 
     def setup_sockux(self):
         if os.name == "nt":
@@ -753,7 +1064,22 @@ class Listener(shared.OsvcThread):
             self.alert("error", "bind raw listener %s error: %s", Env.paths.lsnruxsock, exc)
             return
         self.log.info("listening on %s", Env.paths.lsnruxsock)
-        self.sockmap[self.sockux.fileno()] = self.sockux
+        self.watch_listening_sock(self.sockux)
+
+    def watch_listening_sock(self, sock):
+        fd = sock.fileno()
+        self.sockmap[fd] = sock
+        self.poller.set(fd, POLL_READ, sock)
+
+    def close_listening_sock(self, sock):
+        fd = sock.fileno()
+        if fd >= 0:
+            self.sockmap.pop(fd, None)
+            self.poller.unregister(fd)
+        try:
+            sock.close()
+        except socket.error:
+            pass
 
     def setup_socks(self):
         self.setup_socktls()
@@ -763,19 +1089,46 @@ class Listener(shared.OsvcThread):
 
 
 class ClientHandler(shared.OsvcThread):
+    """
+    A client connection session.
+
+    The session is served by the listener event loop thread: socket reads,
+    h2 protocol processing and buffered writes. The request handlers are
+    executed by the listener workers pool, with the session passed as the
+    "thr" argument, so the handlers see the same interface as when each
+    connection was served by its own thread.
+
+    The session is never started as a thread. The inherited thread methods
+    are used for the stop event, the crypto and the daemon helpers.
+    """
     sock_tmo = 5.0
+    send_chunk_size = 16384
 
     def __init__(self, parent, conn, addr, encrypted, scheme, tls, tls_context):
         shared.OsvcThread.__init__(self)
         self.parent = parent
         self.event_queue = None
         self.conn = conn
+        self.fd = conn.fileno()
+        self.tls_conn = None
         self.addr = addr
         self.encrypted = encrypted
         self.scheme = scheme
         self.tls = tls
         self.tls_context = tls_context
         self.log = logging.LoggerAdapter(logging.getLogger(Env.nodename+".osvcd.listener"), {"node": Env.nodename, "component": "%s/%s" % (self.parent.name, addr[0])})
+        self.sid = str(uuid.uuid4())
+        self.lock = threading.RLock()
+        self.inbound = []
+        self.outbound = bytearray()
+        self.reading = True
+        self.handshaking = False
+        self.want_write = False
+        self.request_received = False
+        self.raw_events = False
+        self.close_on_flush = False
+        self.closing = False
+        self.closed = False
         self.streams = {}
         self.h2conn = None
         self.events_stream_ids = []
@@ -796,7 +1149,7 @@ class ClientHandler(shared.OsvcThread):
             progress = self.parent.stats.sessions.alive[self.sid].progress
         except Exception:
             progress = "unknown"
-        return "client handler thread (client addr: %s, usr: %s, auth: %s, scheme: %s, progress: %s)" % (
+        return "client session (client addr: %s, usr: %s, auth: %s, scheme: %s, progress: %s)" % (
             self.addr[0],
             self.usr.name if self.usr else self.usr,
             self.usr_auth,
@@ -804,63 +1157,229 @@ class ClientHandler(shared.OsvcThread):
             progress,
         )
 
-    def run(self):
+    def open(self):
+        """
+        Register the session in the listener stats and prepare the
+        connection for the event loop.
+        """
+        self.parent.stats.sessions.alive[self.sid] = Storage({
+            "created": self.created,
+            "addr": self.addr[0],
+            "encrypted": self.encrypted,
+            "progress": "init",
+        })
+        self.conn.setblocking(False)
+        if self.scheme == "h2":
+            self.negotiate_tls()
+            if not self.handshaking:
+                self.init_h2()
+        else:
+            self.tls_conn = self.conn
+
+    def close(self):
+        """
+        Release the session resources. Called by the event loop thread.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.stop()
+            if self.h2conn and not self.handshaking:
+                try:
+                    self.h2conn.close_connection()
+                    self.tls_conn.send(self.h2conn.data_to_send())
+                except Exception:
+                    pass
+        for sock in (self.tls_conn, self.conn):
+            if sock is None:
+                continue
+            try:
+                sock.close()
+            except socket.error:
+                pass
         try:
-            close = True
-            self.sid = str(uuid.uuid4())
-            self.parent.stats.sessions.alive[self.sid] = Storage({
-                "created": time.time(),
-                "addr": self.addr[0],
-                "encrypted": self.encrypted,
-                "progress": "init",
-            })
-            if self.scheme == "h2":
-                self.handle_h2_client()
-            else:
-                self.handle_raw_client()
-        except Close:
+            del self.parent.stats.sessions.alive[self.sid]
+        except KeyError:
             pass
-        except DontClose:
-            close = False
-        except (OSError, socket.error) as exc:
+        try:
+            self.parent.events_clients.remove(self)
+        except ValueError:
+            pass
+
+    def must_close(self):
+        return self.closing or (self.close_on_flush and not self.outbound)
+
+    def expired(self, now):
+        """
+        Return True if the raw client did not send its request in time.
+        """
+        if self.scheme != "raw" or self.request_received:
+            return False
+        return now > self.created + self.sock_tmo
+
+    def poll_events(self):
+        events = 0
+        if self.reading:
+            events |= POLL_READ
+        if self.outbound or self.want_write:
+            events |= POLL_WRITE
+        return events
+
+    def log_exception(self, exc):
+        if isinstance(exc, (OSError, socket.error)) and getattr(exc, "errno", None) in (0, ECONNRESET, EPIPE):
+            return
+        if has_ssl and isinstance(exc, h2.exceptions.StreamClosedError):
+            return
+        self.log.error("exit on %s %s", type(exc), exc)
+        traceback.print_exc()
+
+    def submit(self, fn, *args):
+        """
+        Queue the execution of a blocking request processing in the
+        listener workers pool. Return False if the pool backlog is full.
+        """
+        try:
+            self.parent.workers.submit(fn, *args)
+        except (queue.Full, RuntimeError):
+            return False
+        return True
+
+    def recv(self, size):
+        """
+        Return the received data, an empty buffer if the client closed the
+        connection, or None if no data is available yet.
+        """
+        try:
+            data = self.tls_conn.recv(size)
+        except SSL_WANT:
+            return
+        except socket.error as exc:
+            if exc.errno in (EAGAIN, EWOULDBLOCK, EINTR):
+                return
             if exc.errno in (0, ECONNRESET):
-                pass
-        except RuntimeError as exc:
-            self.log.error("%s", exc)
-        except Exception as exc:
-            try:
-                ignore = exc.errno == 0
-            except AttributeError:
-                ignore = False
-            if not ignore:
-                self.log.error("unexpected: %s", exc)
-                traceback.print_exc()
-        finally:
-            if close:
-                del self.parent.stats.sessions.alive[self.sid]
-                if self.h2conn:
-                    self.h2conn.close_connection()
-                self.conn.close()
+                raise Close
+            raise
+        if data:
+            self.parent.stats.sessions.rx += len(data)
+            self.parent.stats.sessions.clients[self.addr[0]].rx += len(data)
+        return data
+
+    def send(self, data):
+        """
+        Queue <data> for sending, and send as much as the socket accepts
+        without blocking. The event loop sends the rest when the socket
+        becomes writable.
+        """
+        if not data:
+            return
+        with self.lock:
+            self.outbound += data
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            while self.outbound and not self.closed:
+                chunk = bytes(self.outbound[:self.send_chunk_size])
+                try:
+                    sent = self.tls_conn.send(chunk)
+                except SSL_WANT:
+                    break
+                except socket.error as exc:
+                    if exc.errno in (EAGAIN, EWOULDBLOCK, EINTR):
+                        break
+                    if exc.errno == EPIPE:
+                        self.log.info(exc)
+                    elif exc.errno not in (0, ECONNRESET):
+                        self.log.warning(exc)
+                    self.outbound = bytearray()
+                    self.closing = True
+                    break
+                del self.outbound[:sent]
+                self.parent.stats.sessions.tx += sent
+                self.parent.stats.sessions.clients[self.addr[0]].tx += sent
+        self.parent.wakeup(self)
+
+    def on_readable(self):
+        if self.handshaking:
+            self.tls_handshake()
+        elif self.scheme == "h2":
+            self.h2_read()
+        else:
+            self.raw_read()
+
+    def on_writable(self):
+        if self.handshaking:
+            self.tls_handshake()
+        else:
+            self.flush()
+
+    def push(self):
+        """
+        Execute the streams pushers, or send the queued events to a raw
+        events subscriber.
+        """
+        with self.lock:
+            if self.closing or self.closed:
+                return
+            if self.raw_events:
+                self.raw_push_queued_events()
+                return
+            if not self.h2conn or self.handshaking:
+                return
+
+            # execute all registered pushers of the streams already
+            # responded to by their handler
+            pushers_per_stream = [(stream_id, stream.get("pushers", [])) for stream_id, stream in self.streams.items() if stream.get("pushers") and stream.get("responded")]
+            for stream_id, pushers in pushers_per_stream:
+                for pusher in pushers:
+                    fn = pusher.get("fn")
+                    args = pusher.get("args", [])
+                    kwargs = pusher.get("kwargs", {})
+                    if not fn:
+                        continue
+                    try:
+                        getattr(self, fn)(stream_id, *args, **kwargs)
+                    except Exception as exc:
+                        print(exc)
+            self.h2_flush()
 
     def negotiate_tls(self):
         """
         Given an established TCP connection and a HTTP/2-appropriate TLS context,
-        this function:
-        1. wraps TLS around the TCP connection.
-        2. confirms that HTTP/2 was negotiated and, if it was not, throws an error.
+        wrap TLS around the TCP connection. The handshake is driven by the event
+        loop, see tls_handshake().
         """
         if not self.tls:
             self.tls_conn = self.conn
             return
 
         try:
-            self.tls_conn = self.tls_context.wrap_socket(self.conn, server_side=True)
+            self.tls_conn = self.tls_context.wrap_socket(self.conn, server_side=True, do_handshake_on_connect=False)
         except OSError as exc:
+            raise RuntimeError("tls wrap error: %s"%exc)
+        self.handshaking = True
+
+    def tls_handshake(self):
+        """
+        Advance the non-blocking TLS handshake. When complete, confirm that
+        HTTP/2 was negotiated and, if it was not, throws an error.
+        """
+        self.want_write = False
+        try:
+            self.tls_conn.do_handshake()
+        except ssl.SSLWantReadError:
+            return
+        except ssl.SSLWantWriteError:
+            self.want_write = True
+            return
+        except (OSError, socket.error) as exc:
             if exc.errno in (0, ECONNRESET):
                 # 0: client => server after daemon restart
                 # ECONNRESET: server => client after daemon restart
-                raise
-            raise RuntimeError("tls wrap error: %s"%exc)
+                raise Close
+            raise RuntimeError("tls handshake error: %s"%exc)
+        self.handshaking = False
 
         # Always prefer the result from ALPN to that from NPN.
         # You can only check what protocol was negotiated once the handshake is
@@ -871,6 +1390,13 @@ class ClientHandler(shared.OsvcThread):
 
         if negotiated_protocol != "h2":
             raise RuntimeError("couldn't negotiate h2: %s" % negotiated_protocol)
+        self.init_h2()
+
+    def init_h2(self):
+        h2config = H2Configuration(client_side=False)
+        self.h2conn = H2Connection(config=h2config)
+        self.h2conn.initiate_connection()
+        self.h2_flush()
 
     def current_usr_cf_sum(self):
         try:
@@ -879,6 +1405,16 @@ class ClientHandler(shared.OsvcThread):
             return "unknown"
 
     def authenticate_client(self, headers):
+        """
+        Authenticate the request <headers>, updating the session user and
+        grants. The streams of a h2 session are processed concurrently by
+        the workers, so the user and grants are updated under the session
+        lock, and read under the same lock.
+        """
+        with self.lock:
+            self._authenticate_client(headers)
+
+    def _authenticate_client(self, headers):
         if self.usr is False:
             return
 
@@ -1016,7 +1552,7 @@ class ClientHandler(shared.OsvcThread):
         else:
             usr = factory("usr")(cn, namespace="system", volatile=True, log=self.log)
         if not usr or not usr.exists():
-            self.conn.close()
+            self.close_on_flush = True
             raise ex.Error("x509 auth failed: %s (valid cert, unknown user)" % cn)
         return usr
 
@@ -1039,7 +1575,7 @@ class ClientHandler(shared.OsvcThread):
         if "json" in content_type:
             if data is None:
                 data = {}
-            data = json.dumps(data).encode()
+            data = dumps(data).encode()
         elif isinstance(data, six.string_types):
             data = bencode(data)
         elif data is None:
@@ -1048,14 +1584,16 @@ class ClientHandler(shared.OsvcThread):
             response_headers += [
                 ('content-length', str(len(data))),
             ]
-        self.h2conn.send_headers(stream_id, response_headers)
-        if stream_id not in self.streams:
-            self.streams[stream_id] = {"outbound": b''}
-        try:
-            self.streams[stream_id]["outbound"] += data
-        except TypeError as exc:
-            pass
-        self.send_outbound(stream_id)
+        with self.lock:
+            self.h2conn.send_headers(stream_id, response_headers)
+            if stream_id not in self.streams:
+                self.streams[stream_id] = {"outbound": b''}
+            self.streams[stream_id]["responded"] = True
+            try:
+                self.streams[stream_id]["outbound"] += data
+            except TypeError as exc:
+                pass
+            self.send_outbound(stream_id)
 
     def can_end_stream(self, stream_id):
         if "request" not in self.streams[stream_id]:
@@ -1072,6 +1610,10 @@ class ClientHandler(shared.OsvcThread):
         return False
 
     def send_outbound(self, stream_id):
+        with self.lock:
+            self._send_outbound(stream_id)
+
+    def _send_outbound(self, stream_id):
         data = self.streams[stream_id]["outbound"]
         end_stream = self.can_end_stream(stream_id)
         window_size = self.h2conn.local_flow_control_window(stream_id)
@@ -1082,17 +1624,13 @@ class ClientHandler(shared.OsvcThread):
         max_size = self.h2conn.max_outbound_frame_size
         for chunk in chunker(will_send, max_size):
             self.h2conn.send_data(stream_id, data=chunk, end_stream=False)
-            data_to_send = self.h2conn.data_to_send()
-            self.tls_conn.sendall(data_to_send)
-            message_len = len(data_to_send)
-            self.parent.stats.sessions.tx += message_len
-            self.parent.stats.sessions.clients[self.addr[0]].tx += message_len
+        self.h2_flush()
 
         self.streams[stream_id]["outbound"] = will_queue
 
         if not will_queue and end_stream:
             self.h2conn.end_stream(stream_id)
-            self.tls_conn.sendall(self.h2conn.data_to_send())
+            self.h2_flush()
             self.h2_cleanup_stream(stream_id)
 
     def h2_push_promise(self, stream_id, path, data, content_type):
@@ -1209,8 +1747,7 @@ class ClientHandler(shared.OsvcThread):
             "outbound": b'',
         }
         if event.stream_ended:
-            status, content_type, data = self.h2_router(stream_id)
-            self.prepare_response(stream_id, status, data, content_type)
+            self.h2_dispatch(stream_id)
 
     def h2_data_received(self, event):
         self.streams[event.stream_id]["data"] += event.data
@@ -1218,8 +1755,45 @@ class ClientHandler(shared.OsvcThread):
         self.streams[event.stream_id]["stream_ended"] = event.stream_ended
         if not event.stream_ended:
             return
-        status, content_type, data = self.h2_router(event.stream_id)
-        self.prepare_response(event.stream_id, status, data, content_type)
+        self.h2_dispatch(event.stream_id)
+
+    def h2_dispatch(self, stream_id):
+        """
+        Execute the request of <stream_id> in a worker, so a slow handler
+        doesn't stall the other streams of the connection.
+        """
+        if self.submit(self.h2_route, stream_id):
+            return
+        self.log.warning("workers backlog full, refuse request on stream %d", stream_id)
+        status = 503
+        result = {"status": status, "error": "Too many pending requests"}
+        self.prepare_response(stream_id, status, result)
+
+    def h2_route(self, stream_id):
+        """
+        The worker job routing the request of <stream_id> to its handler
+        and sending the response.
+        """
+        try:
+            status, content_type, data = self.h2_router(stream_id)
+        except DontClose:
+            return
+        except Exception as exc:
+            if stream_id not in self.streams:
+                # the client reset the stream while the handler was running
+                return
+            self.log_exception(exc)
+            self.closing = True
+            self.parent.wakeup(self)
+            return
+        with self.lock:
+            if self.closing or self.closed:
+                return
+            try:
+                self.prepare_response(stream_id, status, data, content_type)
+            except h2.exceptions.StreamClosedError:
+                # the client reset the stream while the handler was running
+                pass
 
     def h2_stream_ended(self, event):
         pass
@@ -1264,96 +1838,69 @@ class ClientHandler(shared.OsvcThread):
             elif isinstance(event, h2.events.ConnectionTerminated):
                 self.stop()
 
-    def handle_h2_client(self):
-        self.negotiate_tls()
-        self.tls_conn.settimeout(self.sock_tmo)
+    def h2_flush(self):
+        data_to_send = self.h2conn.data_to_send()
+        if data_to_send:
+            self.send(data_to_send)
 
-        # init h2 connection
-        h2config = H2Configuration(client_side=False)
-        self.h2conn = H2Connection(config=h2config)
-        self.h2conn.initiate_connection()
-        try:
-            self.tls_conn.sendall(self.h2conn.data_to_send())
-        except socket.error as exc:
-            if exc.errno == EPIPE:
-                # daemon restart with connected clients
-                return
-            raise
-
-        while True:
-            if self.stopped():
-                break
-            try:
-                data = self.tls_conn.recv(65535)
-                if not data:
+    def h2_read(self):
+        with self.lock:
+            while True:
+                data = self.recv(65535)
+                if data is None:
                     break
-                self.parent.stats.sessions.rx += len(data)
-                self.parent.stats.sessions.clients[self.addr[0]].rx += len(data)
+                if not data:
+                    raise Close
                 self.h2_received(data)
-            except ssl.SSLError:
-                pass
-            except socket.timeout:
-                pass
-            except socket.error as exc:
-                if exc.errno in (0, ECONNRESET):
-                    continue
-                self.log.error("%s", exc)
-                return
-            except h2.exceptions.StreamClosedError:
-                return
-            except ConnectionResetError:
-                return
-            except Exception as exc:
-                self.log.error("exit on %s %s", type(exc), exc)
-                traceback.print_exc()
-                return
-
-            # execute all registered pushers
-            pushers_per_stream = [(stream_id, stream.get("pushers", [])) for stream_id, stream in self.streams.items() if stream.get("pushers")]
-            for stream_id, pushers in pushers_per_stream:
-                for pusher in pushers:
-                    fn = pusher.get("fn")
-                    args = pusher.get("args", [])
-                    kwargs = pusher.get("kwargs", {})
-                    if not fn:
-                        continue
-                    try:
-                        getattr(self, fn)(stream_id, *args, **kwargs)
-                    except Exception as exc:
-                        print(exc)
-
-            data_to_send = self.h2conn.data_to_send()
-            if data_to_send:
-                self.tls_conn.sendall(data_to_send)
+                if self.stopped():
+                    raise Close
+        self.push()
 
-    def handle_raw_client(self):
-        chunks = []
+    def raw_read(self):
         buff_size = 4096
-        self.conn.setblocking(False)
         while True:
-            if self.stopped():
-                break
-            ready = select.select([self.conn], [], [self.conn], self.sock_tmo)
-            if ready[0]:
-                chunk = self.sock_recv(self.conn, buff_size)
-            else:
-                self.log.warning("timeout waiting for data")
+            chunk = self.recv(buff_size)
+            if chunk is None:
                 return
-            if ready[2]:
-                self.log.debug("exceptional condition on socket")
-                return
-            self.parent.stats.sessions.rx += len(chunk)
-            self.parent.stats.sessions.clients[self.addr[0]].rx += len(chunk)
+            if self.request_received:
+                # raw events subscriber. the client is only expected to
+                # close the connection.
+                if not chunk:
+                    raise Close
+                continue
             if chunk:
-                chunks.append(chunk)
+                self.inbound.append(chunk)
             if not chunk or chunk.endswith(b"\x00"):
                 break
-        if six.PY3:
-            data = b"".join(chunks)
-        else:
-            data = "".join(chunks)
-        del chunks
-        self.handle_raw_client_data(data)
+        data = b"".join(self.inbound)
+        self.inbound = []
+        self.request_received = True
+        self.reading = False
+        if not self.submit(self.raw_route, data):
+            self.log.warning("workers backlog full, refuse request")
+            raise Close
+
+    def raw_route(self, data):
+        """
+        The worker job routing a raw request to its handler and sending
+        the result.
+        """
+        close = True
+        try:
+            self.handle_raw_client_data(data)
+        except Close:
+            pass
+        except DontClose:
+            close = False
+        except Exception as exc:
+            self.log_exception(exc)
+        with self.lock:
+            if close and not self.raw_events:
+                self.close_on_flush = True
+            else:
+                # watch the client disconnection
+                self.reading = True
+        self.parent.wakeup(self)
 
     def handle_raw_client_data(self, data):
         if six.PY3:
@@ -1406,23 +1953,11 @@ class ClientHandler(shared.OsvcThread):
         if result is None:
             return
         self.parent.stats.sessions.alive[self.sid].progress = "sending %s result" % self.parent.stats.sessions.alive[self.sid].progress
-        self.conn.setblocking(True)
         if self.encrypted:
             message = self.encrypt(result)
         else:
             message = self.msg_encode(result)
-        for chunk in chunker(message, 64*1024):
-            try:
-                self.conn.sendall(chunk)
-            except socket.error as exc:
-                if exc.errno == EPIPE:
-                    self.log.info(exc)
-                else:
-                    self.log.warning(exc)
-                break
-        message_len = len(message)
-        self.parent.stats.sessions.tx += message_len
-        self.parent.stats.sessions.clients[self.addr[0]].tx += message_len
+        self.send(message)
 
     def log_request(self, msg, nodename, lvl="info", **kwargs):
         """
@@ -1471,10 +2006,12 @@ class ClientHandler(shared.OsvcThread):
         return data
 
     def get_namespaces(self, role="guest"):
-        if self.usr is False or "root" in self.usr_grants:
+        with self.lock:
+            usr, usr_grants = self.usr, self.usr_grants
+        if usr is False or "root" in usr_grants:
             return self.get_all_ns()
         else:
-            return self.usr_grants.get(role, [])
+            return usr_grants.get(role, [])
 
     def user_grants(self, all_ns=None):
         if self.usr is False or self.tls is False:
@@ -1518,14 +2055,16 @@ class ClientHandler(shared.OsvcThread):
         return data
 
     def rbac_requires(self, namespaces=None, roles=None, action=None, grants=None, path=None, **kwargs):
-        if self.usr is False:
+        with self.lock:
+            usr, usr_grants = self.usr, self.usr_grants
+        if usr is False:
             # ux and aes socket are not constrainted by rbac
             return
         if roles is None:
             # world-usable
             return
         if grants is None:
-            grants = self.usr_grants
+            grants = usr_grants
         if "root" in grants:
             return
         if isinstance(namespaces, (list, tuple)):
@@ -1612,8 +2151,18 @@ class ClientHandler(shared.OsvcThread):
                 svcnodes = [n for n in shared.CLUSTER_DATA if shared.CLUSTER_DATA[n].get("services", {}).get("config", {}).get(path)]
                 nodenames = [n for n in nodenames if n in svcnodes]
 
+        timeout = shared.NODE.oget("listener", "multiplex_timeout")
+        deadline = time.time() + timeout
+
         def do_node(nodename):
+            """
+            Return the node result and its contribution to the aggregated
+            status.
+            """
             if nodename == Env.nodename:
+                if handler.blocking and self.parent.workers:
+                    # don't hold a workers pool slot while waiting
+                    self.parent.workers.detach()
                 try:
                     _result = handler.action(nodename, action=action, options=options, stream_id=stream_id, thr=self)
                 except ex.HTTP as exc:
@@ -1626,12 +2175,11 @@ class ClientHandler(shared.OsvcThread):
                     status = 500
                     _result = {"status": status, "error": str(exc), "traceback": traceback.format_exc()}
                     self.log.exception(exc)
-                result["nodes"][nodename] = _result
                 try:
-                    result["status"] += 1 if _result.get("status") else 0
+                    return _result, 1 if _result.get("status") else 0
                 except AttributeError:
                     # result is not a dict
-                    pass
+                    return _result, 0
             else:
                 if handler.stream:
                     sp = self.socket_parms("https://"+nodename)
@@ -1641,25 +2189,90 @@ class ClientHandler(shared.OsvcThread):
                         "args": [nodename, client_stream_id, conn, resp],
                     })
                     _result = {}
+                elif has_h2():
+                    # the peer h2 listener, so the pooled connections
+                    # are reused
+                    sp = self.socket_parms("https://"+nodename)
+                    _result = self.h2_daemon_request(data, server=nodename, silent=True, method=method,
+                                                     sp=sp, deadline=deadline)
                 else:
                     _result = self.daemon_request(data, server=nodename, silent=True, method=method)
-                result["nodes"][nodename] = _result
                 try:
-                    result["status"] += _result.get("status", 0)
+                    return _result, _result.get("status", 0)
                 except AttributeError:
                     # result is not a dict
-                    pass
+                    return _result, 0
 
-        for nodename in nodenames:
-            try:
-                do_node(nodename)
-            except Exception:
+        for nodename, ret in self.fanout(do_node, nodenames, timeout):
+            if ret is None:
+                # do_node error
                 continue
+            _result, status = ret
+            result["nodes"][nodename] = _result
+            result["status"] += status
 
         if handler.stream:
             return
         return result
 
+    def fanout(self, fn, nodenames, timeout):
+        """
+        Execute fn(nodename) concurrently on the listener workers for each
+        node of <nodenames>, and yield the (nodename, fn return value)
+        tuples as they arrive. The return value is None if fn raised an
+        exception.
+
+        The nodes not done within <timeout> seconds are yielded with a
+        timeout error result, so the caller can return a partial result.
+        fn is expected to abort its own work past this deadline.
+        """
+        workers = self.parent.workers
+        if len(nodenames) < 2 or workers is None:
+            for nodename in nodenames:
+                try:
+                    yield nodename, fn(nodename)
+                except Exception:
+                    yield nodename, None
+            return
+
+        done = queue.Queue()
+
+        def do_node(nodename):
+            try:
+                ret = fn(nodename)
+            except Exception:
+                ret = None
+            done.put((nodename, ret))
+
+        pending = set()
+        deadline = time.time() + timeout
+        for nodename in nodenames:
+            try:
+                workers.submit(do_node, nodename)
+            except (queue.Full, RuntimeError):
+                self.log.warning("multiplex: workers backlog full, skip node %s", nodename)
+                yield nodename, ({"status": 1, "error": "workers backlog full"}, 1)
+                continue
+            pending.add(nodename)
+
+        # don't hold a workers pool slot while waiting for the nodes
+        workers.detach()
+
+        while pending:
+            left = deadline - time.time()
+            if left <= 0:
+                break
+            try:
+                nodename, ret = done.get(True, left)
+            except queue.Empty:
+                break
+            pending.discard(nodename)
+            yield nodename, ret
+
+        for nodename in pending:
+            self.log.warning("multiplex: node %s response timeout", nodename)
+            yield nodename, ({"status": 1, "error": "timeout waiting for the node response"}, 1)
+
     def push_peer_stream(self, stream_id, nodename, client_stream_id, conn, resp):
         if conn._sock.can_read:
             conn._recv_cb(client_stream_id)
@@ -1808,6 +2421,10 @@ class ClientHandler(shared.OsvcThread):
         else:
             self.rbac_requires(action=action)
 
+        if handler.blocking and self.parent.workers:
+            # don't hold a workers pool slot while waiting
+            self.parent.workers.detach()
+
         if action == "create":
             return self.create_multiplex(handler, options, data, nodename, action, stream_id=stream_id)
         node = data.get("node")
@@ -1833,27 +2450,30 @@ class ClientHandler(shared.OsvcThread):
             self.h2_stream_send(stream_id, msg)
 
     def raw_push_action_events(self):
+        """
+        Keep the raw session open after the handler returns. The listener
+        event loop sends the queued events until the client disconnects.
+        """
+        self.raw_events = True
+
+    def raw_push_queued_events(self):
         while True:
-            if self.stopped():
-                break
-            while True:
-                try:
-                    buff = self.conn.recv(4096)
-                except Exception as exc:
-                    break
-                if not buff:
-                    return
             try:
-                msg = self.event_queue.get(True, 1)
+                msg = self.event_queue.get(False, 0)
             except queue.Empty:
-                continue
+                break
 
-            if self.encrypted:
-                msg = self.encrypt(msg)
+            if isinstance(msg, bytes):
+                # already encoded by the handler
+                pass
+            elif not isinstance(msg, SharedEvent):
+                msg = self.encrypt(msg) if self.encrypted else self.msg_encode(msg)
+            elif self.encrypted:
+                msg = msg.encode("raw-encrypted", self.encrypt)
             else:
-                msg = self.msg_encode(msg)
+                msg = msg.encode("raw", self.msg_encode)
 
-            self.conn.sendall(msg)
+            self.send(msg)
 
     def logskip(self, backlog, logfile):
         skip = 0
@@ -1940,9 +2560,12 @@ class ClientHandler(shared.OsvcThread):
 
     def h2_sse_stream_send(self, stream_id, data):
         self.events_counter += 1
-        msg = "id: %d\n" % self.events_counter
-        msg += "data: %s\n\n" % json.dumps(data)
-        self.streams[stream_id]["outbound"] += msg.encode()
+        msg = ("id: %d\n" % self.events_counter).encode()
+        if isinstance(data, SharedEvent):
+            msg += data.encode("sse", lambda event: ("data: %s\n\n" % event.to_json()).encode())
+        else:
+            msg += ("data: %s\n\n" % json.dumps(data)).encode()
+        self.streams[stream_id]["outbound"] += msg
         self.send_outbound(stream_id)
 
     def h2_stream_send(self, stream_id, data):
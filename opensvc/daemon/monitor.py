@@ -16,6 +16,7 @@ from itertools import chain
 import daemon.shared as shared
 import foreign.json_delta as json_delta
 from core.freezer import Freezer
+from daemon.fswatch import FileWatcher
 from env import Env
 from utilities.naming import (factory, fmt_path, list_services,
                               resolve_path, split_path, svc_pathcf,
@@ -77,6 +78,30 @@ LEADER_ABORT_STATES = (
 
 ETC_NS_SKIP = len(os.path.join(Env.paths.pathetcns, ""))
 
+# The instance status keys the aggregated status is computed from. A
+# change of one of these keys on any node triggers the recomputation of the
+# object aggregated status.
+AGG_INSTANCE_KEYS = (
+    "avail",
+    "overall",
+    "frozen",
+    "provisioned",
+    "topology",
+    "scale",
+    "scaler_slave",
+    "flex_min",
+    "flex_max",
+    "slaves",
+    "scaler_slaves",
+)
+AGG_MISSING = object()
+
+# Set to verify the incrementally maintained aggregated status against a
+# full recomputation on every monitor loop. Debug only: this is costly.
+AGG_CHECK = os.environ.get("OPENSVC_AGG_CHECK")
+
+RE_SCALER_SLAVE = re.compile(r"^[0-9]+\.(.+)$")
+
 class Defer(Exception):
     """
     Raised from orchestration routines to signal the condition to
@@ -574,13 +599,18 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
     default_stdby_nb_restart = 2
     arbitrators_data = None
     last_arbitrator_ping = 0
+    status_shareable = True
 
     def __init__(self):
         shared.OsvcThread.__init__(self)
         self._shutdown = False
         self.compat = True
-        self.last_node_data = None
         self.init_steps = set()
+        self.agg_fingerprints = {}
+        self.agg_children = {}
+        self.status_nodes_cache = {}
+        self.config_paths = set()
+        self.fswatch = FileWatcher()
 
     def init(self):
         self.set_tid()
@@ -591,6 +621,10 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
         self.shortloops = 0
         self.unfreeze_when_all_nodes_joined = False
         self.node_frozen = self.freezer.node_frozen()
+        if self.fswatch.start():
+            self.log.info("watch the objects config and status files changes")
+        else:
+            self.log.info("poll the objects config and status files changes")
 
         shared.CLUSTER_DATA[Env.nodename] = {
             "compat": shared.COMPAT_VERSION,
@@ -601,6 +635,7 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
             "targets": shared.NODE.targets,
             "services": {},
         }
+        shared.NODE_DATA_TRACKER.reset()
 
         if os.environ.get("OPENSVC_AGENT_UPGRADE"):
             if not self.node_frozen:
@@ -642,20 +677,20 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
                 if self.stopped():
                     self.join_threads()
                     self.kill_procs()
+                    self.fswatch.stop()
                     sys.exit(0)
         except Exception as exc:
             self.log.exception(exc)
 
-    def transition_count(self):
-        count = 0
-        for path in list(shared.SMON_DATA):
-            try:
-                data = shared.SMON_DATA[path]
-            except KeyError:
-                continue
-            if data.status and data.status != "scaling" and data.status.endswith("ing"):
-                count += 1
-        return count
+    @staticmethod
+    def transition_count():
+        return len(shared.SMON_TRANSITIONS)
+
+    def thread_stats(self):
+        data = shared.OsvcThread.thread_stats(self)
+        if data is not None:
+            data["transitions"] = self.transition_count()
+        return data
 
     def set_next(self, timeout):
         """
@@ -2686,7 +2721,9 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
     # Service instances status aggregation
     #
     #########################################################################
-    def get_agg_avail(self, path):
+    def get_agg_avail(self, path, agg=None):
+        if agg is None:
+            agg = shared.AGG
         try:
             instance = self.get_any_service_instance(path)
         except IndexError:
@@ -2711,15 +2748,14 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
             if n_up > 0 and n_up < instance.get("scale"):
                 return "warn"
 
-        slaves = instance.get("slaves", [])
-        slaves += instance.get("scaler_slaves", [])
+        slaves = instance.get("slaves", []) + instance.get("scaler_slaves", [])
         if slaves:
             _, namespace, _ = split_path(path)
             avails = set([avail])
             for child in slaves:
                 child = resolve_path(child, namespace)
                 try:
-                    child_avail = shared.AGG[child]["avail"]
+                    child_avail = agg[child]["avail"]
                 except KeyError:
                     child_avail = "unknown"
                 avails.add(child_avail)
@@ -2738,7 +2774,9 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
             return "n/a"
         return avail
 
-    def get_agg_overall(self, path):
+    def get_agg_overall(self, path, agg=None):
+        if agg is None:
+            agg = shared.AGG
         ostatus = 'undef'
         ostatus_l = []
         n_instances = 0
@@ -2772,15 +2810,14 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
         if instance is None:
             # during init for example
             return "unknown"
-        slaves = instance.get("slaves", [])
-        slaves += instance.get("scaler_slaves", [])
+        slaves = instance.get("slaves", []) + instance.get("scaler_slaves", [])
         if slaves:
             _, namespace, _ = split_path(path)
             avails = set([ostatus])
             for child in slaves:
                 child = resolve_path(child, namespace)
                 try:
-                    child_status = shared.AGG[child]["overall"]
+                    child_status = agg[child]["overall"]
                 except KeyError:
                     child_status = "unknown"
                 avails.add(child_status)
@@ -3120,16 +3157,45 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
         self.log.info("service %s config consensus reached", path)
         return True
 
+    def get_config_paths(self):
+        """
+        Update and return the set of local object paths, and return the
+        subset of paths with a changed configuration file, or None if all
+        must be checked.
+        """
+        changed = self.fswatch.changed_configs()
+        if changed is None:
+            self.config_paths = set(list_services())
+            return self.config_paths, None
+        for path in changed:
+            if os.path.exists(svc_pathcf(path)):
+                self.config_paths.add(path)
+            else:
+                self.config_paths.discard(path)
+        return self.config_paths, changed
+
     def get_services_config(self):
         config = {}
-        for path in list_services():
+        paths, changed = self.get_config_paths()
+        for path in paths:
+            last_config = self.get_last_svc_config(path)
+            if changed is not None and path not in changed and \
+               last_config is not None and path in shared.SERVICES:
+                # config file unchanged since the last pass
+                with shared.SERVICES_LOCK:
+                    scope = sorted(list(shared.SERVICES[path].nodes))
+                config[path] = {
+                    "updated": last_config["updated"],
+                    "csum": last_config["csum"],
+                    "scope": scope,
+                }
+                continue
             cfg = svc_pathcf(path)
             try:
                 config_mtime = os.path.getmtime(cfg)
             except Exception as exc:
                 self.log.warning("failed to get %s mtime: %s", cfg, str(exc))
                 config_mtime = 0
-            last_config = self.get_last_svc_config(path)
             if last_config is None or config_mtime > last_config["updated"]:
                 #self.log.debug("compute service %s config checksum", path)
                 try:
@@ -3230,17 +3296,24 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
         # this data ends up in CLUSTER_DATA[Env.nodename]["services"]["status"]
         data = {}
 
+        # the paths with a changed status.json, or None if all must be checked
+        changed = self.fswatch.changed_status()
+
         for path in paths:
             idata = None
             last_mtime = self.get_last_svc_status_mtime(path)
             fpath = svc_pathvar(path, "status.json")
-            try:
-                mtime = os.path.getmtime(fpath)
-                if mtime < self.startup:
-                    continue
-            except Exception as exc:
-                # preserve previous status data if any (an action may be running)
-                mtime = 0
+            if changed is not None and path not in changed and last_mtime > 0:
+                # status.json unchanged since the last pass
+                mtime = last_mtime
+            else:
+                try:
+                    mtime = os.path.getmtime(fpath)
+                    if mtime < self.startup:
+                        continue
+                except Exception as exc:
+                    # preserve previous status data if any (an action may be running)
+                    mtime = 0
 
             try:
                need_load = mtime > last_mtime + 0.0001
@@ -3252,10 +3325,14 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
                 #  => load
                 idata = self.load_instance_status_cache(fpath)
 
-            if not idata and last_mtime > 0:
+            if idata:
+                shared.NODE_DATA_TRACKER.mark_dirty(path)
+            elif last_mtime > 0:
                 # the status.json did not change or failed to load
                 #  => preserve current data
                 idata = shared.CLUSTER_DATA[Env.nodename]["services"]["status"][path]
+                shared.NODE_DATA_TRACKER.mark_dirty(path, "frozen")
+                shared.NODE_DATA_TRACKER.mark_dirty(path, "monitor")
 
             if idata:
                 data[path] = idata
@@ -3443,8 +3520,7 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
                 return
             self.log.debug("service %s global expect is %s, already is",
                            path, smon.global_expect)
-            with shared.SMON_DATA_LOCK:
-                del shared.SMON_DATA[path]
+            self.del_smon(path)
 
         def handle_deleted():
             deleted = self.get_agg_deleted(path)
@@ -3452,8 +3528,7 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
                 return
             self.log.debug("service %s global expect is %s, already is",
                            path, smon.global_expect)
-            with shared.SMON_DATA_LOCK:
-                del shared.SMON_DATA[path]
+            self.del_smon(path)
 
         def handle_aborted():
             if not self.get_agg_aborted(path):
@@ -3592,7 +3667,7 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
                     #              path, global_expect)
                     continue
                 else:
-                    del shared.SMON_DATA[path]
+                    self.del_smon(path)
             except KeyError:
                 pass
             try:
@@ -3624,33 +3699,17 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
         with shared.HB_MSG_LOCK:
              # reset the full status cache. get_message() will refill if
              # needed.
-             shared.HB_MSG = None
-             shared.HB_MSG_LEN = 0
+             shared.HB_MSG = {}
         shared.wake_heartbeat_tx()
 
     def _update_hb_data_locked(self):
         now = time.time()
         data = shared.CLUSTER_DATA[Env.nodename]
+        updated = data.get("updated", now)
+        diff = shared.NODE_DATA_TRACKER.diff(data)
 
-        # exclude from the diff
-        try:
-            del data["gen"]
-        except KeyError:
-            pass
-        try:
-            updated = data["updated"]
-            del data["updated"]
-        except KeyError:
-            updated = now
-
-        if self.last_node_data is not None:
-            diff = json_delta.diff(
-                self.last_node_data, data,
-                verbose=False, array_align=False, compare_lengths=False
-            )
-        else:
+        if diff is None:
             # first run
-            self.last_node_data = json.loads(json.dumps(data))
             data["gen"] = self.get_gen(inc=True)
             data["updated"] = now
             return
@@ -3660,7 +3719,6 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
             data["updated"] = updated
             return
 
-        self.last_node_data = json.loads(json.dumps(data))
         data["gen"] = self.get_gen(inc=True)
         data["updated"] = now
         diff.append([["updated"], data["updated"]])
@@ -3900,11 +3958,11 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
             return False
         return not instance_provisioned
 
-    def get_agg(self, path):
+    def get_agg(self, path, agg=None):
         data = self.get_agg_conf(path)
-        data.avail = self.get_agg_avail(path)
+        data.avail = self.get_agg_avail(path, agg=agg)
         data.frozen = self.get_agg_frozen(path)
-        data.overall = self.get_agg_overall(path)
+        data.overall = self.get_agg_overall(path, agg=agg)
         data.placement = self.get_agg_placement(path)
         data.provisioned = self.get_agg_provisioned(path)
         return data
@@ -3923,21 +3981,169 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
         return paths
 
     def get_agg_services(self):
-        data = {}
+        """
+        Update and return the objects aggregated status.
+
+        Only the objects whose instances status, config or monitor changed
+        since the previous call are recomputed, with their parents and
+        scalers.
+        """
         with shared.CLUSTER_DATA_LOCK:
             all_paths = self.get_all_paths()
-            for path in all_paths:
-                try:
-                    if self.get_service(path).topology == "span":
-                        data[path] = Storage()
-                        continue
-                except Exception as exc:
-                    data[path] = Storage()
-                    pass
-                data[path] = self.get_agg(path)
+            fingerprints = dict((path, self.agg_fingerprint(path)) for path in all_paths)
+            previous = self.agg_fingerprints
+            data = {}
+            dirty = set()
+            for path, fingerprint in fingerprints.items():
+                if path in shared.AGG and previous.get(path) == fingerprint:
+                    data[path] = shared.AGG[path]
+                else:
+                    dirty.add(path)
+            removed = set(previous) - all_paths
+            pending = self.agg_pending(dirty | removed, all_paths)
+            for path in removed:
+                self.agg_children.pop(path, None)
+            self.agg_children.update(self.compute_agg(pending, data))
+            self.agg_fingerprints = fingerprints
+            if AGG_CHECK:
+                self.check_agg_services(all_paths, data)
         shared.AGG = data
         return data
 
+    def check_agg_services(self, all_paths, data):
+        """
+        Verify the incrementally updated aggregated status <data> against
+        a full recomputation, log the differences and fix <data>.
+        """
+        full = {}
+        self.compute_agg(all_paths, full)
+        for path in all_paths:
+            if data.get(path) == full.get(path):
+                continue
+            self.log.warning("object %s incremental aggregated status %s "
+                             "differs from its full computation %s",
+                             path, data.get(path), full.get(path))
+            data[path] = full[path]
+
+    def compute_agg(self, paths, data):
+        """
+        Compute the aggregated status of <paths> into <data>, children
+        before parents, so the parents aggregate the fresh children status.
+
+        Return the children of the computed paths, indexed by path.
+        """
+        children = {}
+
+        def compute(path, visiting):
+            if path in children or path in visiting:
+                return
+            visiting.add(path)
+            children[path] = self.agg_instance_children(path)
+            for child in children[path]:
+                if child in paths:
+                    compute(child, visiting)
+            data[path] = self.get_agg_service(path, data)
+
+        for path in paths:
+            compute(path, set())
+        return children
+
+    def get_agg_service(self, path, agg):
+        svc = self.get_service(path)
+        if svc is not None and svc.topology == "span":
+            return Storage()
+        return self.get_agg(path, agg=agg)
+
+    def agg_pending(self, changed, all_paths):
+        """
+        Return the <changed> paths, with their parents and scalers, in
+        <all_paths>.
+        """
+        parents = {}
+        for parent, children in self.agg_children.items():
+            for child in children:
+                parents.setdefault(child, set()).add(parent)
+        pending = set()
+        stack = list(changed)
+        while stack:
+            path = stack.pop()
+            if path in pending:
+                continue
+            if path in all_paths:
+                pending.add(path)
+            dependents = parents.get(path, set())
+            scaler = self.agg_scaler(path)
+            if scaler:
+                dependents = dependents | set([scaler])
+            stack += [dependent for dependent in dependents if dependent not in pending]
+        return pending
+
+    @staticmethod
+    def agg_scaler(path):
+        """
+        Return the path of the scaler of <path> if <path> looks like a
+        scaler slave.
+        """
+        name, namespace, kind = split_path(path)
+        match = RE_SCALER_SLAVE.match(name)
+        if match is None:
+            return
+        return fmt_path(match.group(1), namespace, kind)
+
+    def agg_instance_children(self, path):
+        """
+        Return the paths of the objects whose aggregated status is
+        aggregated in the <path> aggregated status.
+        """
+        try:
+            instance = self.get_any_service_instance(path)
+            slaves = instance.get("slaves", []) + instance.get("scaler_slaves", [])
+        except Exception:
+            return ()
+        if not slaves:
+            return ()
+        _, namespace, _ = split_path(path)
+        return tuple(resolve_path(child, namespace) for child in slaves)
+
+    def agg_fingerprint(self, path):
+        """
+        Return a comparable summary of the data the <path> aggregated
+        status is computed from.
+        """
+        fingerprint = []
+        scaler = False
+        for nodename in self.cluster_nodes:
+            try:
+                instance = shared.CLUSTER_DATA[nodename]["services"]["status"][path]
+            except (TypeError, KeyError):
+                fingerprint.append(None)
+                continue
+            if not isinstance(instance, dict):
+                fingerprint.append((instance,))
+                continue
+            try:
+                monitor = instance["monitor"]
+                monitor = (monitor.get("placement"), monitor.get("status"))
+            except (TypeError, KeyError, AttributeError):
+                monitor = None
+            values = ["updated" in instance, monitor]
+            for key in AGG_INSTANCE_KEYS:
+                value = instance.get(key, AGG_MISSING)
+                if isinstance(value, list):
+                    value = tuple(value)
+                values.append(value)
+            if instance.get("scale") is not None:
+                scaler = True
+            fingerprint.append(tuple(values))
+        try:
+            csum = shared.CLUSTER_DATA[Env.nodename]["services"]["config"][path]["csum"]
+        except (TypeError, KeyError):
+            csum = None
+        fingerprint.append((id(shared.SERVICES.get(path)), csum))
+        if scaler:
+            fingerprint.append(tuple(self.scaler_current_slaves(path)))
+        return tuple(fingerprint)
+
     def update_completions(self):
         self.update_completion("services")
         self.update_completion("nodes")
@@ -3956,13 +4162,52 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
 
     def status(self):
         data = shared.OsvcThread.status(self)
-        data["nodes"] = json.loads(json.dumps(shared.CLUSTER_DATA))
+        data["nodes"] = self.status_nodes()
         data["compat"] = self.compat
         data["transitions"] = self.transition_count()
         data["frozen"] = self.get_clu_agg_frozen()
         data["services"] = self.get_agg_services()
         return data
 
+    def status_nodes(self):
+        """
+        Return a copy of the cluster nodes datasets.
+
+        The copy of a peer dataset is reused until the peer dataset or its
+        monitor data is replaced, or the dataset is patched to a new
+        generation, so the daemon status snapshots share the unchanged peer
+        datasets. A hb ping replaces the peer monitor data without changing
+        the generation. The local dataset is modified in place, so it is
+        always copied.
+
+        The cache keeps references to the marker objects, instead of their
+        id(), so a new object can not reuse the address of a cached one.
+        """
+        cache = {}
+        data = {}
+        with shared.CLUSTER_DATA_LOCK:
+            for nodename, ndata in shared.CLUSTER_DATA.items():
+                if nodename == Env.nodename:
+                    data[nodename] = json.loads(json.dumps(ndata))
+                    continue
+                try:
+                    marker = (ndata, ndata.get("monitor"), tuple(sorted(ndata["gen"].items())))
+                except (KeyError, AttributeError, TypeError):
+                    marker = None
+                try:
+                    cached_marker, cached_data = self.status_nodes_cache[nodename]
+                except KeyError:
+                    cached_marker, cached_data = None, None
+                if marker is None or cached_marker is None or \
+                   marker[0] is not cached_marker[0] or \
+                   marker[1] is not cached_marker[1] or \
+                   marker[2] != cached_marker[2]:
+                    cached_data = json.loads(json.dumps(ndata))
+                cache[nodename] = (marker, cached_data)
+                data[nodename] = cached_data
+        self.status_nodes_cache = cache
+        return data
+
     def get_last_shutdown(self):
         try:
             return os.path.getmtime(Env.paths.last_shutdown)
@@ -4068,6 +4313,7 @@ class Monitor(shared.OsvcThread, MonitorObjectOrchestratorManualMixin):
     def reload_instance_frozen(self, path):
         try:
             shared.CLUSTER_DATA[Env.nodename]["services"]["status"][path]["frozen"] = shared.SERVICES[path].frozen()
+            shared.NODE_DATA_TRACKER.mark_dirty(path, "frozen")
         except Exception:
             pass
 
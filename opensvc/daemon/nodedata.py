@@ -0,0 +1,229 @@
+"""
+Change tracking of the local node dataset shared through the heartbeats.
+
+The monitor used to deep copy the whole local node dataset and diff it
+against the previous copy on every change. The tracker keeps a snapshot
+of the last sent dataset, and only compares the subtrees recorded as
+dirty since the previous generation, plus the small top-level keys.
+
+The produced deltas use the json_delta stanza format, so the peers can
+apply them using the usual patch path.
+"""
+import json
+import threading
+
+import foreign.json_delta as json_delta
+
+# top-level keys excluded from the deltas
+EXCLUDED_KEYS = ("gen", "updated")
+
+# the subtrees of the "services" key where the entries are only compared
+# when marked dirty
+TRACKED_SUBTREES = ("status",)
+
+
+def _copy(data):
+    return json.loads(json.dumps(data))
+
+
+def _diff(path, old, new):
+    """
+    Return the json_delta stanzas transforming <old> into <new>, with
+    keypaths prefixed by <path>.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        diff = json_delta.diff(
+            old, new,
+            verbose=False, array_align=False, compare_lengths=False
+        )
+        return [[path + stanza[0]] + stanza[1:] for stanza in diff]
+    if old == new:
+        return []
+    return [[path, _copy(new)]]
+
+
+class NodeDataTracker(object):
+    """
+    Record the dirty keypaths of the local node dataset and build the
+    generation deltas from those keypaths only.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.last = None
+        self.dirty = {}
+        self.refs = {}
+
+    def reset(self, data=None):
+        """
+        Forget the dirty keypaths and snapshot <data> as the reference
+        dataset of the next diff. A None <data> forces a full dataset
+        snapshot on the next diff.
+        """
+        with self.lock:
+            self.dirty = {}
+            if data is None:
+                self.last = None
+                self.refs = {}
+                return
+            self.last = _copy(self._strip(data))
+            self.refs = self._get_refs(data)
+
+    def mark_dirty(self, path, *keys):
+        """
+        Record a change of the local instance <path> status. If <keys> are
+        set, only this subkey of the instance status changed.
+        """
+        with self.lock:
+            if path not in self.dirty:
+                self.dirty[path] = set()
+            elif self.dirty[path] is None:
+                return
+            if keys:
+                self.dirty[path].add(keys)
+            else:
+                self.dirty[path] = None
+
+    def diff(self, data):
+        """
+        Return the list of json_delta stanzas to apply to the last
+        snapshot to obtain <data>, and update the snapshot.
+
+        Return None if no snapshot is available yet. In this case, the
+        snapshot is initialized with <data>.
+        """
+        with self.lock:
+            if self.last is None:
+                self.reset(data)
+                return
+            dirty = self.dirty
+            self.dirty = {}
+            diff = []
+            diff += self._diff_top(data)
+            diff += self._diff_services(data, dirty)
+            self.refs = self._get_refs(data)
+            return diff
+
+    @staticmethod
+    def _strip(data):
+        return dict((key, val) for key, val in data.items() if key not in EXCLUDED_KEYS)
+
+    @staticmethod
+    def _get_refs(data):
+        """
+        Return the live instance status dicts, indexed by path.
+
+        An instance status dict replaced by a new object since the
+        previous diff was reloaded from its status.json, so it is fully
+        compared.
+        """
+        try:
+            return dict(data["services"]["status"])
+        except (KeyError, TypeError):
+            return {}
+
+    def _diff_top(self, data):
+        diff = []
+        for key in set(self.last) | set(data):
+            if key in EXCLUDED_KEYS or key == "services":
+                continue
+            if key not in data:
+                diff.append([[key]])
+                del self.last[key]
+            elif key not in self.last:
+                diff.append([[key], _copy(data[key])])
+                self.last[key] = _copy(data[key])
+            elif self.last[key] != data[key]:
+                diff += _diff([key], self.last[key], data[key])
+                self.last[key] = _copy(data[key])
+        return diff
+
+    def _diff_services(self, data, dirty):
+        new = data.get("services")
+        old = self.last.get("services")
+        if not isinstance(new, dict) or not isinstance(old, dict):
+            diff = _diff(["services"], old, new)
+            self.last["services"] = _copy(new)
+            return diff
+        diff = []
+        for key in set(old) | set(new):
+            if key not in new:
+                diff.append([["services", key]])
+                del old[key]
+            elif key not in old or not isinstance(new[key], dict) or not isinstance(old[key], dict):
+                diff.append([["services", key], _copy(new[key])])
+                old[key] = _copy(new[key])
+            elif key in TRACKED_SUBTREES:
+                diff += self._diff_tracked(["services", key], old[key], new[key], dirty)
+            else:
+                diff += self._diff_entries(["services", key], old[key], new[key])
+        return diff
+
+    @staticmethod
+    def _diff_entries(path, old, new):
+        """
+        Compare every entry of a subtree of small entries, like the
+        instances config.
+        """
+        diff = []
+        for key in set(old) | set(new):
+            if key not in new:
+                diff.append([path + [key]])
+                del old[key]
+            elif key not in old:
+                diff.append([path + [key], _copy(new[key])])
+                old[key] = _copy(new[key])
+            elif old[key] != new[key]:
+                diff += _diff(path + [key], old[key], new[key])
+                old[key] = _copy(new[key])
+        return diff
+
+    def _diff_tracked(self, path, old, new, dirty):
+        """
+        Compare only the added, removed, replaced and dirty entries of a
+        subtree of large entries, like the instances status.
+        """
+        diff = []
+        for key in set(old) - set(new):
+            diff.append([path + [key]])
+            del old[key]
+        for key, entry in new.items():
+            if key not in old or self.refs.get(key) is not entry:
+                keys = None
+            elif key in dirty:
+                keys = dirty[key]
+            else:
+                continue
+            if keys is None or not isinstance(entry, dict) or not isinstance(old[key], dict):
+                if key not in old:
+                    diff.append([path + [key], _copy(entry)])
+                else:
+                    diff += _diff(path + [key], old[key], entry)
+                old[key] = _copy(entry)
+                continue
+            for subkeys in sorted(keys):
+                diff += self._diff_subkeys(path + [key], old[key], entry, list(subkeys))
+        return diff
+
+    @staticmethod
+    def _diff_subkeys(path, old, new, subkeys):
+        for subkey in subkeys[:-1]:
+            path = path + [subkey]
+            if not isinstance(new.get(subkey), dict) or not isinstance(old.get(subkey), dict):
+                subkeys = [subkey]
+                path = path[:-1]
+                break
+            old = old[subkey]
+            new = new[subkey]
+        subkey = subkeys[-1]
+        if subkey not in new:
+            if subkey not in old:
+                return []
+            del old[subkey]
+            return [[path + [subkey]]]
+        if subkey not in old:
+            old[subkey] = _copy(new[subkey])
+            return [[path + [subkey], _copy(new[subkey])]]
+        diff = _diff(path + [subkey], old[subkey], new[subkey])
+        if diff:
+            old[subkey] = _copy(new[subkey])
+        return diff
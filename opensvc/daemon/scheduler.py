@@ -1,6 +1,8 @@
 """
 Scheduler Thread
 """
+import datetime
+import heapq
 import os
 import sys
 import logging
@@ -9,6 +11,7 @@ from subprocess import Popen
 
 import daemon.shared as shared
 import core.exceptions as ex
+from daemon.forkserver import ForkServer, ForkServerError, PRELOAD
 from env import Env
 from utilities.converters import print_duration
 
@@ -19,6 +22,8 @@ ENQUEUE_INTERVAL = 30
 FUTURE = 60
 MIN_DEQUEUE_INTERVAL = 0.5
 JANITOR_CERTS_INTERVAL = 3600
+FORKSERVER_RETRY_INTERVAL = 300
+NEXT_DUE_MAX = 3600
 ACTIONS_SKIP_ON_UNPROV = [
     "sync_all",
     "compliance_auto",
@@ -29,10 +34,16 @@ ACTIONS_SKIP_ON_UNPROV = [
 class Scheduler(shared.OsvcThread):
     name = "scheduler"
     delayed = {}
+    queue = []
+    queue_seq = 0
+    next_due = {}
+    next_enqueue = 0
     running = set()
     dropped_via_notify = set()
     certificates = {}
     last_janitor_certs = 0
+    forkserver = None
+    forkserver_failed = 0
 
     def max_tasks(self):
         if self.node_overloaded():
@@ -45,6 +56,8 @@ class Scheduler(shared.OsvcThread):
     def status(self, **kwargs):
         data = shared.OsvcThread.status(self, **kwargs)
         data["running"] = len(self.running)
+        if self.forkserver:
+            data["forkserver"] = self.forkserver.status()
         data["delayed"] = []
 
         # thread-safe delayed dump
@@ -75,6 +88,8 @@ class Scheduler(shared.OsvcThread):
         else:
             devnull = "/dev/null"
         self.devnull = os.open(devnull, os.O_RDWR)
+        if hasattr(os, "fork"):
+            self.forkserver = ForkServer(env=self.action_env())
 
         while True:
             try:
@@ -83,11 +98,12 @@ class Scheduler(shared.OsvcThread):
                 self.log.exception(exc)
             if self.stopped():
                 self.kill_procs()
+                if self.forkserver:
+                    self.forkserver.stop()
                 sys.exit(0)
 
     def do(self):
         self.reload_config()
-        last = 0
         done = 0
         init = True
         while True:
@@ -98,29 +114,44 @@ class Scheduler(shared.OsvcThread):
             future = self.now + FUTURE
             self.janitor_run_done()
             self.janitor_certificates()
-            if shared.NMON_DATA.status not in ("init", "upgrade", "shutting"):
+            if self.scheduling_allowed():
                 if init:
                     init = False
-                    last = now
+                    self.next_enqueue = now + ENQUEUE_INTERVAL
                     self.run_scheduler(self.now)
-                elif now - last >= ENQUEUE_INTERVAL:
-                    last = now
+                elif now >= self.next_enqueue:
+                    self.next_enqueue = now + ENQUEUE_INTERVAL
                     self.run_scheduler(future)
                 self.dequeue_actions()
             done = self.janitor_procs()
             if not done:
                 self.do_wait()
 
+    @staticmethod
+    def scheduling_allowed():
+        return shared.NMON_DATA.status not in ("init", "upgrade", "shutting")
+
     def do_wait(self):
         with shared.SCHED_TICKER:
             shared.SCHED_TICKER.wait(self.dequeue_delay())
 
     def dequeue_delay(self):
         """
-        Returns DEQUEUE_INTERVAL with drift correction, to try and
-        do a loop on regular interval, whatever the loop duration.
+        Return the delay until the next due queued task or the next
+        scheduler run. Running tasks and a node monitor state forbidding
+        the scheduling cap the delay to DEQUEUE_INTERVAL, as their changes
+        are not notified.
         """
-        delay = DEQUEUE_INTERVAL - (time.time() - self.now)
+        now = time.time()
+        wakeups = [self.next_enqueue]
+        next_expire = self.next_queued_expire()
+        if next_expire is not None:
+            # get_todo() compares the expire date to the minute-aligned
+            # self.now, so a task is due at the minute following its expire
+            wakeups.append(self.run_time(next_expire + 59))
+        if self.procs or not self.scheduling_allowed():
+            wakeups.append(now + DEQUEUE_INTERVAL)
+        delay = min(wakeups) - now
         if delay < MIN_DEQUEUE_INTERVAL:
             delay = MIN_DEQUEUE_INTERVAL
         return delay
@@ -190,17 +221,24 @@ class Scheduler(shared.OsvcThread):
         self.running -= not_dropped_yet
         self.dropped_via_notify -= sigs
 
-    def exec_action(self, sigs, cmd):
+    @staticmethod
+    def action_env():
         env = os.environ.copy()
         env["OSVC_ACTION_ORIGIN"] = "daemon"
-        env["OSVC_SCHED_TIME"] = str(self.now)
-        kwargs = dict(stdout=self.devnull, stderr=self.devnull,
-                      stdin=self.devnull, close_fds=os.name!="nt",
-                      env=env)
-        try:
-            proc = Popen(cmd, **kwargs)
-        except KeyboardInterrupt:
-            return
+        return env
+
+    def exec_action(self, sigs, cmd):
+        proc = self.forkserver_exec_action(cmd)
+        if proc is None:
+            env = self.action_env()
+            env["OSVC_SCHED_TIME"] = str(self.now)
+            kwargs = dict(stdout=self.devnull, stderr=self.devnull,
+                          stdin=self.devnull, close_fds=os.name!="nt",
+                          env=env)
+            try:
+                proc = Popen(cmd, **kwargs)
+            except KeyboardInterrupt:
+                return
         self.running |= set(sigs)
         self.push_proc(proc=proc,
                        cmd=cmd,
@@ -209,6 +247,29 @@ class Scheduler(shared.OsvcThread):
                        on_error="drop_running",
                        on_error_args=[sigs])
 
+    def forkserver_exec_action(self, cmd):
+        """
+        Execute the action in a child of the forkserver, which has already
+        imported the modules the action needs. Return None if the caller
+        has to fallback to a new interpreter.
+        """
+        if not self.forkserver:
+            return
+        if self.forkserver_failed and time.time() < self.forkserver_failed + FORKSERVER_RETRY_INTERVAL:
+            return
+        try:
+            if not self.forkserver.alive():
+                self.forkserver.preload = PRELOAD + sorted([modname for modname in list(sys.modules) if modname.startswith("drivers.")])
+                self.forkserver.start()
+                self.log.info("forkserver started, pid %d", self.forkserver.proc.pid)
+            return self.forkserver.submit(cmd[len(Env.om):], env={"OSVC_SCHED_TIME": str(self.now)})
+        except (ForkServerError, OSError, IOError) as exc:
+            self.log.warning("forkserver unavailable, execute actions in new processes for %d seconds: %s",
+                             FORKSERVER_RETRY_INTERVAL, exc)
+            self.forkserver.stop()
+            self.forkserver_failed = time.time()
+            return
+
     def format_cmd(self, action, path=None, rids=None):
         if path is None:
             cmd = Env.om + ["node", action]
@@ -242,9 +303,43 @@ class Scheduler(shared.OsvcThread):
             self.log.debug("promote queued action '%s' to run asap", sig)
             self.delayed[sig]["delay"] = 0
             self.delayed[sig]["expire"] = now
+            self.push_queued(sig)
         else:
             self.log.debug("skip already queued action '%s'", sig)
 
+    def push_queued(self, sig):
+        """
+        Index the <sig> delayed task in the heap ordered by expire date.
+        """
+        self.queue_seq += 1
+        heapq.heappush(self.queue, (self.delayed[sig]["expire"], self.queue_seq, sig))
+
+    def next_queued_expire(self):
+        """
+        Return the expire date of the first queued task, dropping the heap
+        entries of the tasks deleted or requeued since indexed.
+        """
+        while self.queue:
+            expire, _, sig = self.queue[0]
+            try:
+                if self.delayed[sig]["expire"] == expire:
+                    return expire
+            except KeyError:
+                pass
+            heapq.heappop(self.queue)
+
+    def pop_due(self):
+        """
+        Pop from the heap and return the signatures of the expired tasks.
+        """
+        sigs = []
+        while True:
+            expire = self.next_queued_expire()
+            if expire is None or expire > self.now:
+                break
+            sigs.append(heapq.heappop(self.queue)[2])
+        return sigs
+
     def queue_action(self, action, delay=0, path=None, rid=None, now=None):
         sig = (action, path, rid)
         if delay is None:
@@ -261,6 +356,7 @@ class Scheduler(shared.OsvcThread):
             "expire": exp,
             "delay": delay,
         }
+        self.push_queued(sig)
         if not delay:
             self.log.debug("queued action '%s' for run in %s", sig, print_duration(exp-self.now))
         else:
@@ -278,10 +374,13 @@ class Scheduler(shared.OsvcThread):
         open_slots = max(self.max_tasks() - len(self.procs), 0)
         if not open_slots:
             return []
-        self.janitor_delayed()
+        due = self.pop_due()
+        self.janitor_delayed(due)
 
-        for sig, task in self.delayed.items():
-            if task["expire"] > self.now:
+        for sig in due:
+            try:
+                task = self.delayed[sig]
+            except KeyError:
                 continue
             action, path, rid = sig
             merge_key = (action, path)
@@ -314,11 +413,24 @@ class Scheduler(shared.OsvcThread):
                     todo[merge_key]["path"].append(path)
                 if data["task"]["queued"] < todo[merge_key]["queued"]:
                     todo[merge_key]["queued"] = data["task"]["queued"]
-        return sorted(todo.values(), key=lambda task: task["queued"])[:open_slots]
+        todo = sorted(todo.values(), key=lambda task: task["queued"])[:open_slots]
 
-    def janitor_delayed(self):
+        # the due tasks not dequeued for lack of slots stay first in line
+        selected = set()
+        for task in todo:
+            selected |= set(task["sigs"])
+        for sig in due:
+            if sig in self.delayed and sig not in selected:
+                self.push_queued(sig)
+        return todo
+
+    def janitor_delayed(self, sigs):
+        """
+        Drop from the due <sigs> the tasks whose resource requirements are
+        not met.
+        """
         drop = []
-        for sig, task in self.delayed.items():
+        for sig in sigs:
             action, path, rid = sig
             if not path:
                 continue
@@ -396,15 +508,73 @@ class Scheduler(shared.OsvcThread):
     def run_time(self, now):
         return int(now // 60 * 60)
 
+    @staticmethod
+    def config_signature():
+        """
+        Return a value changing when the node or cluster configuration
+        changes, as the objects tasks scheduling depends on it too.
+        """
+        sig = []
+        for fpath in (Env.paths.nodeconf, Env.paths.clusterconf):
+            try:
+                sig.append(os.path.getmtime(fpath))
+            except OSError:
+                sig.append(None)
+        return tuple(sig), id(shared.NODE)
+
+    def validate_action(self, sched, action, key, signature, lasts=None, now=None):
+        """
+        Return the <sched> validate_action() result for <action>, or raise
+        AbortAction without evaluating the schedule if the action can not
+        be due before the next due date cached for <key>.
+
+        The next due date is recomputed when the action is found not due,
+        or when the <signature> of the configuration changes. Later runs
+        of the action only delay the real due date.
+        """
+        try:
+            cached_signature, next_due = self.next_due[key]
+        except KeyError:
+            pass
+        else:
+            if cached_signature == signature and now < next_due:
+                raise ex.AbortAction
+        try:
+            data = sched.validate_action(action, lasts=lasts, now=now)
+        except ex.AbortAction:
+            self.next_due[key] = (signature, self.get_next_due(sched, action, lasts, now))
+            raise
+        self.next_due.pop(key, None)
+        return data
+
+    @staticmethod
+    def get_next_due(sched, action, lasts, now):
+        """
+        Return the timestamp before which <action>, not due at <now>, can
+        not be due, capped to NEXT_DUE_MAX seconds from <now>.
+        """
+        limit = now + NEXT_DUE_MAX
+        try:
+            due = sched.get_next_due(action, now=datetime.datetime.fromtimestamp(now + 60), lasts=lasts)
+        except Exception:
+            return now + 60
+        if due is None:
+            return limit
+        return min(time.mktime(due.timetuple()) + due.microsecond / 1000000., limit)
+
     def run_scheduler(self, now):
         #self.log.info("run scheduler")
         nonprov = []
+        config_signature = self.config_signature()
+        keys = set()
 
         if shared.NODE:
             shared.NODE.options.cron = True
             for action in shared.NODE.sched.actions:
+                key = (None, action)
+                keys.add(key)
                 try:
-                    delay = shared.NODE.sched.validate_action(action, now=now)
+                    delay = self.validate_action(shared.NODE.sched, action, key, config_signature, now=now)
                 except ex.AbortAction:
                     continue
                 self.queue_action(action, delay, now=now)
@@ -421,12 +591,16 @@ class Scheduler(shared.OsvcThread):
             except KeyError:
                 continue
             lasts = self.get_lasts(svc)
+            updated = shared.CLUSTER_DATA.get(Env.nodename, {}).get("services", {}).get("config", {}).get(path, {}).get("updated")
+            signature = (config_signature, id(svc), updated)
             for action, parms in svc.sched.actions.items():
                 if provisioned in ("mixed", False) and action in ACTIONS_SKIP_ON_UNPROV:
                     nonprov.append(action+"@"+path)
                     continue
+                key = (path, action)
+                keys.add(key)
                 try:
-                    data = svc.sched.validate_action(action, lasts=lasts, now=now)
+                    data = self.validate_action(svc.sched, action, key, signature, lasts=lasts, now=now)
                 except ex.AbortAction as exc:
                     self.log.debug("skip %s on %s: validation", action, path)
                     continue
@@ -441,6 +615,9 @@ class Scheduler(shared.OsvcThread):
                     for rid in rids:
                         self.queue_action(action, delay, path, rid, now=now)
 
+        for key in set(self.next_due) - keys:
+            del self.next_due[key]
+
         # log a scheduler loop digest
         msg = []
         if len(nonprov) > 0:
@@ -17,15 +17,15 @@ from foreign.six.moves import queue
 
 import core.exceptions as ex
 import foreign.json_delta as json_delta
-from foreign.jsonpath_ng.ext import parse
 from env import Env
 from utilities.lazy import lazy, unset_lazy
-from utilities.naming import split_path, paths_data, factory, object_path_glob
-from utilities.selector import selector_config_match, selector_value_match, selector_parse_fragment, selector_parse_op_fragment
+from utilities.naming import split_path, factory
+from utilities.selector import compile_object_selector
 from utilities.storage import Storage
 from core.freezer import Freezer
 from core.comm import Crypt
 from .events import EVENTS
+from .nodedata import NodeDataTracker
 
 
 class DebugRLock(object):
@@ -72,7 +72,11 @@ PATCH_ID = 0
 
 # disable orchestration if a peer announces a different compat version than
 # ours
-COMPAT_VERSION = 10
+COMPAT_VERSION = 11
+
+# the minimum compat version of all the heartbeat peers to send binary
+# message frames instead of json-wrapped messages
+HB_FRAME_COMPAT_VERSION = 11
 
 # expose api handlers version
 API_VERSION = 6
@@ -119,16 +123,24 @@ SERVICES_LOCK = RLock()
 AGG = {}
 AGG_LOCK = RLock()
 
-# The encrypted message all the heartbeat tx threads send.
+# The encrypted full dataset message all the heartbeat tx threads send,
+# and its length, indexed by message format (True for binary frames).
 # It is refreshed in the monitor thread loop.
-HB_MSG = None
-HB_MSG_LEN = 0
+HB_MSG = {}
 HB_MSG_LOCK = RLock()
 
+# The encrypted patch messages the heartbeat tx threads send, indexed by
+# (begin gen, current gens, message format). Purged with the gen diffs log.
+HB_PATCH_MSG_CACHE = {}
+
 # the local service monitor data, where the listener can set expected states
 SMON_DATA = {}
 SMON_DATA_LOCK = RLock()
 
+# SMON_DATA paths in a transition status, maintained by set_smon() and
+# del_smon() so the transitions count is not computed by a SMON_DATA scan
+SMON_TRANSITIONS = set()
+
 # the local node monitor data, where the listener can set expected states
 NMON_DATA = Storage({
     "status": "init",
@@ -157,6 +169,10 @@ LOCKS_LOCK = RLock()
 CLUSTER_DATA = {Env.nodename: {}}
 CLUSTER_DATA_LOCK = RLock()
 
+# The change tracker of CLUSTER_DATA[Env.nodename], used by the monitor
+# thread to build the local dataset generation deltas
+NODE_DATA_TRACKER = NodeDataTracker()
+
 # The lock to serialize CLUSTER_DATA updates from rx threads
 RX_LOCK = RLock()
 
@@ -242,6 +258,42 @@ def wake_scheduler():
         SCHED_TICKER.notify_all()
 
 
+def is_transition_status(status):
+    """
+    Return True if the service monitor <status> is a transition counted
+    in the node max_parallel limit.
+    """
+    return bool(status) and status != "scaling" and status.endswith("ing")
+
+
+def snapshot_diff(old, new, path=None):
+    """
+    Return the json_delta stanzas patching the <old> daemon status
+    snapshot into <new>.
+
+    Dicts are compared key by key, other values are replaced as a whole.
+    The subtrees <old> and <new> share are skipped without being walked.
+    """
+    if old is new:
+        return []
+    if path is None:
+        path = []
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        if old == new:
+            return []
+        return [[path, new]]
+    diff = []
+    for key, value in new.items():
+        if key in old:
+            diff += snapshot_diff(old[key], value, path + [key])
+        else:
+            diff.append([path + [key], value])
+    for key in old:
+        if key not in new:
+            diff.append([path + [key]])
+    return diff
+
+
 #############################################################################
 #
 # Base Thread class
@@ -254,6 +306,10 @@ class OsvcThread(threading.Thread, Crypt):
     """
     stop_tmo = 60
 
+    # True if the status() data is made of objects never modified once
+    # returned, so the daemon status snapshots can embed it without copy.
+    status_shareable = False
+
     def __init__(self):
         super(OsvcThread, self).__init__()
         self.log = None
@@ -342,7 +398,7 @@ class OsvcThread(threading.Thread, Crypt):
             "configured": self.configured,
         }
         if self.alerts:
-            data["alerts"] = self.alerts
+            data["alerts"] = list(self.alerts)
         if self.tid:
             data["tid"] = self.tid
         return data
@@ -633,6 +689,10 @@ class OsvcThread(threading.Thread, Crypt):
                         reset_placement = True
                     SMON_DATA[path].status = status
                     SMON_DATA[path].status_updated = time.time()
+                    if is_transition_status(status):
+                        SMON_TRANSITIONS.add(path)
+                    else:
+                        SMON_TRANSITIONS.discard(path)
                     changed = True
                 if reset_placement:
                     SMON_DATA[path].placement = \
@@ -688,8 +748,18 @@ class OsvcThread(threading.Thread, Crypt):
                     SMON_DATA[path].stonith = stonith
                     changed = True
         if changed:
+            NODE_DATA_TRACKER.mark_dirty(path, "monitor")
             wake_monitor(reason="service %s mon change" % path)
 
+    @staticmethod
+    def del_smon(path):
+        """
+        Forget the <path> service monitor data.
+        """
+        with SMON_DATA_LOCK:
+            SMON_TRANSITIONS.discard(path)
+            del SMON_DATA[path]
+
     def get_node_monitor(self, nodename=None):
         """
         Return the Monitor data of the node.
@@ -1293,6 +1363,8 @@ class OsvcThread(threading.Thread, Crypt):
         for gen in to_remove:
             # self.log.info("purge gen %d", gen)
             del GEN_DIFF[gen]
+        with HB_MSG_LOCK:
+            HB_PATCH_MSG_CACHE.clear()
 
     @staticmethod
     def mon_changed():
@@ -1395,6 +1467,7 @@ class OsvcThread(threading.Thread, Crypt):
                 try:
                     # trigger status.json reload by the mon thread
                     CLUSTER_DATA[Env.nodename]["services"]["status"][path]["updated"] = 0
+                    NODE_DATA_TRACKER.mark_dirty(path, "updated")
                 except KeyError:
                     pass
         wake_monitor(reason="nodes info change")
@@ -1599,33 +1672,45 @@ class OsvcThread(threading.Thread, Crypt):
         """
         Return a hash indexed by thead id, containing the status data
         structure of each thread.
+
+        The status data of the threads not declaring it shareable is
+        copied, so the returned structure is not modified afterwards.
         """
         data = {
             "pid": DAEMON.pid,
             "cluster": {
                 "name": self.cluster_name,
                 "id": self.cluster_id,
-                "nodes": self.cluster_nodes,
+                "nodes": list(self.cluster_nodes),
             }
         }
         for thr_id in list(THREADS):
             try:
-                data[thr_id] = THREADS[thr_id].status()
+                thr = THREADS[thr_id]
             except KeyError:
                 continue
+            thr_data = thr.status()
+            if not thr.status_shareable:
+                thr_data = json.loads(json.dumps(thr_data))
+            data[thr_id] = thr_data
         return data
 
     def update_daemon_status(self):
+        """
+        Publish a new daemon status snapshot, and queue the patch event
+        from the previous snapshot.
+
+        Published snapshots are never modified, so the subtrees unchanged
+        between two generations are shared, and not walked by the diff.
+        """
         global LAST_DAEMON_STATUS
         global DAEMON_STATUS
         global EVENT_Q
         global PATCH_ID
-        LAST_DAEMON_STATUS = json.loads(json.dumps(DAEMON_STATUS))
-        DAEMON_STATUS = self._daemon_status()
-        diff = json_delta.diff(
-            LAST_DAEMON_STATUS, DAEMON_STATUS,
-            verbose=False, array_align=False, compare_lengths=False
-        )
+        data = self._daemon_status()
+        diff = snapshot_diff(DAEMON_STATUS, data)
+        LAST_DAEMON_STATUS = DAEMON_STATUS
+        DAEMON_STATUS = data
         if not diff:
             return
         PATCH_ID += 1
@@ -1637,22 +1722,44 @@ class OsvcThread(threading.Thread, Crypt):
         })
 
     def daemon_status(self):
-        return json.loads(json.dumps(LAST_DAEMON_STATUS))
+        """
+        Return the daemon status snapshot the queued patch events apply to,
+        so an events subscriber receiving it as the full event can apply
+        the next patches. The caller must not modify it.
+        """
+        return LAST_DAEMON_STATUS
 
     def filter_daemon_status(self, data, namespace=None, namespaces=None, selector=None):
+        """
+        Return <data> with only the objects selected by <selector>.
+
+        The dicts holding the objects are copied, not modified, so <data>
+        can be a daemon status snapshot.
+        """
         if selector is None:
             selector = "**"
-        keep = self.object_selector(selector=selector, namespace=namespace, namespaces=namespaces)
-        for node in [n for n in data.get("monitor", {}).get("nodes", {})]:
-            for path in [p for p in data["monitor"]["nodes"][node].get("services", {}).get("status", {})]:
-                if path not in keep:
-                    del data["monitor"]["nodes"][node]["services"]["status"][path]
-            for path in [p for p in data["monitor"]["nodes"][node].get("services", {}).get("config", {})]:
-                if path not in keep:
-                    del data["monitor"]["nodes"][node]["services"]["config"][path]
-        for path in [p for p in data.get("monitor", {}).get("services", {})]:
-            if path not in keep:
-                del data["monitor"]["services"][path]
+        keep = set(self.object_selector(selector=selector, namespace=namespace, namespaces=namespaces))
+
+        def filter_paths(paths_data):
+            return dict((path, pdata) for path, pdata in paths_data.items() if path in keep)
+
+        if "monitor" not in data:
+            return data
+        data = dict(data)
+        data["monitor"] = dict(data["monitor"])
+        if "nodes" in data["monitor"]:
+            nodes = {}
+            for node, ndata in data["monitor"]["nodes"].items():
+                if "services" in ndata:
+                    ndata = dict(ndata)
+                    ndata["services"] = dict(ndata["services"])
+                    for section in ("status", "config"):
+                        if section in ndata["services"]:
+                            ndata["services"][section] = filter_paths(ndata["services"][section])
+                nodes[node] = ndata
+            data["monitor"]["nodes"] = nodes
+        if "services" in data["monitor"]:
+            data["monitor"]["services"] = filter_paths(data["monitor"]["services"])
         return data
 
     def match_object_selector(self, selector=None, namespace=None, namespaces=None, path=None):
@@ -1661,116 +1768,20 @@ class OsvcThread(threading.Thread, Crypt):
         return path in self.object_selector(selector=selector, namespace=namespace, namespaces=namespaces, paths=[path])
 
     def object_selector(self, selector=None, namespace=None, namespaces=None, kind=None, paths=None):
+        """
+        Return the list of object paths matching <selector>, among <paths>
+        or all known objects if <paths> is not set.
+
+        Evaluating thousands of paths in a single call is much cheaper than
+        calling match_object_selector() for each path.
+        """
         if not selector:
             return []
-        if namespace:
-            if namespaces is not None and namespace not in namespaces:
-                return []
-            # noinspection PySetFunctionToLiteral
-            namespaces = set([namespace])
-        if "root" in namespaces:
-            namespaces.add(None)
-
         if paths is None:
             # all objects
             paths = [p for p in AGG]
-        pds = paths_data(paths)
-        pds = [pd for pd in pds if pd["namespace"] in namespaces]
-        if kind:
-            pds = [pd for pd in pds if pd["kind"] == kind]
-        if selector == "**":
-            return [pd["display"] for pd in pds]
-
-        # all services
-        if selector == "*":
-            kind = kind or "svc"
-            return [pd["display"] for pd in pds if pd["kind"] == kind]
-
-        def or_fragment_selector(s):
-            expanded = []
-            for _selector in s.split(","):
-                for p in and_fragment_selector(_selector):
-                    if p in expanded:
-                        continue
-                    expanded.append(p)
-            return expanded
-
-        def and_fragment_selector(s):
-            expanded = None
-            for _selector in s.split("+"):
-                _expanded = fragment_selector(_selector)
-                if expanded is None:
-                    expanded = _expanded
-                else:
-                    expanded = [p for p in expanded if p in _expanded]
-            return expanded
-
-        def selector_parse_jsonpath_expr(param):
-            if param.startswith("."):
-                param = "$"+param
-
-            if param.startswith("$."):
-                jsonpath_expr = parse(param)
-            else:
-                jsonpath_expr = None
-            return jsonpath_expr
-
-        def fragment_selector(s):
-            # empty
-            if not s:
-                return []
-
-            # explicit object path
-            if s in AGG:
-                if s not in paths:
-                    return []
-                return [s]
-
-            # fnmatch expression
-            negate, s, elts = selector_parse_fragment(s)
-
-            if len(elts) == 1:
-                return object_path_glob(s, pds=pds, namespace=namespace, kind=kind, negate=negate)
-
-            try:
-                param, op, value = selector_parse_op_fragment(elts)
-            except ValueError:
-                return []
-
-            expanded = []
-            jsonpath_expr = selector_parse_jsonpath_expr(param)
-
-            for path in paths:
-                ret = svc_matching(path, param, op, value, jsonpath_expr)
-                if ret ^ negate:
-                    expanded.append(path)
-
-            return expanded
-
-        def selector_status_matching(path, jsonpath_expr, op, value):
-            try:
-                data = self.object_data(path)
-                matches = jsonpath_expr.find(data)
-                for match in matches:
-                    current = match.value
-                    if selector_value_match(current, op, value):
-                        return True
-            except Exception:
-                return False
-            return False
-
-        def svc_matching(path, param, op, value, jsonpath_expr):
-            if jsonpath_expr:
-                return selector_status_matching(path, jsonpath_expr, op, value)
-            else:
-                try:
-                    svc = SERVICES[path]
-                except KeyError:
-                    return False
-                return selector_config_match(svc, param, op, value)
-
-        expanded = or_fragment_selector(selector)
-        return expanded
+        matcher = compile_object_selector(selector, namespaces=namespaces, namespace=namespace, kind=kind)
+        return matcher.match_many(paths, objects=SERVICES, object_data=self.object_data)
 
     def object_data(self, path):
         """
@@ -1778,7 +1789,8 @@ class OsvcThread(threading.Thread, Crypt):
         path.
         """
         try:
-            data = AGG[path]
+            # don't add the "nodes" key to the shared AGG entry
+            data = Storage(AGG[path])
             data["nodes"] = {}
         except KeyError:
             return
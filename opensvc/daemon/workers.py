@@ -0,0 +1,148 @@
+"""
+Bounded pool of worker threads.
+
+The listener event loop never executes a request handler itself. It submits
+the blocking work, handler execution and multiplexed peer requests, to this
+pool and goes back to serving the sockets.
+"""
+import logging
+import threading
+import traceback
+
+from foreign.six.moves import queue
+
+
+class WorkerPool(object):
+    """
+    Execute the submitted jobs in at most <max_workers> threads.
+
+    Workers are started on demand, when no idle worker is available to pick
+    a queued job, and exit after <idle_tmo> seconds without job, so an idle
+    daemon keeps no worker threads alive.
+
+    At most <max_queued> jobs can wait for a worker. Past this limit,
+    submit() raises queue.Full, and the caller decides how to report the
+    overload to its client.
+
+    A job expected to block for a long time calls detach() to leave the
+    pool, so it doesn't hold one of the <max_workers> slots.
+    """
+    def __init__(self, name="worker", max_workers=32, max_queued=1024, idle_tmo=60, log=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.idle_tmo = idle_tmo
+        self.log = log or logging.getLogger(name)
+        self.jobs = queue.Queue(max_queued)
+        self.lock = threading.Lock()
+        self.workers = set()
+        self.detached = set()
+        self.idle = 0
+        self.seq = 0
+        self.stopped = False
+        self.stats = {
+            "submitted": 0,
+            "rejected": 0,
+        }
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue the execution of fn(*args, **kwargs) by a worker.
+        """
+        with self.lock:
+            if self.stopped:
+                raise RuntimeError("%s pool is stopped" % self.name)
+            try:
+                self.jobs.put((fn, args, kwargs), False)
+            except queue.Full:
+                self.stats["rejected"] += 1
+                raise
+            self.stats["submitted"] += 1
+            self._start_worker_if_needed()
+
+    def _start_worker_if_needed(self):
+        if self.idle < self.jobs.qsize() and len(self.workers) < self.max_workers:
+            self._start_worker()
+
+    def _start_worker(self):
+        self.seq += 1
+        thr = threading.Thread(target=self._work, name="%s%d" % (self.name, self.seq))
+        thr.daemon = True
+        self.workers.add(thr)
+        self.idle += 1
+        thr.start()
+
+    def _work(self):
+        me = threading.current_thread()
+        while True:
+            try:
+                job = self.jobs.get(True, self.idle_tmo)
+            except queue.Empty:
+                with self.lock:
+                    if self.jobs.empty() or self.stopped:
+                        self.idle -= 1
+                        self.workers.discard(me)
+                        return
+                continue
+            if job is None:
+                with self.lock:
+                    self.idle -= 1
+                    self.workers.discard(me)
+                return
+            with self.lock:
+                self.idle -= 1
+            fn, args, kwargs = job
+            try:
+                fn(*args, **kwargs)
+            except Exception as exc:
+                self.log.error("%s job %s error: %s", self.name, getattr(fn, "__name__", fn), exc)
+                self.log.debug(traceback.format_exc())
+            finally:
+                del job, fn, args, kwargs
+            with self.lock:
+                if me in self.detached:
+                    self.detached.discard(me)
+                    return
+                self.idle += 1
+
+    def detach(self):
+        """
+        Release the slot of the calling worker, for a job expected to block
+        for a long time. The thread exits when the job is done, and a new
+        worker can be started in its place meanwhile.
+
+        No-op if the caller is not a worker of this pool.
+        """
+        me = threading.current_thread()
+        with self.lock:
+            if me not in self.workers:
+                return
+            self.workers.discard(me)
+            self.detached.add(me)
+            if not self.stopped:
+                self._start_worker_if_needed()
+
+    def stop(self):
+        """
+        Refuse new jobs and ask the workers to exit once the already queued
+        jobs are done. Workers busy on a job are not interrupted.
+        """
+        with self.lock:
+            self.stopped = True
+            workers = len(self.workers)
+        for _ in range(workers):
+            try:
+                self.jobs.put(None, False)
+            except queue.Full:
+                break
+
+    def status(self):
+        with self.lock:
+            return {
+                "workers": len(self.workers),
+                "idle": self.idle,
+                "detached": len(self.detached),
+                "max_workers": self.max_workers,
+                "queued": self.jobs.qsize(),
+                "submitted": self.stats["submitted"],
+                "rejected": self.stats["rejected"],
+            }
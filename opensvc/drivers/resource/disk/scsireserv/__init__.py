@@ -10,6 +10,8 @@ class BaseDiskScsireserv(Resource):
     """Define method to acquire and release scsi SPC-3 persistent reservations
     on devs held by a service
     """
+    # the status reads the devices of the peer disk resource
+    serialize_status = True
 
     def __init__(self,
                  rid=None,
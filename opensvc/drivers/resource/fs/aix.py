@@ -2,6 +2,7 @@ import os
 from stat import *
 
 import core.exceptions as ex
+import utilities.sysstate
 from utilities.files import protected_mount, getmount
 from utilities.mounts.aix import Mounts
 from utilities.proc import qcall
@@ -61,7 +62,7 @@ class Fs(BaseFs):
         }
 
     def is_up(self):
-        self.mounts = Mounts()
+        self.mounts = utilities.sysstate.mounts()
         return self.mounts.has_mount(self.device, self.mount_point)
 
     def realdev(self):
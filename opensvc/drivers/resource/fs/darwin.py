@@ -3,6 +3,7 @@ from stat import *
 
 import core.exceptions as ex
 import utilities.devices.darwin
+import utilities.sysstate
 from env import Env
 from utilities.files import protected_mount, getmount
 from utilities.mounts.darwin import Mounts
@@ -86,7 +87,7 @@ class Fs(BaseFs):
         return len(l[1].split())
 
     def is_up(self):
-        self.Mounts = Mounts()
+        self.Mounts = utilities.sysstate.mounts()
         ret = self.Mounts.has_mount(self.device, self.mount_point)
         if ret:
             return True
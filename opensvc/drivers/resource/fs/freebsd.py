@@ -2,6 +2,7 @@ import os
 from stat import *
 
 import core.exceptions as ex
+import utilities.sysstate
 from utilities.files import protected_mount, getmount
 from utilities.mounts.freebsd import Mounts
 from utilities.proc import qcall
@@ -72,7 +73,7 @@ class Fs(BaseFs):
         return len(l[1].split())
 
     def is_up(self):
-        self.Mounts = Mounts()
+        self.Mounts = utilities.sysstate.mounts()
         return self.Mounts.has_mount(self.device, self.mount_point)
 
     def realdev(self):
@@ -1,8 +1,8 @@
 import os
 
 import core.exceptions as ex
+import utilities.sysstate
 from utilities.files import protected_mount
-from utilities.mounts.hpux import Mounts
 from utilities.proc import qcall
 from . import BaseFs
 
@@ -51,7 +51,7 @@ class Fs(BaseFs):
         }
 
     def is_up(self):
-        return Mounts().has_mount(self.device, self.mount_point)
+        return utilities.sysstate.mounts().has_mount(self.device, self.mount_point)
 
     def start_mount(self):
         self.prepare_mount()
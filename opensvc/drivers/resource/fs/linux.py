@@ -6,6 +6,7 @@ from stat import ST_MODE, ST_INO, S_ISREG, S_ISBLK, S_ISDIR
 
 import core.exceptions as ex
 import utilities.devices.linux
+import utilities.sysstate
 from env import Env
 from utilities.files import protected_mount, getmount
 from utilities.cache import cache
@@ -127,7 +128,7 @@ class Fs(BaseFs):
         if self.mount_point is None:
             self.status_log("mnt is not defined", "info")
             return False
-        self.mounts = Mounts()
+        self.mounts = utilities.sysstate.mounts()
         for dev in [self.device] + utilities.devices.linux.udevadm_query_symlink(self.device):
             ret = self.mounts.has_mount(dev, self.mount_point)
             if ret:
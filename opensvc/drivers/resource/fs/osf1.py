@@ -2,6 +2,7 @@ import os
 from stat import *
 
 import core.exceptions as ex
+import utilities.sysstate
 from env import Env
 from utilities.files import protected_mount
 from utilities.mounts.osf1 import Mounts
@@ -60,7 +61,7 @@ class Fs(BaseFs):
         }
 
     def is_up(self):
-        self.Mounts = Mounts()
+        self.Mounts = utilities.sysstate.mounts()
         ret = self.Mounts.has_mount(self.device, self.mount_point)
         if ret:
             return True
@@ -3,9 +3,9 @@ import re
 import time
 
 import core.exceptions as ex
+import utilities.sysstate
 from env import Env
 from utilities.subsystems.zfs import zfs_getprop, zfs_setprop
-from utilities.mounts.sunos import Mounts
 from . import BaseFs
 from utilities.proc import justcall
 from utilities.lazy import lazy
@@ -41,7 +41,7 @@ class Fs(BaseFs):
         }
 
     def is_up(self):
-        mounts = Mounts()
+        mounts = utilities.sysstate.mounts()
         return mounts.has_mount(self.device, self.mount_point)
 
     def start_mount(self):
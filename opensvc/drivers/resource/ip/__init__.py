@@ -11,7 +11,7 @@ import core.status
 import utilities.net.ipaddress
 import utilities.lock
 import core.exceptions as ex
-import utilities.ifconfig
+import utilities.sysstate
 
 from core.objects.svcdict import KEYS
 from core.resource import Resource
@@ -539,9 +539,10 @@ class Ip(Resource):
     def get_ifconfig():
         """
         Wrapper around the os specific rcIfconfig module's ifconfig function.
-        Return a parsed ifconfig dataset.
+        Return a parsed ifconfig dataset, shared by the resources evaluated
+        in the same status evaluation window.
         """
-        return utilities.ifconfig.Ifconfig()
+        return utilities.sysstate.ifconfig()
 
     def start(self):
         """
@@ -0,0 +1,151 @@
+"""
+Synthetic daemon datasets generators, used by the benchmarks.
+
+The generated structures mimic the CLUSTER_DATA layout: a dict of node
+datasets, each with a services config and status subtree of <instances>
+instances having <resources> resources.
+"""
+import random
+import time
+
+RESOURCE_TYPES = (
+    ("fs", "flag", "/srv/{name}"),
+    ("ip", "host", "10.{a}.{b}.{c}@eth0"),
+    ("disk", "vg", "{name}vg"),
+    ("container", "docker", "{name}/nginx:latest"),
+    ("app", "forking", "{name}-app"),
+    ("sync", "rsync", "to all"),
+)
+
+
+def path_name(idx, namespace=None):
+    name = "svc%05d" % idx
+    if namespace:
+        return "%s/svc/%s" % (namespace, name)
+    return name
+
+
+def resources_data(name, count, rng):
+    data = {}
+    for idx in range(count):
+        rtype, driver, label = RESOURCE_TYPES[idx % len(RESOURCE_TYPES)]
+        rid = "%s#%d" % (rtype, idx // len(RESOURCE_TYPES))
+        data[rid] = {
+            "status": "up",
+            "type": "%s.%s" % (rtype, driver),
+            "label": label.format(name=name, a=rng.randint(0, 255), b=rng.randint(0, 255), c=rng.randint(1, 254)),
+            "provisioned": {"mtime": time.time() - rng.randint(0, 10000), "state": True},
+            "restart": 0,
+            "monitor": rtype in ("ip", "container"),
+            "optional": rtype == "sync",
+            "log": [],
+        }
+    return data
+
+
+def instance_status(name, resources=5, rng=None, now=None):
+    rng = rng or random.Random(0)
+    now = now or time.time()
+    return {
+        "app": "bench",
+        "avail": "up",
+        "overall": "up",
+        "csum": "%032x" % rng.getrandbits(128),
+        "env": "TST",
+        "frozen": 0,
+        "kind": "svc",
+        "optional": "n/a",
+        "orchestrate": "ha",
+        "placement": "nodes order",
+        "provisioned": True,
+        "running": [],
+        "topology": "failover",
+        "updated": now - rng.randint(0, 600),
+        "subsets": {},
+        "resources": resources_data(name, resources, rng),
+        "monitor": {
+            "status": "idle",
+            "status_updated": now - rng.randint(0, 3600),
+            "global_expect": None,
+            "global_expect_updated": now - rng.randint(0, 3600),
+            "local_expect": "started",
+            "placement": "leader",
+        },
+    }
+
+
+def instance_config(nodes, rng=None, now=None):
+    rng = rng or random.Random(0)
+    now = now or time.time()
+    return {
+        "csum": "%032x" % rng.getrandbits(128),
+        "updated": now - rng.randint(0, 86400),
+        "scope": list(nodes),
+    }
+
+
+def node_data(nodename, nodes, instances=100, resources=5, namespace=None, namespaces=None, seed=0):
+    """
+    Return a synthetic dataset of the <nodename> node, as found in
+    CLUSTER_DATA[nodename].
+
+    The instances are spread over the <namespaces> list if set, or all
+    created in <namespace>.
+    """
+    rng = random.Random("%s-%d" % (nodename, seed))
+    now = time.time()
+    status = {}
+    config = {}
+    for idx in range(instances):
+        if namespaces:
+            namespace = namespaces[idx % len(namespaces)]
+        path = path_name(idx, namespace=namespace)
+        status[path] = instance_status(path, resources=resources, rng=rng, now=now)
+        config[path] = instance_config(nodes, rng=rng, now=now)
+    return {
+        "agent": "2.1-dev",
+        "api": 6,
+        "compat": 11,
+        "env": "TST",
+        "frozen": 0,
+        "gen": dict((node, 1) for node in nodes),
+        "labels": {"az": "fr1"},
+        "targets": {},
+        "locks": {},
+        "speaker": nodename == nodes[0],
+        "min_avail_mem": 2,
+        "min_avail_swap": 10,
+        "updated": now,
+        "stats": {
+            "load_15m": 0.5,
+            "mem_avail": 60,
+            "mem_total": 16000,
+            "score": 300,
+            "swap_avail": 100,
+            "swap_total": 2000,
+        },
+        "monitor": {
+            "status": "idle",
+            "status_updated": now,
+        },
+        "services": {
+            "config": config,
+            "status": status,
+        },
+    }
+
+
+def cluster_data(nodes=2, instances=100, resources=5, namespace=None, namespaces=None, seed=0, nodenames=None):
+    """
+    Return a synthetic CLUSTER_DATA of <nodes> nodes, or of the <nodenames>
+    nodes if set, each running <instances> instances of <resources>
+    resources.
+    """
+    if nodenames is None:
+        nodenames = ["node%d" % idx for idx in range(1, nodes + 1)]
+    return dict(
+        (nodename, node_data(nodename, nodenames, instances=instances,
+                             resources=resources, namespace=namespace,
+                             namespaces=namespaces, seed=seed))
+        for nodename in nodenames
+    )
@@ -0,0 +1,215 @@
+"""
+Load test the dns thread PowerDNS remote backend on a synthetic cluster.
+
+Stand-in PowerDNS client processes connect to the backend unix socket and
+send lookup requests, waiting for the responses of a batch of --pipeline
+requests before sending the next batch. Each client reconnects after
+--requests-per-conn requests, like PowerDNS does with its short-lived
+backend connections.
+
+Usage, from the opensvc directory:
+
+    python -m tests.benchmark.dnsload [--clients 8] [--duration 5] [--pipeline 1]
+                                      [--requests-per-conn 20] [--nodes 3]
+                                      [--instances 1000] [--output result.json]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+import daemon.shared as shared
+from daemon.dns import Dns
+
+from .hotpaths import init_cluster, timer
+
+
+class BenchNode(object):
+    dns = ["10.0.0.1"]
+
+
+class BenchDns(Dns):
+    def __init__(self, nodenames):
+        shared.OsvcThread.__init__(self)
+        self.log = logging.getLogger("bench")
+        self._lazy_cluster_name = "bench"
+        self._lazy_cluster_nodes = nodenames
+
+    def reload_config(self):
+        pass
+
+
+def add_ip_info():
+    """
+    Set the ipaddr and expose info of the synthetic ip resources, as the
+    ip drivers do.
+    """
+    for ndata in shared.CLUSTER_DATA.values():
+        for sdata in ndata["services"]["status"].values():
+            for rid, rdata in sdata["resources"].items():
+                if not rid.startswith("ip#"):
+                    continue
+                rdata["info"] = {
+                    "ipaddr": rdata["label"].split("@")[0],
+                    "expose": ["80/tcp"],
+                }
+
+
+def queries(dns):
+    """
+    Return a list of encoded lookup requests, mixing forward, service,
+    reverse and soa queries of existing names.
+    """
+    requests = []
+    names = (
+        ("A", sorted(dns.a_records())),
+        ("SRV", sorted(dns.srv_records())),
+        ("PTR", sorted(dns.ptr_records())),
+        ("SOA", [dns.zone]),
+    )
+    for qtype, qnames in names:
+        for qname in qnames[:1000]:
+            request = {
+                "method": "lookup",
+                "parameters": {"qtype": qtype, "qname": qname},
+            }
+            requests.append((json.dumps(request) + "\n").encode())
+    # interleave the query types
+    requests.sort(key=lambda request: hash(request))
+    return requests
+
+
+def connect(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    return sock
+
+
+def client(path, requests, options, results):
+    latencies = []
+    errors = 0
+    connections = 0
+    sock = None
+    sent = 0
+    idx = 0
+    buff = b""
+    end = timer() + options.duration
+    while timer() < end:
+        if sock is None or sent >= options.requests_per_conn:
+            if sock is not None:
+                sock.close()
+            sock = connect(path)
+            connections += 1
+            sent = 0
+            buff = b""
+        batch = [requests[(idx + i) % len(requests)] for i in range(options.pipeline)]
+        idx += options.pipeline
+        begin = timer()
+        try:
+            sock.sendall(b"".join(batch))
+            received = 0
+            while received < len(batch):
+                data = sock.recv(65536)
+                if not data:
+                    raise socket.error("connection closed")
+                buff += data
+                received += buff.count(b"\n")
+                buff = buff[buff.rfind(b"\n") + 1:]
+        except socket.error:
+            errors += 1
+            sock = None
+            continue
+        elapsed = timer() - begin
+        latencies += [elapsed] * len(batch)
+        sent += len(batch)
+    if sock is not None:
+        sock.close()
+    results.put({
+        "latencies": latencies,
+        "errors": errors,
+        "connections": connections,
+    })
+
+
+def percentile(values, ratio):
+    if not values:
+        return 0
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def run(options):
+    names = init_cluster(options)
+    add_ip_info()
+    shared.NODE = BenchNode()
+    tmpd = tempfile.mkdtemp()
+    path = os.path.join(tmpd, "pdns.sock")
+    dns = BenchDns(names)
+    dns.setup_zone()
+    dns.listen(path)
+    requests = queries(dns)
+    server = threading.Thread(target=dns.serve)
+    server.daemon = True
+    server.start()
+
+    results = multiprocessing.Queue()
+    clients = [multiprocessing.Process(target=client, args=(path, requests, options, results))
+               for _ in range(options.clients)]
+    begin = timer()
+    for proc in clients:
+        proc.start()
+    data = [results.get() for _ in clients]
+    elapsed = timer() - begin
+    for proc in clients:
+        proc.join()
+    dns.stop()
+    server.join()
+    shutil.rmtree(tmpd, ignore_errors=True)
+
+    latencies = sorted(lat for result in data for lat in result["latencies"])
+    return {
+        "queries": len(latencies),
+        "qps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0) * 1000,
+        "connections": sum(result["connections"] for result in data),
+        "errors": sum(result["errors"] for result in data),
+        "accepted": dns.stats.sessions.accepted,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5, help="the load duration, in seconds")
+    parser.add_argument("--pipeline", type=int, default=1, help="the number of requests sent before reading the responses")
+    parser.add_argument("--requests-per-conn", type=int, default=20, help="the number of requests sent on a connection before reconnecting")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--instances", type=int, default=1000)
+    parser.add_argument("--resources", type=int, default=5)
+    parser.add_argument("--namespaces", type=int, default=4)
+    parser.add_argument("--output", help="write the result to this json file")
+    options = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    result = run(options)
+    for key in ("queries", "qps", "p50_ms", "p99_ms", "max_ms", "connections", "errors"):
+        value = result[key]
+        if isinstance(value, float):
+            print("%-12s %12.2f" % (key, value))
+        else:
+            print("%-12s %12d" % (key, value))
+    if options.output:
+        with open(options.output, "w") as ofile:
+            json.dump(result, ofile, indent=4, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Compare the heartbeat json messages and binary message frames: bytes on
+the wire and cpu time per beat, for each heartbeat driver.
+
+Usage, from the opensvc directory:
+
+    python -m tests.benchmark.hb_frame [--instances 1000] [--resources 5] [--beats 20]
+"""
+from __future__ import print_function
+
+import argparse
+import base64
+import json
+import logging
+import time
+import uuid
+
+from core.comm import Crypt
+from daemon.hb.disk import SLOT_HEADER, SLOT_MAGIC
+from daemon.hb.mcast import FRAGMENT_HEADER, FRAGMENT_MAGIC, HbMcast
+from utilities.chunker import chunker
+from utilities.string import bdecode
+
+from .datagen import node_data
+
+try:
+    process_time = time.process_time
+except AttributeError:
+    # python2
+    process_time = time.clock
+
+
+class BenchCrypt(Crypt):
+    cluster_name = "bench"
+    cluster_names = set(["bench"])
+    cluster_key = b"0123456789abcdef0123456789abcdef"
+    cluster_drpnodes = []
+
+    def __init__(self):
+        Crypt.__init__(self)
+        self.log = logging.getLogger("bench")
+
+
+def wire_ucast(message, frame):
+    if frame:
+        return [message]
+    return [(message + "\0").encode()]
+
+
+def wire_mcast(message, frame):
+    mid = uuid.uuid4()
+    chunks = list(chunker(message, HbMcast.max_data))
+    total = len(chunks)
+    if frame:
+        return [FRAGMENT_HEADER.pack(FRAGMENT_MAGIC, mid.bytes, idx, total) + chunk
+                for idx, chunk in enumerate(chunks, 1)]
+    return [(json.dumps({"id": str(mid), "i": idx, "n": total, "c": chunk}) + "\0").encode()
+            for idx, chunk in enumerate(chunks, 1)]
+
+
+def wire_disk(message, frame):
+    if frame:
+        return [SLOT_HEADER.pack(SLOT_MAGIC, time.time(), len(message)) + message]
+    return [(json.dumps({"msg": message, "updated": time.time()}) + "\0").encode()]
+
+
+def wire_relay(message, frame):
+    if frame:
+        message = bdecode(base64.urlsafe_b64encode(message))
+    return [json.dumps({"action": "relay_tx", "options": {"msg": message}}).encode()]
+
+
+WIRES = (
+    ("ucast", wire_ucast),
+    ("mcast", wire_mcast),
+    ("disk", wire_disk),
+    ("relay", wire_relay),
+)
+
+
+def encode(crypt, data, frame):
+    if frame:
+        return crypt.encrypt_frame(data)
+    return crypt.encrypt(data, encode=False)
+
+
+def bench_payload(crypt, data, beats):
+    results = []
+    for frame in (False, True):
+        for name, wire in WIRES:
+            t0 = process_time()
+            for _ in range(beats):
+                message = encode(crypt, data, frame)
+                payloads = wire(message, frame)
+            tx_cpu = (process_time() - t0) / beats
+            t0 = process_time()
+            for _ in range(beats):
+                crypt.decrypt(message)
+            rx_cpu = (process_time() - t0) / beats
+            results.append({
+                "hb": name,
+                "format": "frame" if frame else "json",
+                "bytes": sum(len(payload) for payload in payloads),
+                "datagrams": len(payloads),
+                "tx_ms": tx_cpu * 1000,
+                "rx_ms": rx_cpu * 1000,
+            })
+    return results
+
+
+def patch_payload(data):
+    path = sorted(data["services"]["status"])[0]
+    return {
+        "kind": "patch",
+        "deltas": {
+            "2": [
+                [["services", "status", path, "monitor", "status"], "starting"],
+                [["updated"], time.time()],
+            ],
+        },
+        "gen": {"node1": 2, "node2": 10},
+        "updated": time.time(),
+    }
+
+
+def print_results(title, results):
+    print(title)
+    print("  %-6s %-6s %12s %10s %10s %10s" % ("hb", "format", "bytes", "datagrams", "tx ms", "rx ms"))
+    for result in results:
+        print("  %(hb)-6s %(format)-6s %(bytes)12d %(datagrams)10d %(tx_ms)10.3f %(rx_ms)10.3f" % result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--instances", type=int, default=1000)
+    parser.add_argument("--resources", type=int, default=5)
+    parser.add_argument("--beats", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="dump results as json")
+    options = parser.parse_args(argv)
+
+    crypt = BenchCrypt()
+    data = node_data("node1", ["node1", "node2"], instances=options.instances, resources=options.resources)
+    results = {
+        "full": bench_payload(crypt, data, options.beats),
+        "patch": bench_payload(crypt, patch_payload(data), options.beats * 10),
+    }
+    if options.json:
+        print(json.dumps(results, indent=4))
+        return
+    print_results("full dataset, %d instances" % options.instances, results["full"])
+    print_results("patch", results["patch"])
+
+
+if __name__ == "__main__":
+    main()
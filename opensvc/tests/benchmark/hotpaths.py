@@ -0,0 +1,450 @@
+"""
+Measure the cost of the daemon data-plane hot paths on a synthetic cluster.
+
+Each benchmark reports the cpu time per operation and, on python3, the
+memory allocated per operation. The results can be saved as a json
+baseline, and compared to a previous baseline to detect regressions.
+
+Usage, from the opensvc directory:
+
+    python -m tests.benchmark.hotpaths [--nodes 3] [--instances 1000] [--resources 5]
+                                       [--filter selector] [--output new.json]
+                                       [--compare baseline.json] [--threshold 0.2]
+
+The process exits with status 1 if a benchmark is slower than the
+compared baseline by more than the threshold ratio.
+"""
+from __future__ import print_function
+
+import argparse
+import fnmatch
+import json
+import logging
+import platform
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    # python2
+    tracemalloc = None
+
+import daemon.shared as shared
+from daemon.hb.hb import Hb
+from daemon.listener import Listener, SharedEvent
+from daemon.monitor import Monitor
+from env import Env
+
+from .datagen import cluster_data
+from .hb_frame import BenchCrypt
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    # python2
+    timer = time.time
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Register the decorated function as the setup of the <name> benchmark.
+    The setup function receives the parsed options and returns the
+    function to measure.
+    """
+    def decorator(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return decorator
+
+
+class BenchHb(Hb):
+    def __init__(self, nodenames):
+        shared.OsvcThread.__init__(self)
+        self.name = "bench"
+        self.id = "bench.rx"
+        self.log = logging.getLogger("bench")
+        self._lazy_cluster_nodes = nodenames
+        self.peers = {}
+        self.reset_stats()
+        self.hb_nodes = nodenames
+
+
+def nodenames(options):
+    return [Env.nodename] + ["node%d" % idx for idx in range(2, options.nodes + 1)]
+
+
+def namespaces(options):
+    return ["ns%d" % idx for idx in range(options.namespaces)]
+
+
+def init_cluster(options):
+    """
+    Reset the daemon shared data to the synthetic cluster dataset.
+    """
+    names = nodenames(options)
+    shared.CLUSTER_DATA.clear()
+    shared.CLUSTER_DATA.update(cluster_data(
+        nodenames=names,
+        instances=options.instances,
+        resources=options.resources,
+        namespaces=namespaces(options),
+    ))
+    shared.SERVICES.clear()
+    shared.SMON_DATA.clear()
+    shared.AGG = {}
+    shared.GEN = 1
+    shared.GEN_DIFF.clear()
+    for nodename in names[1:]:
+        shared.REMOTE_GEN[nodename] = 1
+        shared.LOCAL_GEN[nodename] = 1
+    return names
+
+
+def paths(nodename=None):
+    return sorted(shared.CLUSTER_DATA[nodename or Env.nodename]["services"]["status"])
+
+
+def new_monitor(names):
+    thr = Monitor()
+    thr._lazy_cluster_nodes = names
+    thr.log = logging.getLogger("bench")
+    return thr
+
+
+def cycle(items):
+    """
+    Return a function returning the next item of <items>, in a loop.
+    """
+    state = {"idx": -1}
+
+    def next_item():
+        state["idx"] = (state["idx"] + 1) % len(items)
+        return items[state["idx"]]
+    return next_item
+
+
+@benchmark("monitor.update_hb_data")
+def bench_update_hb_data(options):
+    """
+    Build the gen delta of a change of one local instance monitor.
+    """
+    monitor = new_monitor(init_cluster(options))
+    shared.NODE_DATA_TRACKER.reset()
+    with shared.CLUSTER_DATA_LOCK:
+        monitor._update_hb_data_locked()
+    next_path = cycle(paths())
+    instances = shared.CLUSTER_DATA[Env.nodename]["services"]["status"]
+
+    def op():
+        path = next_path()
+        monitor_data = dict(instances[path]["monitor"])
+        monitor_data["status"] = "starting" if monitor_data["status"] == "idle" else "idle"
+        instances[path]["monitor"] = monitor_data
+        shared.NODE_DATA_TRACKER.mark_dirty(path, "monitor")
+        with shared.CLUSTER_DATA_LOCK:
+            monitor._update_hb_data_locked()
+    return op
+
+
+@benchmark("hb.store_rx_data.patch")
+def bench_store_rx_data(options):
+    """
+    Apply a received patch changing one peer instance monitor.
+    """
+    names = init_cluster(options)
+    if len(names) < 2:
+        return
+    peer = names[1]
+    hb = BenchHb(names)
+    next_path = cycle(paths(peer))
+    state = {"gen": shared.REMOTE_GEN[peer], "status": "idle"}
+
+    def op():
+        state["gen"] += 1
+        state["status"] = "starting" if state["status"] == "idle" else "idle"
+        hb._store_rx_data({
+            "kind": "patch",
+            "deltas": {
+                str(state["gen"]): [
+                    [["services", "status", next_path(), "monitor", "status"], state["status"]],
+                    [["updated"], time.time()],
+                ],
+            },
+            "gen": {peer: state["gen"], Env.nodename: 1},
+            "updated": time.time(),
+        }, peer)
+    return op
+
+
+@benchmark("monitor.get_agg_services.incremental")
+def bench_get_agg_services_incremental(options):
+    """
+    Update the aggregated status after a change of one instance.
+    """
+    names = init_cluster(options)
+    monitor = new_monitor(names)
+    monitor.get_agg_services()
+    nodename = names[-1]
+    next_path = cycle(paths(nodename))
+    instances = shared.CLUSTER_DATA[nodename]["services"]["status"]
+
+    def op():
+        instance = instances[next_path()]
+        instance["avail"] = "down" if instance["avail"] == "up" else "up"
+        monitor.get_agg_services()
+    return op
+
+
+@benchmark("monitor.get_agg_services.full")
+def bench_get_agg_services_full(options):
+    """
+    Compute the aggregated status of all objects.
+    """
+    monitor = new_monitor(init_cluster(options))
+
+    def op():
+        monitor.agg_fingerprints = {}
+        shared.AGG = {}
+        monitor.get_agg_services()
+    return op
+
+
+SELECTORS = (
+    ("all", "**"),
+    ("glob", "*/svc/svc000*"),
+    ("or", "ns0/svc/svc00000,ns1/svc/svc00001,**/svc0001*"),
+    ("and", "**+!ns0/**"),
+    ("status", ".avail=up"),
+)
+
+
+def bench_object_selector(selector):
+    def setup(options):
+        names = init_cluster(options)
+        new_monitor(names).get_agg_services()
+        thr = shared.OsvcThread()
+        thr._lazy_cluster_nodes = names
+        allowed = set(namespaces(options))
+
+        def op():
+            thr.object_selector(selector, namespaces=allowed)
+        return op
+    return setup
+
+
+for _name, _selector in SELECTORS:
+    benchmark("object_selector." + _name)(bench_object_selector(_selector))
+
+
+@benchmark("listener.filter_patch_event")
+def bench_filter_patch_event(options):
+    """
+    Filter a 10 changes patch event for a namespace-restricted subscriber.
+    """
+    names = init_cluster(options)
+    new_monitor(names).get_agg_services()
+    listener = Listener()
+    listener._lazy_cluster_nodes = names
+    changes = []
+    for path in paths()[:10]:
+        changes.append([["monitor", "nodes", Env.nodename, "services", "status", path, "monitor", "status"], "starting"])
+    event = SharedEvent.freeze({
+        "kind": "patch",
+        "ts": time.time(),
+        "nodename": Env.nodename,
+        "data": changes,
+    })
+    allowed = set(namespaces(options)[:1])
+
+    def op():
+        listener.filter_patch_event(event, None, allowed)
+    return op
+
+
+def bench_crypt(kind, full):
+    def setup(options):
+        init_cluster(options)
+        crypt = BenchCrypt()
+        if full:
+            data = shared.CLUSTER_DATA[Env.nodename]
+        else:
+            data = {
+                "kind": "patch",
+                "deltas": {"2": [[["services", "status", paths()[0], "monitor", "status"], "starting"]]},
+                "gen": {Env.nodename: 2},
+                "updated": time.time(),
+            }
+        if kind == "encrypt":
+            return lambda: crypt.encrypt(data, encode=False)
+        message = crypt.encrypt(data, encode=False)
+        return lambda: crypt.decrypt(message)
+    return setup
+
+
+for _kind in ("encrypt", "decrypt"):
+    benchmark("crypt.%s.full" % _kind)(bench_crypt(_kind, True))
+    benchmark("crypt.%s.patch" % _kind)(bench_crypt(_kind, False))
+
+
+def measure_time(op, repeat, min_time):
+    """
+    Return the best and median time per operation, in microseconds, of
+    <repeat> runs lasting at least <min_time> seconds each.
+    """
+    number = 1
+    while True:
+        begin = timer()
+        for _ in range(number):
+            op()
+        elapsed = timer() - begin
+        if elapsed >= min_time:
+            break
+        number *= 2
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        begin = timer()
+        for _ in range(number):
+            op()
+        timings.append((timer() - begin) / number)
+    timings.sort()
+    return {
+        "time_us": timings[0] * 1e6,
+        "time_us_median": timings[len(timings) // 2] * 1e6,
+        "number": number,
+    }
+
+
+def measure_memory(op, number):
+    """
+    Return the peak memory allocated during an operation and the memory
+    retained per operation, in bytes.
+    """
+    if tracemalloc is None:
+        return {}
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        peak = 0
+        for _ in range(number):
+            current, _ = tracemalloc.get_traced_memory()
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            op()
+            _, op_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, op_peak - current)
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "mem_peak": peak,
+        "mem_retained": (end - start) // number,
+    }
+
+
+def run(options):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if options.filter and not fnmatch.fnmatch(name, options.filter):
+            continue
+        op = setup(options)
+        if op is None:
+            continue
+        # warm up the caches
+        op()
+        result = measure_time(op, options.repeat, options.min_time)
+        result.update(measure_memory(op, min(result["number"], options.mem_ops)))
+        results[name] = result
+        if not options.quiet:
+            print_result(name, result)
+    return results
+
+
+def meta(options):
+    return {
+        "nodes": options.nodes,
+        "instances": options.instances,
+        "resources": options.resources,
+        "namespaces": options.namespaces,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "created": time.time(),
+    }
+
+
+def print_header():
+    print("%-40s %12s %12s %12s %12s" % ("benchmark", "us/op", "median", "peak B", "retained B"))
+
+
+def print_result(name, result):
+    print("%-40s %12.1f %12.1f %12s %12s" % (
+        name,
+        result["time_us"],
+        result["time_us_median"],
+        result.get("mem_peak", "-"),
+        result.get("mem_retained", "-"),
+    ))
+
+
+def compare(baseline, results, threshold):
+    """
+    Print the time ratios of <results> to the <baseline> results, and
+    return the names of the benchmarks slower than the baseline by more
+    than <threshold>.
+    """
+    regressions = []
+    print("%-40s %12s %12s %8s" % ("benchmark", "baseline", "current", "ratio"))
+    for name in sorted(results):
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["time_us"]
+        after = results[name]["time_us"]
+        ratio = after / before if before else 0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        print("%-40s %12.1f %12.1f %8.2f %s" % (name, before, after, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--instances", type=int, default=1000)
+    parser.add_argument("--resources", type=int, default=5)
+    parser.add_argument("--namespaces", type=int, default=4)
+    parser.add_argument("--filter", help="only run the benchmarks matching this fnmatch pattern")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum duration of a timing run, in seconds")
+    parser.add_argument("--mem-ops", type=int, default=20, help="number of operations traced for the memory measures")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--compare", help="compare the results to this json baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="the time ratio increase reported as a regression")
+    parser.add_argument("--quiet", action="store_true")
+    options = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    if not options.quiet:
+        print_header()
+    results = run(options)
+    data = {"meta": meta(options), "results": results}
+    if options.output:
+        with open(options.output, "w") as ofile:
+            json.dump(data, ofile, indent=4, sort_keys=True)
+    if options.compare:
+        with open(options.compare, "r") as ofile:
+            baseline = json.load(ofile)
+        for key in ("nodes", "instances", "resources", "namespaces"):
+            if baseline["meta"].get(key) != data["meta"][key]:
+                print("warning: baseline %s %s differs from current %s" % (key, baseline["meta"].get(key), data["meta"][key]))
+        print()
+        if compare(baseline, results, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
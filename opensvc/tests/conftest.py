@@ -36,6 +36,7 @@ def osvc_path_tests_fixture(tmpdir):
     env.Env.paths.lsnruxh2sock = os.path.join(test_dir, 'var', 'lsnr', 'h2.sock')
     env.Env.paths.daemon_pid = os.path.join(test_dir, 'var', "osvcd.pid")
     env.Env.paths.daemon_pid_args = os.path.join(test_dir, 'var', "osvcd.pid.args")
+    env.Env.paths.drivers_keywords = os.path.join(test_dir, 'var', "drivers_keywords.json")
     os.makedirs(os.path.join(env.Env.paths.pathvar, 'lsnr'))
     os.makedirs(os.path.join(env.Env.paths.pathvar, 'node'))
     os.makedirs(env.Env.paths.pathtmpv)
@@ -201,6 +202,40 @@ type = flag
         svc_file.write(config_txt)
 
 
+@pytest.fixture(scope='function')
+def has_service_with_status_workers(osvc_path_tests):
+    pathetc = env.Env.paths.pathetc
+    os.mkdir(pathetc)
+    with open(os.path.join(pathetc, 'svc.conf'), mode='w+') as svc_file:
+        config_txt = """
+[DEFAULT]
+id = abcd
+status_workers = 4
+
+[fs#1]
+type = flag
+
+[fs#2]
+type = flag
+
+[app#1]
+type = simple
+subset = g1
+
+[app#2]
+type = simple
+subset = g1
+
+[app#3]
+type = simple
+subset = g1
+
+[subset#app:g1]
+parallel = true
+"""
+        svc_file.write(config_txt)
+
+
 @pytest.fixture(scope='function')
 def has_service_with_vol_and_cfg(osvc_path_tests):
     """
@@ -0,0 +1,128 @@
+import gzip
+import threading
+
+import pytest
+
+import core.collector.rpc as rpc
+
+try:
+    from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+    from SocketServer import ThreadingMixIn
+
+
+class KeepAliveHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = "HTTP/1.1"
+    peers = []
+    encodings = []
+
+    def decode_request_content(self, data):
+        self.encodings.append(self.headers.get("content-encoding", "identity"))
+        return SimpleXMLRPCRequestHandler.decode_request_content(self, data)
+
+    def handle(self):
+        self.peers.append(self.client_address)
+        SimpleXMLRPCRequestHandler.handle(self)
+
+
+class Server(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+@pytest.fixture(scope="function")
+def server(monkeypatch):
+    monkeypatch.setattr(rpc, "POOL", rpc.ConnectionPool())
+    monkeypatch.setattr(rpc, "STATS", rpc.CallStats())
+    KeepAliveHandler.peers = []
+    KeepAliveHandler.encodings = []
+    srv = Server(("127.0.0.1", 0), requestHandler=KeepAliveHandler, logRequests=False, allow_none=True)
+    srv.register_introspection_functions()
+    srv.register_multicall_functions()
+    srv.register_function(lambda *args: len(args), "echo")
+    srv.register_function(lambda *args: 1 // 0, "fail")
+    thr = threading.Thread(target=srv.serve_forever)
+    thr.daemon = True
+    thr.start()
+    yield "http://127.0.0.1:%d/" % srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.ci
+class TestPooledTransport:
+    @staticmethod
+    def test_connections_are_reused_across_proxies(server):
+        for _ in range(3):
+            proxy = rpc.get_proxy(server)
+            assert proxy.echo(1, 2) == 2
+            assert proxy.echo() == 0
+        assert len(KeepAliveHandler.peers) == 1
+        assert rpc.POOL.status() == {"idle": 1, "created": 1, "reused": 5}
+
+    @staticmethod
+    def test_concurrent_threads_use_their_own_connection(server):
+        proxy = rpc.get_proxy(server)
+        barrier = threading.Event()
+        results = []
+
+        def worker():
+            barrier.wait()
+            for _ in range(5):
+                results.append(proxy.echo(1))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thr in threads:
+            thr.start()
+        barrier.set()
+        for thr in threads:
+            thr.join()
+        assert results == [1] * 20
+        assert rpc.POOL.status()["idle"] <= rpc.POOL_MAX_IDLE
+
+    @staticmethod
+    def test_gzip_requests(server):
+        proxy = rpc.get_proxy(server, compress=True)
+        assert proxy.echo("x" * 10) == 1
+        assert proxy.echo("x" * 2 * rpc.GZIP_THRESHOLD) == 1
+        assert KeepAliveHandler.encodings == ["identity", "gzip"]
+
+    @staticmethod
+    def test_stale_connections_are_not_reused(server):
+        pool = rpc.ConnectionPool(idle_timeout=0)
+        rpc.POOL = pool
+        proxy = rpc.get_proxy(server)
+        proxy.echo()
+        proxy.echo()
+        assert pool.status() == {"idle": 1, "created": 2, "reused": 0}
+
+    @staticmethod
+    def test_safe_transport_is_initialized():
+        transport = rpc.PooledSafeTransport(context=rpc.kwargs.get("context"))
+        assert transport.context is rpc.kwargs.get("context")
+        assert transport._connection == (None, None)
+
+
+@pytest.mark.ci
+class TestCallStats:
+    @staticmethod
+    def test_histogram():
+        stats = rpc.CallStats(buckets=(0.1, 1))
+        stats.add("push_status", 0.05)
+        stats.add("push_status", 0.5)
+        stats.add("push_status", 2, error=True)
+        data = stats.dump()["push_status"]
+        assert data["count"] == 3
+        assert data["errors"] == 1
+        assert data["histogram"] == {"0.1": 1, "1": 1, "+Inf": 1}
+
+    @staticmethod
+    def test_do_call_records_the_latency(server):
+        proxy = rpc.get_proxy(server)
+        rpc.do_call("echo", [1], {}, rpc.log, proxy)
+        with pytest.raises(Exception):
+            rpc.do_call("fail", [], {}, rpc.log, proxy)
+        data = rpc.stats()["calls"]
+        assert (data["echo"]["count"], data["echo"]["errors"]) == (1, 0)
+        assert (data["fail"]["count"], data["fail"]["errors"]) == (1, 1)
@@ -1,11 +1,12 @@
 import json
+import logging
 import socket
 import uuid
 import time
 
 import pytest
 
-from core.comm import Crypt, PAUSE, SOCK_TMO_REQUEST
+from core.comm import Crypt, H2ConnectionPool, H2_POOL, PAUSE, SOCK_TMO_REQUEST, frame_length, is_frame
 from core.node import Node
 from env import Env
 
@@ -200,3 +201,147 @@ class TestClusterNodes:
     def test_is_array_with_nodename(mocker):
         mocker.patch.object(Crypt, 'get_node', return_value=Node())
         assert Crypt().cluster_nodes == [Env.nodename]
+
+
+class FrameCrypt(Crypt):
+    cluster_name = "demo"
+    cluster_names = set(["demo"])
+    cluster_key = b"0123456789abcdef0123456789abcdef"
+    cluster_drpnodes = []
+
+
+@pytest.fixture()
+def frame_crypt():
+    crypt = FrameCrypt()
+    crypt.log = logging.getLogger("test")
+    return crypt
+
+
+@pytest.mark.ci
+class TestMessageFrames:
+    @staticmethod
+    @pytest.mark.parametrize("data", [{"kind": "ping"}, {"kind": "full", "data": "x" * 10000}])
+    def test_decrypt_returns_the_encrypted_frame_data(frame_crypt, data):
+        frame = frame_crypt.encrypt_frame(data)
+        assert is_frame(frame)
+        assert frame_crypt.decrypt(frame) == ("demo", Env.nodename, data)
+
+    @staticmethod
+    def test_frame_length_is_read_from_the_header(frame_crypt):
+        frame = frame_crypt.encrypt_frame({"kind": "patch"})
+        assert frame_length(frame[:10]) is None
+        assert frame_length(frame) == len(frame)
+
+    @staticmethod
+    def test_json_messages_are_not_frames(frame_crypt):
+        message = frame_crypt.encrypt({"kind": "ping"})
+        assert not is_frame(message)
+        assert frame_crypt.decrypt(message) == ("demo", Env.nodename, {"kind": "ping"})
+
+    @staticmethod
+    def test_truncated_frame_is_dropped(frame_crypt):
+        frame = frame_crypt.encrypt_frame({"kind": "patch"})
+        assert frame_crypt.decrypt(frame[:-1]) == (None, None, None)
+
+    @staticmethod
+    def test_frame_from_another_cluster_is_dropped(frame_crypt):
+        frame = frame_crypt.encrypt_frame({"kind": "patch"}, cluster_name="other")
+        assert frame_crypt.decrypt(frame) == (None, None, None)
+
+
+class FakeSock(object):
+    def __init__(self, can_read=False):
+        self.can_read = can_read
+
+
+class FakeH2Conn(object):
+    def __init__(self, can_read=False, response_error=None):
+        self._sock = FakeSock(can_read)
+        self.closed = False
+        self.requests = 0
+        self.response_error = response_error
+
+    def close(self):
+        self.closed = True
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+
+    def get_response(self):
+        if self.response_error:
+            raise self.response_error
+        return FakeH2Response()
+
+
+class FakeH2Response(object):
+    @staticmethod
+    def read():
+        return b'{"status": 0}'
+
+
+@pytest.mark.ci
+class TestH2ConnectionPool:
+    @staticmethod
+    def test_get_returns_none_when_empty():
+        assert H2ConnectionPool().get("node2") is None
+
+    @staticmethod
+    def test_put_conn_is_reused_for_the_same_key_only():
+        pool = H2ConnectionPool()
+        conn = FakeH2Conn()
+        pool.put("node2", conn)
+        assert pool.get("node3") is None
+        assert pool.get("node2") is conn
+        assert pool.get("node2") is None
+
+    @staticmethod
+    def test_conn_with_pending_data_is_discarded():
+        pool = H2ConnectionPool()
+        conn = FakeH2Conn(can_read=True)
+        pool.put("node2", conn)
+        assert pool.get("node2") is None
+        assert conn.closed
+
+    @staticmethod
+    def test_expired_conn_is_discarded():
+        pool = H2ConnectionPool(idle_tmo=0)
+        conn = FakeH2Conn()
+        pool.put("node2", conn)
+        assert pool.get("node2") is None
+        assert conn.closed
+
+    @staticmethod
+    def test_idle_conns_are_bounded():
+        pool = H2ConnectionPool(max_idle=1)
+        conn1 = FakeH2Conn()
+        conn2 = FakeH2Conn()
+        pool.put("node2", conn1)
+        pool.put("node2", conn2)
+        assert conn2.closed
+        assert pool.get("node2") is conn1
+
+
+@pytest.mark.ci
+class TestH2DaemonRequestPooling:
+    @staticmethod
+    def test_stale_pooled_conn_failing_on_response_is_retried(monkeypatch):
+        crypt = Crypt()
+        sp = crypt.socket_parms_parser("https://1.2.3.4:1215")
+        new_conns = []
+
+        def h2c(sp=None, **kwargs):
+            new_conns.append(FakeH2Conn())
+            return new_conns[-1]
+
+        monkeypatch.setattr(crypt, "get_secret", lambda *args: None)
+        monkeypatch.setattr(crypt, "h2_headers", lambda **kwargs: {})
+        monkeypatch.setattr(crypt, "h2c", h2c)
+        stale = FakeH2Conn(response_error=socket.error(104, "connection reset by peer"))
+        pool_key = crypt.h2_pool_key(sp)
+        monkeypatch.setattr(H2_POOL, "conns", {})
+        H2_POOL.put(pool_key, stale)
+        assert crypt.h2_daemon_request({"action": "node_status"}, sp=sp) == {"status": 0}
+        assert stale.closed
+        assert len(new_conns) == 1
+        assert new_conns[0].requests == 1
+        assert H2_POOL.get(pool_key) is new_conns[0]
@@ -1,9 +1,10 @@
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 import pytest
 
 from core.node import Node
-from core.scheduler import Scheduler, SchedNotAllowed, SchedSyntaxError
+from core.scheduler import SchedOpts, Scheduler, SchedNotAllowed, SchedSyntaxError
 
 
 def to_datetime(datetime_str):
@@ -127,3 +128,57 @@ class TestSchedules:
         with pytest.raises(SchedSyntaxError):
             schedules = scheduler.sched_get_schedule("dummy", "dummy", schedules=schedule_s)
             scheduler.in_schedule(schedules, fname=None, now=datetime.now())
+
+
+def next_due_scheduler(scheduler, monkeypatch, schedule_s, last_s=None):
+    last = to_datetime(last_s) if last_s else None
+    scheduler.scheduler_actions = {"push": SchedOpts("DEFAULT", fname="last_push", schedule_option="push_schedule")}
+    monkeypatch.setattr(scheduler, "sched_get_schedule_raw", lambda section, option: schedule_s)
+    monkeypatch.setattr(scheduler, "get_last", lambda fname: last)
+    return scheduler
+
+
+@pytest.mark.ci
+class TestNextDue:
+    @staticmethod
+    @pytest.mark.parametrize('schedule_s, date_s, last_s, expected_s', [
+        ("@10", "2015-02-27 10:00", None, "2015-02-27 10:00"),
+        ("@10", "2015-02-27 10:00", "2015-02-27 09:55", "2015-02-27 10:05"),
+        ("09:00-09:20", "2015-02-27 08:00", None, "2015-02-27 09:00"),
+        ("09:00-09:20", "2015-02-27 10:00", None, "2015-02-28 09:00"),
+        ("09:00-09:20@31", "2015-02-27 09:10", "2015-02-27 09:05", "2015-02-28 09:00"),
+        ("23:00-01:00", "2015-02-27 12:00", None, "2015-02-27 23:00"),
+        ("23:00-01:00", "2015-02-27 00:30", None, "2015-02-27 00:30"),
+        ("09:00-09:20 sun", "2015-02-27 10:00", None, "2015-02-28 09:00"),
+        (["!09:00-09:20", "10:00-10:20"], "2015-02-27 08:00", None, "2015-02-27 10:00"),
+        ("@0", "2015-02-27 10:00", None, None),
+        ("", "2015-02-27 10:00", None, None),
+    ])
+    def test_next_due(scheduler, monkeypatch, schedule_s, date_s, last_s, expected_s):
+        next_due_scheduler(scheduler, monkeypatch, schedule_s, last_s)
+        expected = to_datetime(expected_s) if expected_s else None
+        assert scheduler.get_next_due("push", now=to_datetime(date_s)) == expected
+
+    @staticmethod
+    @pytest.mark.parametrize('schedule_s, date_s, last_s', [
+        ("@10", "2015-02-27 10:00", "2015-02-27 09:55"),
+        ("09:00-09:20@31", "2015-02-27 09:10", "2015-02-27 09:05"),
+        ("23:00-01:00@60 sat", "2015-02-27 12:00", "2015-02-26 23:30"),
+        ("10:00-10:20 fri", "2015-02-27 11:00", None),
+    ])
+    def test_actions_are_not_due_before_next_due(scheduler, monkeypatch, schedule_s, date_s, last_s):
+        next_due_scheduler(scheduler, monkeypatch, schedule_s, last_s)
+        monkeypatch.setattr(scheduler, "_is_croned", lambda: True)
+        now = to_datetime(date_s)
+        due = scheduler.get_next_due("push", now=now)
+        assert due is not None
+        while now < due:
+            assert scheduler.skip_action("push", now=now) is True
+            now += timedelta(minutes=1)
+
+    @staticmethod
+    def test_cluster_lasts_delay_the_next_due(scheduler, monkeypatch):
+        next_due_scheduler(scheduler, monkeypatch, "@10")
+        lasts = {"DEFAULT": {"push": {"last": time.mktime(to_datetime("2015-02-27 09:58").timetuple())}}}
+        now = to_datetime("2015-02-27 10:00")
+        assert scheduler.get_next_due("push", now=now, lasts=lasts) == to_datetime("2015-02-27 10:08")
@@ -0,0 +1,272 @@
+import logging
+
+import pytest
+
+import daemon.collector
+import daemon.shared as shared
+from core.collector.rpc import CallRecorder, CollectorRpc
+from daemon.collector import Collector, XmlrpcSpool
+
+
+def instance(csum="a", **kwargs):
+    data = {
+        "csum": csum,
+        "monitor": {"status_updated": 1.0, "global_status_updated": 1.0},
+    }
+    data.update(kwargs)
+    return data
+
+
+def daemon_data(**nodes):
+    return {
+        "cluster_id": "abc",
+        "cluster_name": "test",
+        "nodes": dict((nodename, {
+            "frozen": 0,
+            "services": {
+                "config": dict((path, {"csum": "c"}) for path in instances),
+                "status": instances,
+            },
+        }) for nodename, instances in nodes.items()),
+        "services": dict((path, {"avail": "up"}) for instances in nodes.values() for path in instances),
+    }
+
+
+class FakeCollectorRpc(object):
+    def __init__(self, methods=None, results=None):
+        self.proxy_methods = methods or []
+        self.results = results or []
+        self.calls = []
+        self.multicalls = []
+        self.disabled = False
+
+    def call(self, *args):
+        self.calls.append(args)
+        if self.results:
+            return self.results.pop(0)
+
+    def multicall(self, calls):
+        self.multicalls.append(calls)
+        return [Exception("fault") if args[0] == "bad" else None for args, _ in calls]
+
+    def disable(self):
+        self.disabled = True
+
+
+class FakeNode(object):
+    def __init__(self, collector):
+        self.collector = collector
+        self.collector_env = FakeCollectorEnv()
+
+
+class FakeCollectorEnv(object):
+    uuid = "abc"
+
+
+@pytest.fixture(scope="function")
+def collector():
+    thr = Collector()
+    thr.log = logging.getLogger("test")
+    thr.reset()
+    return thr
+
+
+def set_rpc(monkeypatch, **kwargs):
+    rpc = FakeCollectorRpc(**kwargs)
+    monkeypatch.setattr(shared, "NODE", FakeNode(rpc))
+    return rpc
+
+
+@pytest.mark.ci
+class TestCollectorStatusChanges:
+    @staticmethod
+    def test_changes_propagate_to_the_parents(collector):
+        data = daemon_data(
+            node1={"top": instance(slaves=["mid"]), "mid": instance(scaler_slaves=["leaf"]), "leaf": instance()},
+        )
+        collector.last_status, _ = collector.get_last_status(data)
+        data["nodes"]["node1"]["services"]["status"]["leaf"] = instance("b")
+        _, changed = collector.get_last_status(data)
+        assert changed == set(["leaf", "leaf@node1", "mid", "top"])
+
+    @staticmethod
+    def test_parents_loop(collector):
+        data = daemon_data(node1={"a": instance(slaves=["b"]), "b": instance(slaves=["a"])})
+        collector.last_status, _ = collector.get_last_status(data)
+        data["nodes"]["node1"]["services"]["status"]["a"] = instance("b", slaves=["b"])
+        _, changed = collector.get_last_status(data)
+        assert changed == set(["a", "a@node1", "b"])
+
+
+@pytest.mark.ci
+class TestCollectorDeltaPush:
+    @staticmethod
+    def test_get_delta():
+        data = daemon_data(node1={"svc1": instance(), "svc2": instance()}, node2={"svc1": instance()})
+        delta = Collector.get_delta(data, ["svc1", "svc1@node2", "@node1", "gone@node3", "gone"])
+        assert delta["cluster_id"] == "abc"
+        assert delta["services"] == {"svc1": {"avail": "up"}}
+        assert sorted(delta["nodes"]) == ["node1", "node2"]
+        assert delta["nodes"]["node1"]["services"]["status"] == {}
+        assert delta["nodes"]["node2"]["services"]["status"] == {"svc1": data["nodes"]["node2"]["services"]["status"]["svc1"]}
+        assert delta["nodes"]["node2"]["services"]["config"] == {"svc1": {"csum": "c"}}
+
+    @staticmethod
+    def test_full_push_without_delta_support(collector, monkeypatch):
+        rpc = set_rpc(monkeypatch)
+        data = daemon_data(node1={"svc1": instance()})
+        collector.last_status_changed = set(["svc1"])
+        collector.send_daemon_status(data)
+        assert rpc.calls == [("push_daemon_status", data, ["svc1"])]
+
+    @staticmethod
+    def test_delta_push(collector, monkeypatch):
+        rpc = set_rpc(monkeypatch, methods=["push_daemon_status_delta"])
+        data = daemon_data(node1={"svc1": instance(), "svc2": instance()})
+        collector.send_daemon_status(data)
+        collector.last_status_changed = set(["svc1", "svc1@node1"])
+        collector.send_daemon_status(data)
+        assert rpc.calls[0] == ("push_daemon_status_delta", data, [], 1, None)
+        fn, delta, changes, gen, base_gen = rpc.calls[1]
+        assert sorted(changes) == ["svc1", "svc1@node1"]
+        assert (gen, base_gen) == (2, 1)
+        assert sorted(delta["services"]) == ["svc1"]
+        assert sorted(delta["nodes"]["node1"]["services"]["status"]) == ["svc1"]
+
+    @staticmethod
+    def test_delta_rejected(collector, monkeypatch):
+        rpc = set_rpc(monkeypatch, methods=["push_daemon_status_delta"], results=[None, {"info": "resync"}])
+        data = daemon_data(node1={"svc1": instance()})
+        collector.send_daemon_status(data)
+        collector.last_status_changed = set(["svc1"])
+        collector.send_daemon_status(data)
+        assert [call[3:] for call in rpc.calls] == [(1, None), (2, 1), (3, None)]
+        assert rpc.calls[2][1] is data
+        assert collector.pushed_gen == 3
+
+    @staticmethod
+    def test_push_error_forces_a_resync(collector, monkeypatch):
+        rpc = set_rpc(monkeypatch, methods=["push_daemon_status_delta"])
+        data = daemon_data(node1={"svc1": instance()})
+        collector.send_daemon_status(data)
+
+        def fail(*args):
+            raise Exception("unreachable")
+
+        monkeypatch.setattr(rpc, "call", fail)
+        collector.last_status_changed = set(["svc1"])
+        collector.send_daemon_status(data)
+        assert collector.pushed_gen is None
+
+
+@pytest.mark.ci
+class TestXmlrpcSpool:
+    @staticmethod
+    def test_coalesce_and_bound():
+        spool = XmlrpcSpool(max_queued=3)
+        spool.add(["push_resinfo", [["svc1", "n1", "failover", "fs#1", "k", "v1"]]], {})
+        spool.add(["begin_action", "svc1", "start"], {})
+        spool.add(["push_resinfo", [["svc1", "n1", "failover", "fs#1", "k", "v2"]]], {})
+        assert [call[0][0] for call in spool.calls] == ["begin_action", "push_resinfo"]
+        assert spool.calls[1][0][1][0][5] == "v2"
+        spool.add(["end_action", "svc1", "start"], {})
+        spool.add(["push_resinfo", [["svc2", "n1", "failover", "fs#1", "k", "v1"]]], {})
+        assert [call[0][0] for call in spool.calls] == ["push_resinfo", "end_action", "push_resinfo"]
+        assert spool.status() == {"queued": 3, "sent": 0, "coalesced": 1, "dropped": 1}
+
+    @staticmethod
+    def test_persistence(tmpdir):
+        fpath = str(tmpdir.join("spool.json"))
+        spool = XmlrpcSpool(fpath)
+        spool.add(["begin_action", "svc1", "start"], {})
+        spool.add(["end_action", "svc1", "start"], {"cron": True})
+        spool.save()
+        other = XmlrpcSpool(fpath)
+        other.load()
+        assert other.calls == spool.calls
+
+    @staticmethod
+    def test_failed_calls_are_retried_then_dropped():
+        spool = XmlrpcSpool()
+        spool.add(["begin_action", "svc1"], {})
+        spool.add(["begin_action", "svc2"], {})
+        assert spool.done(list(spool.calls), [None, Exception()]) == 1
+        for _ in range(daemon.collector.MAX_ATTEMPTS - 2):
+            spool.done(list(spool.calls), [Exception()])
+        assert spool.calls[0][2] == daemon.collector.MAX_ATTEMPTS - 1
+        spool.done(list(spool.calls), [Exception()])
+        assert spool.status() == {"queued": 0, "sent": 1, "coalesced": 0, "dropped": 1}
+
+
+@pytest.mark.ci
+class TestCollectorUnqueue:
+    @staticmethod
+    def collector(monkeypatch, **kwargs):
+        rpc = set_rpc(monkeypatch, **kwargs)
+        monkeypatch.setattr(shared, "COLLECTOR_XMLRPC_QUEUE", [])
+        thr = Collector()
+        thr.log = logging.getLogger("test")
+        thr.spool = XmlrpcSpool()
+        return thr, rpc
+
+    def test_multicall_batches(self, monkeypatch):
+        thr, rpc = self.collector(monkeypatch, methods=["system.multicall"])
+        for idx in range(3):
+            shared.COLLECTOR_XMLRPC_QUEUE.insert(0, (["begin_action", "svc%d" % idx], {}))
+        shared.COLLECTOR_XMLRPC_QUEUE.insert(0, (["push_config", "svc0"], {}))
+        shared.COLLECTOR_XMLRPC_QUEUE.insert(0, (["end_action", "svc0"], {}))
+        thr.unqueue_xmlrpc()
+        assert [[args[1] for args, _ in calls] for calls in rpc.multicalls] == [["svc0", "svc1", "svc2"]]
+        assert rpc.calls == [("push_config", "svc0"), ("end_action", "svc0")]
+        assert thr.status()["xmlrpc"]["sent"] == 5
+        assert thr.status()["xmlrpc"]["queued"] == 0
+
+    def test_backoff(self, monkeypatch):
+        thr, rpc = self.collector(monkeypatch)
+
+        def fail(*args):
+            raise Exception("unreachable")
+
+        monkeypatch.setattr(rpc, "call", fail)
+        shared.COLLECTOR_XMLRPC_QUEUE.insert(0, (["begin_action", "svc1"], {}))
+        thr.unqueue_xmlrpc()
+        assert rpc.disabled
+        assert thr.xmlrpc_errors == 1
+        next_try = thr.xmlrpc_next_try
+        assert next_try > 0
+        thr.unqueue_xmlrpc()
+        assert thr.xmlrpc_next_try == next_try
+        assert thr.spool.calls[0][2] == 1
+        monkeypatch.setattr(rpc, "call", lambda *args: None)
+        thr.xmlrpc_next_try = 1
+        thr.unqueue_xmlrpc()
+        assert len(thr.spool) == 0
+        assert (thr.xmlrpc_errors, thr.xmlrpc_next_try) == (0, 0)
+
+    def test_end_action_is_retried_after_a_transport_error(self, monkeypatch, tmpdir):
+        thr, rpc = self.collector(monkeypatch)
+        alogfile = tmpdir.join("action.log")
+        alogfile.write("2020-01-01 00:00:01,252;;fs#1;;INFO;;mounted;;10200;;EOL\n")
+        wrappers = CollectorRpc(node=shared.NODE)
+        wrappers.proxy = CallRecorder()
+        failures = [Exception("unreachable")]
+
+        def call(*args, **kwargs):
+            getattr(wrappers, args[0])(*args[1:], **kwargs)
+            if failures:
+                raise failures.pop()
+
+        monkeypatch.setattr(rpc, "call", call)
+        shared.COLLECTOR_XMLRPC_QUEUE.insert(0, (["end_action", "svc1", "start", "2020-01-01 00:00:00",
+                                                  "2020-01-01 00:00:10", False, str(alogfile)], {}))
+        thr.unqueue_xmlrpc()
+        assert not alogfile.exists()
+        assert len(thr.spool) == 1
+        thr.xmlrpc_next_try = 1
+        thr.unqueue_xmlrpc()
+        assert len(thr.spool) == 0
+        assert thr.status()["xmlrpc"]["sent"] == 1
+        calls = wrappers.proxy.calls
+        assert [call["methodName"] for call in calls] == ["res_action_batch", "end_action"] * 2
+        assert calls[2]["params"][1][0][6] == "mounted"
+        assert calls[3]["params"][1][7] == "ok"
@@ -0,0 +1,104 @@
+import logging
+
+import pytest
+
+import core.exceptions as ex
+import daemon.shared as shared
+from daemon.scheduler import Scheduler
+
+NOW = 1500000000
+
+
+@pytest.fixture(scope="function")
+def scheduler(monkeypatch):
+    monkeypatch.setattr(shared, "SERVICES", {})
+    thr = Scheduler()
+    thr.log = logging.getLogger("test")
+    thr.delayed = {}
+    thr.queue = []
+    thr.next_due = {}
+    thr.running = set()
+    thr.now = NOW
+    thr.max_tasks = lambda: 2
+    return thr
+
+
+@pytest.mark.ci
+class TestSchedulerQueue:
+    @staticmethod
+    def test_only_due_tasks_are_dequeued(scheduler):
+        scheduler.queue_action("pushasset", 120, now=NOW)
+        scheduler.queue_action("checks", 0, now=NOW)
+        todo = scheduler.get_todo()
+        assert [task["action"] for task in todo] == ["checks"]
+        scheduler.delete_queued(todo[0]["sigs"])
+        assert scheduler.get_todo() == []
+        scheduler.now = NOW + 120
+        assert [task["action"] for task in scheduler.get_todo()] == ["pushasset"]
+
+    @staticmethod
+    def test_due_tasks_over_the_slots_stay_queued(scheduler):
+        for idx, action in enumerate(["a1", "a2", "a3"]):
+            scheduler.queue_action(action, 0, now=NOW - 10 + idx)
+            scheduler.delayed[(action, None, None)]["queued"] = NOW - 10 + idx
+        assert [task["action"] for task in scheduler.get_todo()] == ["a1", "a2"]
+        scheduler.delete_queued([("a1", None, None), ("a2", None, None)])
+        assert [task["action"] for task in scheduler.get_todo()] == ["a3"]
+
+    @staticmethod
+    def test_promoted_tasks_are_requeued(scheduler):
+        scheduler.queue_action("checks", 600, now=NOW)
+        assert scheduler.get_todo() == []
+        scheduler.queue_action("checks", 0, now=NOW)
+        assert [task["action"] for task in scheduler.get_todo()] == ["checks"]
+
+    @staticmethod
+    def test_dequeue_delay_follows_the_first_due_task(scheduler, monkeypatch):
+        monkeypatch.setattr(shared, "NMON_DATA", shared.Storage({"status": "idle"}))
+        monkeypatch.setattr("time.time", lambda: NOW)
+        scheduler.next_enqueue = NOW + 90
+        assert scheduler.dequeue_delay() == 90
+        scheduler.queue_action("checks", 5, now=NOW)
+        assert scheduler.dequeue_delay() == 60
+        scheduler.queue_action("pushasset", 0, now=NOW - 120)
+        assert scheduler.dequeue_delay() == 0.5
+
+
+class FakeSched(object):
+    def __init__(self, due):
+        self.due = due
+        self.validations = 0
+
+    def validate_action(self, action, lasts=None, now=None):
+        self.validations += 1
+        if now < self.due:
+            raise ex.AbortAction
+        return 0
+
+    def get_next_due(self, action, now=None, lasts=None):
+        return None
+
+
+@pytest.mark.ci
+class TestSchedulerNextDue:
+    @staticmethod
+    def test_actions_are_not_evaluated_before_their_next_due(scheduler, monkeypatch):
+        sched = FakeSched(NOW + 600)
+        monkeypatch.setattr(scheduler, "get_next_due", lambda sched, action, lasts, now: sched.due)
+        key = ("svc1", "status")
+        for now in range(NOW, NOW + 600, 30):
+            with pytest.raises(ex.AbortAction):
+                scheduler.validate_action(sched, "status", key, "sig1", now=now)
+        assert sched.validations == 1
+        assert scheduler.validate_action(sched, "status", key, "sig1", now=NOW + 600) == 0
+        assert key not in scheduler.next_due
+
+    @staticmethod
+    def test_configuration_changes_reset_the_next_due(scheduler, monkeypatch):
+        sched = FakeSched(NOW)
+        scheduler.next_due[("svc1", "status")] = ("sig1", NOW + 600)
+        assert scheduler.validate_action(sched, "status", ("svc1", "status"), "sig2", now=NOW) == 0
+
+    @staticmethod
+    def test_next_due_is_capped(scheduler):
+        assert scheduler.get_next_due(FakeSched(0), "status", None, NOW) == NOW + 3600
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+import daemon.shared as shared
+import foreign.json_delta as json_delta
+from foreign.six.moves import queue
+
+
+class Unwalkable(dict):
+    def items(self):
+        raise AssertionError("shared subtree walked")
+
+    def __eq__(self, other):
+        raise AssertionError("shared subtree compared")
+
+    __ne__ = __eq__
+
+
+@pytest.mark.ci
+class TestSnapshotDiff:
+    @staticmethod
+    def test_shared_subtrees_are_not_walked():
+        subtree = Unwalkable(a=1)
+        assert shared.snapshot_diff({"x": subtree, "y": 1}, {"x": subtree, "y": 2}) == [[["y"], 2]]
+
+    @staticmethod
+    def test_diff_patches_old_into_new():
+        old = {"a": {"b": 1, "c": [1, 2]}, "d": 1, "e": {"f": 1}}
+        new = {"a": {"b": 2, "c": [1, 2, 3]}, "e": {"f": 1}, "g": {"h": 1}}
+        diff = shared.snapshot_diff(old, new)
+        assert sorted(diff) == sorted([
+            [["a", "b"], 2],
+            [["a", "c"], [1, 2, 3]],
+            [["g"], {"h": 1}],
+            [["d"]],
+        ])
+        assert json_delta.patch(old, diff) == new
+
+
+class FakeDaemon(object):
+    pid = 1
+
+
+class FakeProducer(object):
+    def __init__(self, data, status_shareable=False):
+        self.data = data
+        self.status_shareable = status_shareable
+
+    def status(self):
+        return self.data
+
+
+class FakeStatusThread(shared.OsvcThread):
+    cluster_name = "test"
+    cluster_id = "id"
+    cluster_nodes = ["node1"]
+
+    def __init__(self):
+        pass
+
+
+@pytest.fixture(scope="function")
+def status_thr(monkeypatch):
+    monkeypatch.setattr(shared, "DAEMON", FakeDaemon())
+    monkeypatch.setattr(shared, "EVENT_Q", queue.Queue())
+    monkeypatch.setattr(shared, "DAEMON_STATUS", {})
+    monkeypatch.setattr(shared, "LAST_DAEMON_STATUS", {})
+    monkeypatch.setattr(shared, "THREADS", {
+        "monitor": FakeProducer({"services": {"svc1": {"avail": "up"}}}, status_shareable=True),
+        "listener": FakeProducer({"stats": {"sessions": 1}}),
+    })
+    return FakeStatusThread()
+
+
+@pytest.mark.ci
+class TestDaemonStatusSnapshots:
+    @staticmethod
+    def test_unchanged_shareable_subtrees_are_shared(status_thr):
+        status_thr.update_daemon_status()
+        first = shared.DAEMON_STATUS
+        status_thr.update_daemon_status()
+        assert shared.DAEMON_STATUS is not first
+        assert shared.DAEMON_STATUS["monitor"] is first["monitor"]
+        assert status_thr.daemon_status() is first
+
+    @staticmethod
+    def test_queued_patch_applies_to_the_full_event_data(status_thr):
+        shared.THREADS["monitor"].data = {"services": {"svc1": {"avail": "up"}, "svc2": {"avail": "up"}}}
+        status_thr.update_daemon_status()
+        shared.EVENT_Q.get_nowait()
+        shared.THREADS["monitor"].data = {"services": {"svc1": {"avail": "up"}}}
+        status_thr.update_daemon_status()
+        full = json.loads(json.dumps(status_thr.daemon_status()))
+        event = shared.EVENT_Q.get_nowait()
+        assert json_delta.patch(full, event["data"]) == shared.DAEMON_STATUS
+
+    @staticmethod
+    def test_snapshots_are_not_modified_by_producers(status_thr):
+        status_thr.update_daemon_status()
+        snapshot = shared.DAEMON_STATUS
+        shared.THREADS["listener"].data["stats"]["sessions"] = 2
+        assert snapshot["listener"]["stats"]["sessions"] == 1
+
+    @staticmethod
+    def test_patch_events_hold_the_changes_only(status_thr):
+        status_thr.update_daemon_status()
+        shared.EVENT_Q.get_nowait()
+        status_thr.update_daemon_status()
+        assert shared.EVENT_Q.empty()
+        shared.THREADS["monitor"].data = {"services": {"svc1": {"avail": "down"}}}
+        status_thr.update_daemon_status()
+        event = shared.EVENT_Q.get_nowait()
+        assert event["data"] == [[["monitor", "services", "svc1", "avail"], "down"]]
+
+    @staticmethod
+    def test_filter_daemon_status_does_not_modify_the_snapshot(status_thr, monkeypatch):
+        monkeypatch.setattr(shared, "AGG", {"svc1": {}, "svc2": {}})
+        data = {
+            "monitor": {
+                "nodes": {"node1": {"services": {"status": {"svc1": {}, "svc2": {}}, "config": {}}}},
+                "services": {"svc1": {}, "svc2": {}},
+            },
+        }
+        filtered = status_thr.filter_daemon_status(data, namespaces=["root"], selector="svc1")
+        assert sorted(filtered["monitor"]["services"]) == ["svc1"]
+        assert sorted(filtered["monitor"]["nodes"]["node1"]["services"]["status"]) == ["svc1"]
+        assert sorted(data["monitor"]["services"]) == ["svc1", "svc2"]
+        assert sorted(data["monitor"]["nodes"]["node1"]["services"]["status"]) == ["svc1", "svc2"]
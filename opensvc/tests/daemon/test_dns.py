@@ -0,0 +1,176 @@
+import json
+import logging
+import socket
+import threading
+
+import pytest
+
+import daemon.shared as shared
+from daemon.dns import Dns, ZoneIndex
+
+
+def instance(csum, *addrs, **kwargs):
+    resources = {}
+    for idx, addr in enumerate(addrs):
+        resources["ip#%d" % idx] = {"info": {"ipaddr": addr, "expose": ["80/tcp"]}}
+    data = {"csum": csum, "resources": resources}
+    data.update(kwargs)
+    return data
+
+
+class FakeNode(object):
+    dns = ["10.0.0.1"]
+
+
+@pytest.fixture(scope="function")
+def dns(monkeypatch):
+    monkeypatch.setattr(shared, "NODE", FakeNode())
+    monkeypatch.setattr(shared, "GEN", 1)
+    monkeypatch.setattr(shared, "REMOTE_GEN", {"node2": 1})
+    monkeypatch.setattr(shared, "CLUSTER_DATA", {
+        "node1": {"services": {"status": {
+            "web": instance("a", "10.1.0.1"),
+            "ns1/svc/db": instance("a", "10.1.0.2"),
+        }}},
+        "node2": {"services": {"status": {
+            "web": instance("a", "10.1.0.3"),
+        }}},
+    })
+    monkeypatch.setattr(shared.Env, "nodename", "node1")
+    return make_dns(["node1", "node2"])
+
+
+def make_dns(nodes):
+    thr = Dns()
+    thr.log = logging.getLogger("test")
+    thr._lazy_cluster_name = "test"
+    thr._lazy_cluster_nodes = nodes
+    thr.zone = "test."
+    thr.suffix = ".test."
+    thr.suffix_len = len(thr.suffix)
+    thr.soa_content = "dns.test. contact@opensvc.com 1 7200 3600 432000 86400"
+    thr.index = ZoneIndex()
+    thr.index_lock = threading.RLock()
+    thr.index_gens = {}
+    thr.index_key = None
+    return thr
+
+
+def full_records(dns):
+    thr = make_dns(dns.cluster_nodes)
+    return dict((kind, thr.zone_records(kind)) for kind in ZoneIndex.kinds)
+
+
+def records(dns):
+    return dict((kind, dns.zone_records(kind)) for kind in ZoneIndex.kinds)
+
+
+def count_instance_records(dns, monkeypatch):
+    computed = []
+    instance_records = dns.instance_records
+
+    def counting(nodename, path, svc, weight):
+        computed.append((nodename, path))
+        return instance_records(nodename, path, svc, weight)
+
+    monkeypatch.setattr(dns, "instance_records", counting)
+    return computed
+
+
+@pytest.mark.ci
+class TestDnsZoneIndex:
+    @staticmethod
+    def test_records(dns):
+        data = records(dns)
+        assert data["a"]["web.root.svc.test."] == set(["10.1.0.1", "10.1.0.3"])
+        assert data["a"]["web.root.svc.node2.node.test."] == set(["10.1.0.3"])
+        assert data["a"]["10-1-0-2.db.ns1.svc.test."] == set(["10.1.0.2"])
+        assert data["a"]["ns0.test."] == set(["10.0.0.1"])
+        assert data["ptr"]["1.0.1.10.in-addr.arpa."] == ["web.root.svc.test."]
+        assert "0.1.10.in-addr.arpa." in data["rev"]
+        assert data["srv"]["_80._tcp.web.root.svc.test."] == set([
+            "0 10 80 10-1-0-1.web.root.svc.test.",
+            "0 10 80 10-1-0-3.web.root.svc.test.",
+        ])
+        assert dns.a_record({"qname": "WEB.root.svc.test."})[0]["qtype"] == "A"
+        assert dns.soa_record({"qname": "0.1.10.in-addr.arpa."})[0]["qtype"] == "SOA"
+        assert dns.soa_record({"qname": "0.2.10.in-addr.arpa."}) == []
+
+    @staticmethod
+    def test_unchanged_generations_do_not_touch_the_index(dns, monkeypatch):
+        records(dns)
+        computed = count_instance_records(dns, monkeypatch)
+        records(dns)
+        assert computed == []
+
+    @staticmethod
+    def test_only_the_changed_instances_are_reindexed(dns, monkeypatch):
+        before = records(dns)
+        ptr = before["ptr"]["2.0.1.10.in-addr.arpa."]
+        computed = count_instance_records(dns, monkeypatch)
+        shared.CLUSTER_DATA["node2"]["services"]["status"]["web"] = instance("b", "10.1.0.4")
+        shared.REMOTE_GEN["node2"] = 2
+        data = records(dns)
+        assert computed == [("node2", "web")]
+        assert data["a"]["web.root.svc.test."] == set(["10.1.0.1", "10.1.0.4"])
+        assert "3.0.1.10.in-addr.arpa." not in data["ptr"]
+        assert data["ptr"]["2.0.1.10.in-addr.arpa."] is ptr
+        assert data == full_records(dns)
+
+    @staticmethod
+    def test_removed_instances_and_nodes(dns):
+        records(dns)
+        del shared.CLUSTER_DATA["node1"]["services"]["status"]["ns1/svc/db"]
+        shared.GEN = 2
+        data = records(dns)
+        assert "10-1-0-2.db.ns1.svc.test." not in data["a"]
+        assert "2.0.1.10.in-addr.arpa." not in data["ptr"]
+        del shared.CLUSTER_DATA["node2"]
+        data = records(dns)
+        assert data["a"]["web.root.svc.test."] == set(["10.1.0.1"])
+        assert data == full_records(dns)
+
+    @staticmethod
+    def test_srv_dedup():
+        index = ZoneIndex()
+        index.update(("node1", "web"), 1, {"srv": {"_80._tcp.web.": set(["0 10 80 t."])}})
+        index.update(("node2", "web"), 1, {"srv": {"_80._tcp.web.": set(["0 20 80 t."])}})
+        assert index.records["srv"]["_80._tcp.web."] == set(["0 10 80 t."])
+        index.remove(("node1", "web"))
+        assert index.records["srv"]["_80._tcp.web."] == set(["0 20 80 t."])
+        index.remove(("node2", "web"))
+        assert index.records["srv"] == {}
+        assert index.owners["srv"] == {}
+
+
+@pytest.mark.ci
+class TestDnsBackendSocket:
+    @staticmethod
+    def test_pipelined_requests(dns, tmpdir, monkeypatch):
+        monkeypatch.setattr(dns, "reload_config", lambda: None)
+        path = str(tmpdir.join("pdns.sock"))
+        dns.setup_zone()
+        dns.listen(path)
+        server = threading.Thread(target=dns.serve)
+        server.start()
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            qnames = ["web.root.svc.test.", "db.ns1.svc.test.", "10-1-0-2.db.ns1.svc.test."]
+            requests = [{"method": "lookup", "parameters": {"qtype": "A", "qname": qname}} for qname in qnames]
+            requests.append({"method": "unknown"})
+            sock.sendall("".join(json.dumps(request) + "\n" for request in requests).encode())
+            buff = b""
+            while buff.count(b"\n") < len(requests):
+                data = sock.recv(65536)
+                assert data
+                buff += data
+            sock.close()
+        finally:
+            dns.stop()
+            server.join()
+        responses = [json.loads(line) for line in buff.decode().splitlines()]
+        assert sorted(record["content"] for record in responses[0]["result"]) == ["10.1.0.1", "10.1.0.3"]
+        assert [record["content"] for record in responses[1]["result"]] == ["10.1.0.2"]
+        assert [record["content"] for record in responses[2]["result"]] == ["10.1.0.2"]
+        assert responses[3]["result"] is False
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+import pytest
+
+from daemon.forkserver import ForkServer, ForkServerError
+
+SERVER = """
+import os, sys, time
+from daemon.forkserver import serve
+
+def run(argv):
+    if argv[0] == "sleep":
+        time.sleep(float(argv[1]))
+        return 0
+    if argv[0] == "env":
+        return int(os.environ["TEST_RET"])
+    return int(argv[0])
+
+serve(0, 1, run=run)
+"""
+
+
+@pytest.fixture(scope="function")
+def forkserver():
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    server = ForkServer(cmd=[sys.executable, "-c", SERVER], env=env)
+    server.start()
+    yield server
+    server.stop()
+
+
+def wait(proc, timeout=10):
+    limit = time.time() + timeout
+    while proc.poll() is None and time.time() < limit:
+        time.sleep(0.05)
+    return proc.returncode
+
+
+@pytest.mark.ci
+class TestForkServer:
+    @staticmethod
+    def test_jobs_exit_codes_are_reported(forkserver):
+        procs = [forkserver.submit([str(ret)]) for ret in (0, 1, 3)]
+        assert all(proc.pid for proc in procs)
+        assert len(set(proc.pid for proc in procs)) == 3
+        assert [wait(proc) for proc in procs] == [0, 1, 3]
+        assert forkserver.status()["running"] == 0
+        assert forkserver.status()["submitted"] == 3
+
+    @staticmethod
+    def test_job_env(forkserver):
+        assert wait(forkserver.submit(["env"], env={"TEST_RET": "4"})) == 4
+
+    @staticmethod
+    def test_jobs_can_be_killed(forkserver):
+        proc = forkserver.submit(["sleep", "60"])
+        assert proc.poll() is None
+        proc.kill()
+        assert wait(proc) == -9
+
+    @staticmethod
+    def test_jobs_fail_when_the_forkserver_stops(forkserver):
+        proc = forkserver.submit(["sleep", "1"])
+        forkserver.stop()
+        assert proc.poll() == 1
+        with pytest.raises(ForkServerError):
+            forkserver.submit(["0"])
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+import daemon.fswatch
+from daemon.fswatch import FileWatcher, config_path, status_path
+from env import Env
+
+
+def write(*parts):
+    fpath = os.path.join(*parts)
+    if not os.path.isdir(os.path.dirname(fpath)):
+        os.makedirs(os.path.dirname(fpath))
+    with open(fpath, "w") as ofile:
+        ofile.write("{}")
+    return fpath
+
+
+@pytest.fixture(scope="function")
+def watcher(osvc_path_tests):
+    write(Env.paths.pathetc, "svc1.conf")
+    write(Env.paths.pathetcns, "ns1", "svc", "svc2.conf")
+    write(Env.paths.pathvar, "svc", "svc1", "status.json")
+    write(Env.paths.pathvar, "namespaces", "ns1", "svc", "svc2", "status.json")
+    thr = FileWatcher()
+    if not thr.start():
+        pytest.skip("inotify not available")
+    # consume the initial full rescans
+    assert thr.changed_configs() is None
+    assert thr.changed_status() is None
+    yield thr
+    thr.stop()
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestFswatchPaths:
+    @staticmethod
+    def test_config_path():
+        assert config_path(os.path.join(Env.paths.pathetc, "svc1.conf")) == "svc1"
+        assert config_path(os.path.join(Env.paths.pathetc, "cluster.conf")) == "cluster"
+        assert config_path(os.path.join(Env.paths.pathetc, "vol", "v1.conf")) == "vol/v1"
+        assert config_path(os.path.join(Env.paths.pathetcns, "ns1", "sec", "s1.conf")) == "ns1/sec/s1"
+        assert config_path(os.path.join(Env.paths.pathetcns, "ns1", "namespace.conf")) == "ns1/"
+        assert config_path(os.path.join(Env.paths.pathetc, "node.conf")) is None
+        assert config_path(os.path.join(Env.paths.pathetc, ".svc1.conf.swp")) is None
+        assert config_path(os.path.join(Env.paths.pathetcns, "ns1", "svc2.conf")) is None
+
+    @staticmethod
+    def test_status_path():
+        assert status_path(os.path.join(Env.paths.pathvar, "svc", "svc1", "status.json")) == "svc1"
+        assert status_path(os.path.join(Env.paths.pathvar, "vol", "v1", "status.json")) == "vol/v1"
+        assert status_path(os.path.join(Env.paths.pathvar, "namespaces", "ns1", "svc", "svc2", "status.json")) == "ns1/svc/svc2"
+        assert status_path(os.path.join(Env.paths.pathvar, "svc", "svc1", "status.json.tmp")) is None
+        assert status_path(os.path.join(Env.paths.pathvar, "node", "status.json")) is None
+
+
+@pytest.mark.ci
+class TestFileWatcher:
+    @staticmethod
+    def test_unchanged(watcher):
+        assert watcher.changed_configs() == set()
+        assert watcher.changed_status() == set()
+
+    @staticmethod
+    def test_changed_files(watcher):
+        write(Env.paths.pathetcns, "ns1", "svc", "svc2.conf")
+        tmpf = write(Env.paths.pathvar, "svc", "svc1", "status.json.tmp")
+        os.rename(tmpf, os.path.join(Env.paths.pathvar, "svc", "svc1", "status.json"))
+        assert watcher.changed_configs() == set(["ns1/svc/svc2"])
+        assert watcher.changed_status() == set(["svc1"])
+        os.unlink(os.path.join(Env.paths.pathetc, "svc1.conf"))
+        assert watcher.changed_configs() == set(["svc1"])
+
+    @staticmethod
+    def test_new_directories_request_a_full_rescan(watcher):
+        write(Env.paths.pathetcns, "ns2", "svc", "svc3.conf")
+        assert watcher.changed_configs() is None
+        assert watcher.changed_status() == set()
+        # the new directories are watched after the rescan
+        write(Env.paths.pathetcns, "ns2", "svc", "svc3.conf")
+        assert watcher.changed_configs() == set(["ns2/svc/svc3"])
+
+    @staticmethod
+    def test_overflow(watcher, monkeypatch):
+        monkeypatch.setattr(watcher.inotify, "read", lambda: [(-1, daemon.fswatch.IN_Q_OVERFLOW, "")])
+        assert watcher.changed_configs() is None
+        assert watcher.changed_status() is None
+
+    @staticmethod
+    def test_periodic_full_rescan(watcher, monkeypatch):
+        monkeypatch.setattr(daemon.fswatch, "FULL_RESCAN_INTERVAL", -1)
+        assert watcher.changed_configs() is None
+
+    @staticmethod
+    def test_polling_fallback(osvc_path_tests, monkeypatch):
+        def fail():
+            raise OSError(38, "Function not implemented")
+        monkeypatch.setattr(daemon.fswatch, "Inotify", fail)
+        thr = FileWatcher()
+        assert thr.start() is False
+        assert thr.changed_configs() is None
+        assert thr.changed_configs() is None
+        assert thr.changed_status() is None
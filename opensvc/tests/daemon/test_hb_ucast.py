@@ -0,0 +1,56 @@
+import pytest
+
+from core.comm import FRAME_HEADER, FRAME_MAGIC
+from daemon.hb.ucast import HbUcastRx
+
+
+class FakeConn(object):
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv(self, size):
+        if self.chunks:
+            return self.chunks.pop(0)
+        return b""
+
+
+class FakeRx(HbUcastRx):
+    cluster_name = "test"
+
+    def __init__(self):
+        self.received = []
+
+    def push_stats(self, _bytes=-1):
+        pass
+
+    def decrypt(self, message, sender_id=None):
+        self.received.append(message)
+        return None, None, None
+
+
+def frame(data):
+    header = FRAME_HEADER.pack(FRAME_MAGIC, 1, 0, b"\x00" * 16, 0, 0, len(data))
+    return header + data
+
+
+@pytest.mark.ci
+class TestHbUcastRxRead:
+    @staticmethod
+    def test_frame_header_chunk_ending_with_a_zero_byte():
+        message = frame(b"data")
+        rx = FakeRx()
+        rx._handle_client(FakeConn([message[:10], message[10:]]), ("1.2.3.4", 10000))
+        assert rx.received == [message]
+
+    @staticmethod
+    def test_frame_read_stops_at_the_frame_length():
+        message = frame(b"data\x00")
+        rx = FakeRx()
+        rx._handle_client(FakeConn([message, b"trailing"]), ("1.2.3.4", 10000))
+        assert rx.received == [message]
+
+    @staticmethod
+    def test_json_message_read_stops_at_the_terminator():
+        rx = FakeRx()
+        rx._handle_client(FakeConn([b'{"a":', b' 1}\x00', b"trailing"]), ("1.2.3.4", 10000))
+        assert rx.received == [b'{"a": 1}\x00']
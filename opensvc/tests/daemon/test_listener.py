@@ -0,0 +1,176 @@
+import logging
+import time
+
+import pytest
+
+from daemon.listener import ClientHandler, Listener, SharedEvent
+from daemon.workers import WorkerPool
+
+
+class FakeListenerParent(object):
+    def __init__(self, workers=None):
+        self.workers = workers
+
+
+class FakeSession(ClientHandler):
+    def __init__(self, workers=None):
+        self.log = logging.getLogger("test")
+        self.parent = FakeListenerParent(workers or WorkerPool(max_workers=32))
+
+
+@pytest.mark.ci
+class TestFanout:
+    @staticmethod
+    def test_single_node_is_executed_inline():
+        results = list(FakeSession().fanout(lambda n: ({"status": 0}, 0), ["node1"], 1))
+        assert results == [("node1", ({"status": 0}, 0))]
+
+    @staticmethod
+    def test_nodes_are_executed_concurrently():
+        def fn(nodename):
+            time.sleep(0.3)
+            return {"status": 0, "node": nodename}, 0
+
+        nodenames = ["node%d" % idx for idx in range(10)]
+        begin = time.time()
+        results = dict(FakeSession().fanout(fn, nodenames, 5))
+        assert time.time() - begin < 2
+        assert sorted(results) == sorted(nodenames)
+        assert results["node3"] == ({"status": 0, "node": "node3"}, 0)
+
+    @staticmethod
+    def test_results_are_yielded_as_they_arrive():
+        def fn(nodename):
+            if nodename == "slow":
+                time.sleep(0.5)
+            return {"status": 0}, 0
+
+        results = [nodename for nodename, _ in FakeSession().fanout(fn, ["slow", "fast"], 5)]
+        assert results == ["fast", "slow"]
+
+    @staticmethod
+    def test_late_nodes_get_a_timeout_result():
+        def fn(nodename):
+            if nodename == "node2":
+                time.sleep(2)
+            return {"status": 0}, 0
+
+        begin = time.time()
+        results = dict(FakeSession().fanout(fn, ["node1", "node2"], 0.3))
+        assert time.time() - begin < 1
+        assert results["node1"] == ({"status": 0}, 0)
+        assert results["node2"][0]["status"] == 1
+        assert results["node2"][1] == 1
+
+    @staticmethod
+    def test_failed_nodes_return_none():
+        def fn(nodename):
+            if nodename == "node2":
+                raise Exception("boom")
+            return {"status": 0}, 0
+
+        results = dict(FakeSession().fanout(fn, ["node1", "node2"], 1))
+        assert results == {"node1": ({"status": 0}, 0), "node2": None}
+
+    @staticmethod
+    def test_nodes_refused_by_the_workers_get_an_error_result():
+        workers = WorkerPool()
+        workers.stop()
+        results = dict(FakeSession(workers).fanout(lambda n: ({"status": 0}, 0), ["node1", "node2"], 1))
+        assert results["node1"] == ({"status": 1, "error": "workers backlog full"}, 1)
+        assert results["node2"] == results["node1"]
+
+    @staticmethod
+    def test_waiting_caller_releases_its_worker_slot():
+        workers = WorkerPool(max_workers=1)
+        session = FakeSession(workers)
+        results = []
+
+        def job():
+            results.extend(session.fanout(lambda n: ({"status": 0}, 0), ["node1", "node2"], 2))
+
+        workers.submit(job)
+        deadline = time.time() + 2
+        while len(results) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        assert sorted(results) == [("node1", ({"status": 0}, 0)), ("node2", ({"status": 0}, 0))]
+
+
+class FakeListener(Listener):
+    def __init__(self, clients=None):
+        self.events_clients = list(clients or [])
+
+
+class FakeSubscriber(object):
+    h2conn = None
+    events_stream_ids = []
+    closed = False
+
+    def __init__(self, selector=None, namespaces=None):
+        self.selector = selector
+        self.usr = False if namespaces is None else object()
+        self.usr_grants = {}
+        self.namespaces = namespaces
+
+    def get_namespaces(self):
+        return set(self.namespaces)
+
+
+def patch_event():
+    return {
+        "kind": "patch",
+        "nodename": "node1",
+        "data": [
+            [["monitor", "services", "svc1"], {"avail": "up"}],
+            [["monitor", "services", "ns1/svc/svc2"], {"avail": "down"}],
+        ],
+    }
+
+
+@pytest.mark.ci
+class TestEventsFanout:
+    @staticmethod
+    def test_shared_event_encodings_are_cached():
+        event = SharedEvent.freeze(patch_event())
+        assert event == patch_event()
+        assert event.to_json() is event.to_json()
+        calls = []
+
+        def encode(data):
+            calls.append(data)
+            return b"x"
+
+        assert event.encode("raw", encode) == b"x"
+        assert event.encode("raw", encode) == b"x"
+        assert len(calls) == 1
+
+    @staticmethod
+    def test_filter_patch_event_does_not_modify_the_event():
+        event = SharedEvent.freeze(patch_event())
+        fevent = FakeListener().filter_event(event, selector="**", namespaces=["ns1"])
+        assert fevent["data"] == [[["monitor", "services", "ns1/svc/svc2"], {"avail": "down"}]]
+        assert event == patch_event()
+
+    @staticmethod
+    def test_filter_event_event_honors_namespaces():
+        event = SharedEvent.freeze({"kind": "event", "data": {"path": "ns1/svc/svc2"}})
+        listener = FakeListener()
+        assert listener.filter_event(event, selector=None, namespaces=["ns1"]) is event
+        assert listener.filter_event(event, selector=None, namespaces=["ns2"]) is None
+
+    @staticmethod
+    def test_subscribers_are_grouped_by_filter():
+        clients = [
+            FakeSubscriber(),
+            FakeSubscriber(),
+            FakeSubscriber(namespaces=["ns1"]),
+            FakeSubscriber(namespaces=["ns1"]),
+            FakeSubscriber(selector="svc1", namespaces=["root"]),
+        ]
+        clients[1].closed = True
+        listener = FakeListener(clients)
+        groups = listener.events_clients_groups()
+        assert len(groups) == 3
+        assert groups[(None, None)] == [clients[0]]
+        assert groups[(None, frozenset(["ns1"]))] == clients[2:4]
+        assert clients[1] not in listener.events_clients
@@ -0,0 +1,175 @@
+import logging
+
+import pytest
+
+import daemon.monitor
+import daemon.shared as shared
+from daemon.monitor import Monitor
+
+
+def instance(avail="up", frozen=0, **kwargs):
+    data = {
+        "avail": avail,
+        "overall": avail,
+        "frozen": frozen,
+        "provisioned": True,
+        "topology": "failover",
+        "updated": 1.0,
+        "monitor": {"status": "idle", "placement": "leader" if avail == "up" else ""},
+    }
+    data.update(kwargs)
+    return data
+
+
+def node(**instances):
+    return {
+        "services": {
+            "config": dict((path, {"csum": "a"}) for path in instances),
+            "status": instances,
+        },
+    }
+
+
+@pytest.fixture(scope="function")
+def monitor(monkeypatch):
+    monkeypatch.setattr(shared, "CLUSTER_DATA", {
+        "node1": node(svc1=instance(), svc2=instance(), parent=instance(slaves=["child"]), child=instance()),
+        "node2": node(svc1=instance("down"), svc2=instance("down"), parent=instance("down", slaves=["child"]),
+                      child=instance("down")),
+    })
+    monkeypatch.setattr(shared, "SERVICES", {})
+    monkeypatch.setattr(shared, "AGG", {})
+    thr = Monitor()
+    thr._lazy_cluster_nodes = ["node1", "node2"]
+    thr.log = logging.getLogger("test")
+    return thr
+
+
+def full_agg(monitor):
+    data = {}
+    monitor.compute_agg(monitor.get_all_paths(), data)
+    return data
+
+
+@pytest.mark.ci
+class TestMonitorAggServices:
+    @staticmethod
+    def test_first_call_computes_all_paths(monitor):
+        data = monitor.get_agg_services()
+        assert sorted(data) == ["child", "parent", "svc1", "svc2"]
+        assert data["svc1"].avail == "up"
+        assert data == full_agg(monitor)
+
+    @staticmethod
+    def test_only_changed_paths_are_recomputed(monitor, monkeypatch):
+        before = monitor.get_agg_services()
+        computed = []
+        get_agg = monitor.get_agg
+
+        def counting_get_agg(path, agg=None):
+            computed.append(path)
+            return get_agg(path, agg=agg)
+
+        monkeypatch.setattr(monitor, "get_agg", counting_get_agg)
+        shared.CLUSTER_DATA["node1"]["services"]["status"]["svc1"]["frozen"] = 1.0
+        data = monitor.get_agg_services()
+        assert computed == ["svc1"]
+        assert data["svc1"].frozen == "mixed"
+        assert data["svc2"] is before["svc2"]
+        assert data == full_agg(monitor)
+
+    @staticmethod
+    def test_parents_follow_their_children(monitor):
+        assert monitor.get_agg_services()["parent"].avail == "up"
+        shared.CLUSTER_DATA["node1"]["services"]["status"]["child"] = instance("warn")
+        data = monitor.get_agg_services()
+        assert data["child"].avail == "warn"
+        assert data["parent"].avail == "warn"
+        assert data == full_agg(monitor)
+
+    @staticmethod
+    def test_removed_paths_are_dropped(monitor):
+        monitor.get_agg_services()
+        for nodename in ("node1", "node2"):
+            del shared.CLUSTER_DATA[nodename]["services"]["config"]["svc2"]
+            del shared.CLUSTER_DATA[nodename]["services"]["status"]["svc2"]
+        assert "svc2" not in monitor.get_agg_services()
+        assert "svc2" not in monitor.agg_fingerprints
+
+    @staticmethod
+    def test_check_mode_fixes_the_incremental_result(monitor, monkeypatch):
+        monitor.get_agg_services()
+        shared.AGG["svc1"].avail = "bogus"
+        assert monitor.get_agg_services()["svc1"].avail == "bogus"
+        monkeypatch.setattr(daemon.monitor, "AGG_CHECK", "1")
+        assert monitor.get_agg_services()["svc1"].avail == "up"
+
+    @staticmethod
+    def test_agg_scaler():
+        assert Monitor.agg_scaler("12.web") == "web"
+        assert Monitor.agg_scaler("ns1/svc/3.web") == "ns1/svc/web"
+        assert Monitor.agg_scaler("web") is None
+
+
+@pytest.mark.ci
+class TestMonitorTransitions:
+    @staticmethod
+    def test_set_smon_maintains_the_transition_count(monitor, monkeypatch):
+        monkeypatch.setattr(shared, "SMON_DATA", {})
+        monkeypatch.setattr(shared, "SMON_TRANSITIONS", set())
+        monitor.set_smon("svc1", status="starting")
+        monitor.set_smon("svc2", status="stopping")
+        assert monitor.transition_count() == 2
+        monitor.set_smon("svc1", status="idle")
+        monitor.set_smon("svc2", status="scaling")
+        assert monitor.transition_count() == 0
+        monitor.set_smon("svc1", status="provisioning")
+        assert monitor.transition_count() == 1
+        monitor.del_smon("svc1")
+        assert monitor.transition_count() == 0
+        assert "svc1" not in shared.SMON_DATA
+
+    @staticmethod
+    def test_transitions_maxed(monitor, monkeypatch):
+        class FakeNode(object):
+            max_parallel = 1
+        monkeypatch.setattr(shared, "NODE", FakeNode())
+        monkeypatch.setattr(shared, "SMON_TRANSITIONS", set(["svc1"]))
+        assert monitor.transitions_maxed() is False
+        shared.SMON_TRANSITIONS.add("svc2")
+        assert monitor.transitions_maxed() is True
+
+
+@pytest.mark.ci
+class TestMonitorConfigPaths:
+    @staticmethod
+    def test_only_changed_paths_are_checked(monitor, monkeypatch):
+        monkeypatch.setattr(daemon.monitor, "list_services", lambda: ["svc1", "svc2"])
+        monkeypatch.setattr(monitor.fswatch, "changed_configs", lambda: None)
+        assert monitor.get_config_paths() == (set(["svc1", "svc2"]), None)
+
+        monkeypatch.setattr(daemon.monitor, "list_services", lambda: pytest.fail("unexpected rescan"))
+        monkeypatch.setattr(monitor.fswatch, "changed_configs", lambda: set(["svc2", "svc3"]))
+        monkeypatch.setattr(daemon.monitor.os.path, "exists", lambda fpath: not fpath.endswith("svc2.conf"))
+        assert monitor.get_config_paths() == (set(["svc1", "svc3"]), set(["svc2", "svc3"]))
+
+
+@pytest.mark.ci
+class TestMonitorStatusNodes:
+    @staticmethod
+    def test_peer_copies_are_reused_until_changed(monitor):
+        peer = shared.CLUSTER_DATA["node2"]
+        peer["gen"] = {"node2": 1}
+        peer["monitor"] = {"status": "idle"}
+        first = monitor.status_nodes()["node2"]
+        assert first is not peer
+        assert monitor.status_nodes()["node2"] is first
+
+        # a hb ping replaces the peer monitor data, with an unchanged gen
+        peer["monitor"] = {"status": "draining"}
+        data = monitor.status_nodes()["node2"]
+        assert data is not first
+        assert data["monitor"] == {"status": "draining"}
+
+        peer["gen"] = {"node2": 2}
+        assert monitor.status_nodes()["node2"] is not data
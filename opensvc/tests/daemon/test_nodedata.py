@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+import foreign.json_delta as json_delta
+from daemon.nodedata import NodeDataTracker
+
+
+def copy(data):
+    return json.loads(json.dumps(data))
+
+
+def instance(avail="up", status="idle"):
+    return {
+        "avail": avail,
+        "frozen": 0,
+        "updated": 1.0,
+        "monitor": {"status": status, "placement": "leader"},
+        "resources": {
+            "fs#1": {"status": avail, "label": "/srv"},
+            "ip#1": {"status": avail, "label": "10.0.0.1"},
+        },
+    }
+
+
+@pytest.fixture(scope="function")
+def data():
+    return {
+        "compat": 10,
+        "monitor": {"status": "idle"},
+        "frozen": 0,
+        "gen": {"node1": 1},
+        "updated": 1.0,
+        "services": {
+            "config": {
+                "svc1": {"csum": "a", "updated": 1.0, "scope": ["node1"]},
+                "svc2": {"csum": "b", "updated": 1.0, "scope": ["node1"]},
+            },
+            "status": {
+                "svc1": instance(),
+                "svc2": instance(),
+            },
+        },
+    }
+
+
+def strip(data):
+    data = copy(data)
+    data.pop("gen", None)
+    data.pop("updated", None)
+    return data
+
+
+def assert_patched_equal(before, after, diff):
+    patched = json_delta.patch(strip(before), diff)
+    assert patched == strip(after)
+
+
+@pytest.mark.ci
+class TestNodeDataTracker:
+    @staticmethod
+    def test_first_diff_returns_none(data):
+        tracker = NodeDataTracker()
+        assert tracker.diff(data) is None
+        assert tracker.diff(data) == []
+
+    @staticmethod
+    def test_top_level_changes_are_detected(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        before = copy(data)
+        data["monitor"]["status"] = "rejoin"
+        data["frozen"] = 12.0
+        data["labels"] = {"az": "1"}
+        del data["compat"]
+        data["gen"] = {"node1": 2}
+        diff = tracker.diff(data)
+        assert_patched_equal(before, data, diff)
+        assert tracker.diff(data) == []
+
+    @staticmethod
+    def test_config_changes_are_detected(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        before = copy(data)
+        data["services"]["config"]["svc1"] = {"csum": "c", "updated": 2.0, "scope": ["node1"]}
+        del data["services"]["config"]["svc2"]
+        diff = tracker.diff(data)
+        assert_patched_equal(before, data, diff)
+
+    @staticmethod
+    def test_unmarked_in_place_instance_changes_are_ignored(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        data["services"]["status"]["svc1"]["avail"] = "down"
+        assert tracker.diff(data) == []
+
+    @staticmethod
+    def test_marked_instance_subkey_changes_are_detected(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        before = copy(data)
+        data["services"]["status"]["svc1"]["monitor"] = {"status": "starting", "placement": "leader"}
+        data["services"]["status"]["svc2"]["frozen"] = 3.0
+        tracker.mark_dirty("svc1", "monitor")
+        tracker.mark_dirty("svc2", "frozen")
+        diff = tracker.diff(data)
+        assert sorted(diff) == sorted([
+            [["services", "status", "svc1", "monitor", "status"], "starting"],
+            [["services", "status", "svc2", "frozen"], 3.0],
+        ])
+        assert_patched_equal(before, data, diff)
+
+    @staticmethod
+    def test_replaced_instance_is_fully_compared(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        before = copy(data)
+        data["services"]["status"]["svc1"] = instance(avail="down")
+        diff = tracker.diff(data)
+        assert_patched_equal(before, data, diff)
+
+    @staticmethod
+    def test_added_and_removed_instances_are_detected(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        before = copy(data)
+        del data["services"]["status"]["svc2"]
+        data["services"]["status"]["svc3"] = instance()
+        diff = tracker.diff(data)
+        assert_patched_equal(before, data, diff)
+
+    @staticmethod
+    def test_successive_diffs_apply_in_sequence(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        peer = strip(data)
+        for idx in range(5):
+            data["services"]["status"]["svc1"]["monitor"]["status"] = "step%d" % idx
+            tracker.mark_dirty("svc1", "monitor")
+            data["services"]["status"]["svc%d" % (idx + 10)] = instance()
+            peer = json_delta.patch(peer, tracker.diff(data))
+            assert peer == strip(data)
+
+    @staticmethod
+    def test_reset_forces_a_new_snapshot(data):
+        tracker = NodeDataTracker()
+        tracker.diff(data)
+        tracker.reset()
+        assert tracker.diff(data) is None
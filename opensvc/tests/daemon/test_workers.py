@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from daemon.workers import WorkerPool
+from foreign.six.moves import queue
+
+
+def wait_for(condition, timeout=5):
+    limit = time.time() + timeout
+    while time.time() < limit:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.ci
+class TestWorkerPool:
+    @staticmethod
+    def test_submitted_jobs_are_executed():
+        pool = WorkerPool(max_workers=2)
+        results = []
+        for idx in range(10):
+            pool.submit(results.append, idx)
+        assert wait_for(lambda: len(results) == 10)
+        assert sorted(results) == list(range(10))
+        pool.stop()
+
+    @staticmethod
+    def test_workers_are_bounded():
+        pool = WorkerPool(max_workers=3)
+        release = threading.Event()
+        started = []
+
+        def job(idx):
+            started.append(idx)
+            release.wait(5)
+
+        for idx in range(6):
+            pool.submit(job, idx)
+        assert wait_for(lambda: len(started) == 3)
+        assert pool.status()["workers"] == 3
+        assert pool.status()["queued"] == 3
+        release.set()
+        assert wait_for(lambda: len(started) == 6)
+        pool.stop()
+
+    @staticmethod
+    def test_full_backlog_rejects_jobs():
+        pool = WorkerPool(max_workers=1, max_queued=1)
+        release = threading.Event()
+        pool.submit(release.wait, 5)
+        assert wait_for(lambda: pool.status()["queued"] == 0)
+        pool.submit(release.wait, 5)
+        with pytest.raises(queue.Full):
+            pool.submit(release.wait, 5)
+        assert pool.status()["rejected"] == 1
+        release.set()
+        pool.stop()
+
+    @staticmethod
+    def test_job_errors_do_not_kill_the_worker():
+        pool = WorkerPool(max_workers=1)
+        results = []
+        pool.submit(lambda: 1 / 0)
+        pool.submit(results.append, 1)
+        assert wait_for(lambda: results == [1])
+        pool.stop()
+
+    @staticmethod
+    def test_idle_workers_exit():
+        pool = WorkerPool(max_workers=2, idle_tmo=0.1)
+        results = []
+        pool.submit(results.append, 1)
+        assert wait_for(lambda: pool.status()["workers"] == 0)
+        pool.submit(results.append, 2)
+        assert wait_for(lambda: results == [1, 2])
+        pool.stop()
+
+    @staticmethod
+    def test_detached_jobs_release_their_slot():
+        pool = WorkerPool(max_workers=1)
+        release = threading.Event()
+        results = []
+
+        def blocking_job():
+            pool.detach()
+            release.wait(5)
+            results.append("blocking")
+
+        pool.submit(blocking_job)
+        pool.submit(results.append, 1)
+        assert wait_for(lambda: results == [1])
+        assert pool.status()["detached"] == 1
+        assert pool.status()["workers"] <= 1
+        release.set()
+        assert wait_for(lambda: pool.status()["detached"] == 0)
+        assert results == [1, "blocking"]
+        pool.stop()
+
+    @staticmethod
+    def test_stopped_pool_refuses_jobs():
+        pool = WorkerPool()
+        pool.stop()
+        with pytest.raises(RuntimeError):
+            pool.submit(time.sleep, 0)
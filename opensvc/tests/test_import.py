@@ -1,7 +1,82 @@
 import os
 import glob
+import json
+import subprocess
+import sys
+
 import pytest
 
+# modules only needed by some actions, which must not be imported by the
+# commands entrypoints
+LAZY_MODULES = (
+    "core.collector.rpc",
+    "core.compliance",
+    "foreign.h2.connection",
+    "foreign.hyper",
+    "foreign.pyaes",
+    "urllib.request",
+    "utilities.asset",
+    "utilities.net.ipaddress",
+)
+
+# the commands entrypoints import time budget, in seconds, on an idle
+# host importing the REFERENCE_MODULES in REFERENCE_TIME seconds
+IMPORT_BUDGET = {
+    "commands.daemon": 0.5,
+    "commands.node": 0.5,
+    "commands.svc": 0.5,
+    "commands.svcmon": 0.5,
+    "commands.vol": 0.5,
+}
+
+# the standard modules timed to scale the budgets to the host speed, and
+# their import time on the host the budgets were set on
+REFERENCE_MODULES = "json, logging, optparse, socket, ssl, subprocess, threading"
+REFERENCE_TIME = 0.02
+
+IMPORT_SCRIPT = """
+import sys
+import time
+begin = time.time()
+import %s
+elapsed = time.time() - begin
+modules = [name for name, mod in sys.modules.items() if mod is not None]
+import json
+print(json.dumps({"time": elapsed, "modules": modules}))
+"""
+
+
+def import_data(modname):
+    """
+    Import <modname> in a new interpreter, and return a dict with the
+    import time in seconds and the list of the loaded modules.
+    """
+    mod_d = os.path.realpath(os.path.join(os.path.dirname(__file__), ".."))
+    proc = subprocess.Popen(
+        [sys.executable, "-c", IMPORT_SCRIPT % modname],
+        cwd=mod_d, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    out, err = proc.communicate()
+    assert proc.returncode == 0, err
+    return json.loads(out.decode().splitlines()[-1])
+
+
+def import_time(modname, tries=3):
+    """
+    Return the best import time of <modname> over <tries> interpreters,
+    to smooth the host load noise.
+    """
+    return min(import_data(modname)["time"] for _ in range(tries))
+
+
+def import_time_limit(modname):
+    """
+    Return the <modname> import time budget scaled to the host speed. The
+    budget is never lowered on hosts faster than the reference host.
+    """
+    scale = max(1, import_time(REFERENCE_MODULES) / REFERENCE_TIME)
+    return IMPORT_BUDGET[modname] * scale
+
 
 @pytest.mark.ci
 class TestImport:
@@ -24,3 +99,18 @@ class TestImport:
             except (ex.InitError, ex.Error):
                 # dependent module missing
                 pass
+
+
+@pytest.mark.ci
+class TestImportTime:
+    @staticmethod
+    @pytest.mark.parametrize("modname", sorted(IMPORT_BUDGET))
+    def test_commands_import_lazy_modules_on_first_use(modname):
+        modules = import_data(modname)["modules"]
+        assert modname in modules
+        assert [mod for mod in LAZY_MODULES if mod in modules] == []
+
+    @staticmethod
+    @pytest.mark.parametrize("modname", sorted(IMPORT_BUDGET))
+    def test_commands_import_time_budget(modname):
+        assert import_time(modname) < import_time_limit(modname)
@@ -1,5 +1,11 @@
+import threading
+import time
+
 import pytest
 
+import core.exceptions as ex
+import core.status
+from core.node import Node
 from core.objects.svc import Svc
 
 
@@ -8,6 +14,11 @@ def factory_svc():
     return Svc(name='svc')
 
 
+@pytest.fixture(scope='function', name='node_svc')
+def factory_node_svc():
+    return Svc(name='svc', node=Node())
+
+
 @pytest.mark.ci
 @pytest.mark.usefixtures('has_service_lvm')
 class TestSvcWithDiskLvm:
@@ -55,3 +66,110 @@ class TestSvcFsFlag:
         mock_sysname('Linux')
         flag_resource = svc.get_resource('fs#flag1')
         assert flag_resource.type == 'fs.flag'
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('has_service_with_status_workers')
+class TestSvcStatusWorkers:
+    @staticmethod
+    def record_status(svc, monkeypatch, delay=0.1):
+        calls = []
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def recorder(resource):
+            def _status(verbose=False):
+                with lock:
+                    running[0] += 1
+                    running[1] = max(running)
+                time.sleep(delay)
+                with lock:
+                    running[0] -= 1
+                    calls.append((resource.rid, threading.current_thread().name))
+                return core.status.UP
+            return _status
+
+        for resource in svc.get_resources():
+            monkeypatch.setattr(resource, "_status", recorder(resource))
+        return calls, running
+
+    def test_parallel_subset_and_sequential_resourcesets(self, node_svc, monkeypatch):
+        svc = node_svc
+        calls, running = self.record_status(svc, monkeypatch)
+        svc.get_resource("fs#2").serialize_status = True
+        data = svc.print_status_data_eval(refresh=True, write_data=False)
+        threads = dict(calls)
+        assert sorted(threads) == ["app#1", "app#2", "app#3", "fs#1", "fs#2"]
+        assert len(set(threads[rid] for rid in ("app#1", "app#2", "app#3"))) == 3
+        assert calls[-1] == ("fs#2", threading.current_thread().name)
+        assert running[1] > 1
+        assert data["avail"] == "up"
+        assert sorted(data["resources"]) == ["app#1", "app#2", "app#3", "fs#1", "fs#2"]
+
+    def test_same_status_as_sequential(self, node_svc, monkeypatch):
+        svc = node_svc
+        calls, _ = self.record_status(svc, monkeypatch, delay=0)
+        data = svc.print_status_data_eval(refresh=True, write_data=False)
+        assert len(calls) == 5
+        svc.set_lazy("status_workers", 1)
+        del calls[:]
+        sequential = svc.print_status_data_eval(refresh=True, write_data=False)
+        assert set(thread for _, thread in calls) == set([threading.current_thread().name])
+        for _data in (data, sequential):
+            del _data["updated"]
+        assert data == sequential
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures('has_service_with_status_workers')
+class TestSvcConfigSnapshot:
+    @staticmethod
+    def count_evaluations(svc, monkeypatch):
+        calls = []
+        conf_get_deprecated = svc.conf_get_deprecated
+
+        def counting(s, o, **kwargs):
+            calls.append((s, o))
+            return conf_get_deprecated(s, o, **kwargs)
+
+        monkeypatch.setattr(svc, "conf_get_deprecated", counting)
+        return calls
+
+    def test_evaluated_once(self, node_svc, monkeypatch):
+        svc = node_svc
+        calls = self.count_evaluations(svc, monkeypatch)
+        assert svc.oget("DEFAULT", "status_workers") == 4
+        assert svc.oget("DEFAULT", "status_workers") == 4
+        assert svc.oget("app#1", "subset") == "g1"
+        assert svc.oget("app#1", "subset", impersonate="node2") == "g1"
+        assert calls == [("DEFAULT", "status_workers"), ("app#1", "subset"), ("app#1", "subset")]
+
+    def test_unset_keywords(self, node_svc, monkeypatch):
+        svc = node_svc
+        calls = self.count_evaluations(svc, monkeypatch)
+        assert svc.oget("DEFAULT", "lock_timeout") == 60
+        assert svc.oget("DEFAULT", "lock_timeout") == 60
+        with pytest.raises(ex.OptNotFound) as exc:
+            svc.conf_get("DEFAULT", "lock_timeout")
+        assert exc.value.default == 60
+        assert calls == [("DEFAULT", "lock_timeout")]
+
+    @staticmethod
+    def test_mutable_values_are_copied(node_svc):
+        svc = node_svc
+        svc.oget("DEFAULT", "parents").append("foo")
+        assert svc.oget("DEFAULT", "parents") == []
+
+    @staticmethod
+    def test_dropped_on_commit_and_reparse(node_svc):
+        svc = node_svc
+        assert svc.oget("DEFAULT", "status_workers") == 4
+        svc.set_multi(["DEFAULT.status_workers=2"])
+        assert svc.oget("DEFAULT", "status_workers") == 2
+        with open(svc.paths.cf) as ofile:
+            buff = ofile.read()
+        with open(svc.paths.cf, "w") as ofile:
+            ofile.write(buff.replace("status_workers = 2", "status_workers = 3"))
+        assert svc.oget("DEFAULT", "status_workers") == 2
+        svc.unset_conf_lazy()
+        assert svc.oget("DEFAULT", "status_workers") == 3
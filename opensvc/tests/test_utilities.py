@@ -1,10 +1,11 @@
 # coding: utf-8
 import datetime
 import logging
+import sys
 
 import pytest
 
-from core.extconfig import read_cf, eval_expr
+from core.extconfig import read_cf, read_cf_comments, parse_cf_file, eval_expr
 from utilities.chunker import chunker
 from utilities.files import *
 from utilities.naming import *
@@ -404,6 +405,59 @@ class TestUtilities:
         config = read_cf(tmp_file)
         assert config.sections() == []
 
+    @staticmethod
+    @pytest.mark.skipif(sys.version_info[0] < 3, reason="python3 parser rules")
+    def test_parse_cf_file(tmp_path):
+        """
+        parse_cf_file() same result as read_cf() and read_cf_comments()
+        """
+        tmp_file = os.path.join(str(tmp_path), 'foo')
+        with open(tmp_file, "w") as ofile:
+            ofile.write(u"""# header
+[DEFAULT]
+Nodes = n1 n2
+env : prd
+[fs#1]
+; fs comment
+mnt = /srv
+mnt_opt =
+text = line1
+
+\tline2
+  # indented comment
+#[fs#2]
+#mnt = /old
+[fs#1]
+mnt = /srv2
+[app#1]
+start = é
+""")
+        defaults, sections, comments = parse_cf_file(tmp_file)
+        config = read_cf(tmp_file)
+        assert defaults == config.defaults()
+        config._defaults = {}
+        assert list(sections) == config.sections()
+        for section, options in sections.items():
+            assert list(options.items()) == config.items(section)
+        assert comments == read_cf_comments(tmp_file)
+        assert sections["fs#1"]["text"] == "line1\n\nline2"
+
+    @staticmethod
+    def test_parse_cf_file_cache(tmp_path):
+        """
+        parse_cf_file() cache
+        """
+        tmp_file = os.path.join(str(tmp_path), 'foo')
+        with open(tmp_file, "w") as ofile:
+            ofile.write("[aa]\nbb = cc\n")
+        data = parse_cf_file(tmp_file)
+        assert parse_cf_file(tmp_file) is data
+        with open(tmp_file, "w") as ofile:
+            ofile.write("[aa]\nbb = ccc\n")
+        assert parse_cf_file(tmp_file)[1]["aa"]["bb"] == "ccc"
+        os.unlink(tmp_file)
+        assert parse_cf_file(tmp_file) is None
+
     @staticmethod
     def test_drop_option():
         """
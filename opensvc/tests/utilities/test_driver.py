@@ -2,7 +2,9 @@ import os
 
 import pytest
 
-from utilities.drivers import driver_import, driver_class
+from env import Env
+from utilities.drivers import driver_import, driver_class, drivers_signature, \
+    load_drivers_keywords, read_drivers_keywords, write_drivers_keywords
 
 
 @pytest.fixture(scope='function')
@@ -49,3 +51,43 @@ class TestDriver:
     ):
         with pytest.raises(ImportError):
             driver_import('resource', 'nogrp', 'flag')
+
+
+def svc_kwstore():
+    from core.keywords import KeywordStore
+    from core.objects import svcdict
+    return KeywordStore(
+        name="svc",
+        provision=True,
+        keywords=svcdict.KEYWORDS,
+        deprecated_keywords=dict(svcdict.DEPRECATED_KEYWORDS),
+        reverse_deprecated_keywords=dict(svcdict.REVERSE_DEPRECATED_KEYWORDS),
+        deprecated_sections=dict(svcdict.DEPRECATED_SECTIONS),
+        base_sections=["env", "DEFAULT"],
+        template_prefix="template.service.",
+    )
+
+
+@pytest.mark.ci
+@pytest.mark.usefixtures("osvc_path_tests")
+class TestDriversKeywords:
+    @staticmethod
+    def test_index_loaded_keywords_equal_imported_keywords():
+        from core.objects.svcdict import KEYS, SECTIONS, DATA_SECTIONS
+        groups = SECTIONS + DATA_SECTIONS
+        load_drivers_keywords(KEYS, groups)
+        assert os.path.exists(Env.paths.drivers_keywords)
+        kwstore = svc_kwstore()
+        load_drivers_keywords(kwstore, groups)
+        assert kwstore.dump() == KEYS.dump()
+        assert kwstore.modules == set(reg[4]["name"] for reg in KEYS.drivers)
+
+    @staticmethod
+    def test_stale_index_is_ignored(monkeypatch):
+        from core.objects.svcdict import KEYS
+        write_drivers_keywords("foo", KEYS.drivers)
+        assert read_drivers_keywords("foo") is not None
+        assert read_drivers_keywords(drivers_signature(["fs"])) is None
+        with open(Env.paths.drivers_keywords, "w") as ofile:
+            ofile.write("{")
+        assert read_drivers_keywords("foo") is None
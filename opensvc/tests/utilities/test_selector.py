@@ -0,0 +1,104 @@
+import pytest
+
+import utilities.selector
+from utilities.selector import ObjectSelector, compile_object_selector
+
+PATHS = [
+    "svc1",
+    "svc2",
+    "vol/svc1",
+    "ns1/svc/svc1",
+    "ns1/svc/web1",
+    "ns2/svc/svc1",
+    "ns1/",
+]
+
+ALL_NAMESPACES = ["root", "ns1", "ns2"]
+
+STATUS = {
+    "svc1": {"avail": "up", "nodes": {}},
+    "svc2": {"avail": "down", "nodes": {}},
+    "ns1/svc/svc1": {"avail": "up", "nodes": {}},
+}
+
+
+def select(selector, namespaces=None, kind=None, paths=None):
+    matcher = ObjectSelector(selector, namespaces=namespaces or ALL_NAMESPACES, kind=kind)
+    return matcher.match_many(PATHS if paths is None else paths, object_data=STATUS.get)
+
+
+@pytest.mark.ci
+class TestObjectSelector:
+    @staticmethod
+    @pytest.mark.parametrize("selector, expected", [
+        ["**", PATHS],
+        ["*", ["svc1", "svc2", "ns1/svc/svc1", "ns1/svc/web1", "ns2/svc/svc1"]],
+        ["svc1", ["svc1"]],
+        ["vol/svc1", ["vol/svc1"]],
+        ["ns1/svc/svc1", ["ns1/svc/svc1"]],
+        ["*/svc/svc1", ["svc1", "ns1/svc/svc1", "ns2/svc/svc1"]],
+        ["ns1/**", ["ns1/svc/svc1", "ns1/svc/web1", "ns1/"]],
+        ["**/web*", ["ns1/svc/web1"]],
+        ["ns1/", ["ns1/"]],
+        ["", []],
+        ["a/b/c/d", []],
+    ])
+    def test_globs(selector, expected):
+        assert select(selector) == expected
+
+    @staticmethod
+    def test_or_is_ordered_by_terms_and_deduplicated():
+        assert select("ns1/svc/*,svc*,**/svc1") == [
+            "ns1/svc/svc1", "ns1/svc/web1", "svc1", "svc2", "vol/svc1", "ns2/svc/svc1",
+        ]
+
+    @staticmethod
+    def test_and():
+        assert select("*/svc/*+**/svc1") == ["svc1", "ns1/svc/svc1", "ns2/svc/svc1"]
+        assert select("*/svc/*+!ns1/**") == ["svc1", "svc2", "ns2/svc/svc1"]
+        assert select("svc1+svc2") == []
+
+    @staticmethod
+    def test_namespaces_are_enforced():
+        assert select("**", namespaces=["ns1"]) == ["ns1/svc/svc1", "ns1/svc/web1", "ns1/"]
+        assert select("svc1", namespaces=["ns1"]) == []
+        assert ObjectSelector("**", namespaces=["ns1"], namespace="ns2").match_many(PATHS) == []
+
+    @staticmethod
+    def test_kind_is_enforced():
+        assert select("**", kind="vol") == ["vol/svc1"]
+
+    @staticmethod
+    def test_status_fragments():
+        assert select(".avail=up") == ["svc1", "ns1/svc/svc1"]
+        assert select("!$.avail=up") == ["svc2", "vol/svc1", "ns1/svc/web1", "ns2/svc/svc1", "ns1/"]
+        assert select("*/svc/*+.avail=up") == ["svc1", "ns1/svc/svc1"]
+
+    @staticmethod
+    def test_config_fragment_on_unknown_object_does_not_match():
+        assert select("app=foo") == []
+
+    @staticmethod
+    def test_match():
+        matcher = ObjectSelector("ns1/**,svc2", namespaces=ALL_NAMESPACES)
+        assert matcher.match("ns1/svc/web1")
+        assert matcher.match("svc2")
+        assert not matcher.match("svc1")
+
+
+@pytest.mark.ci
+class TestCompileObjectSelector:
+    @staticmethod
+    def test_compilations_are_reused():
+        matcher = compile_object_selector("svc*", namespaces=set(["root"]))
+        assert compile_object_selector("svc*", namespaces=["root"]) is matcher
+        assert compile_object_selector("svc*", namespaces=["ns1"]) is not matcher
+
+    @staticmethod
+    def test_cache_is_bounded(monkeypatch):
+        monkeypatch.setattr(utilities.selector, "OBJECT_SELECTOR_CACHE_SIZE", 2)
+        first = compile_object_selector("bounded1", namespaces=["root"])
+        compile_object_selector("bounded2", namespaces=["root"])
+        compile_object_selector("bounded3", namespaces=["root"])
+        assert len(utilities.selector.OBJECT_SELECTOR_CACHE) == 2
+        assert compile_object_selector("bounded1", namespaces=["root"]) is not first
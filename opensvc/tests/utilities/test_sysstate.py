@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+
+import utilities.devices.linux
+from utilities.ifconfig.linux import Ifconfig
+from utilities.mounts.linux import Mounts
+from utilities.sysstate import SysState
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw,errors=remount-ro
+23 22 0:21 / /dev/shm rw,nosuid,nodev shared:2 - tmpfs tmpfs rw,size=1024k
+24 22 7:0 / /srv/my\\040data rw,relatime shared:3 - xfs /dev/loop0 rw,attr2
+25 22 8:1 /srv/my\\040data /bind rw,relatime shared:1 - ext4 /dev/sda1 rw
+"""
+
+IP_ADDR = """\
+1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN
+    link/loopback 00:00:00:00:00:00 brd 00:00:00:00:00:00
+    inet 127.0.0.1/8 scope host lo
+2: eth0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc pfifo_fast state UP
+    link/ether 00:23:7d:a1:6f:96 brd ff:ff:ff:ff:ff:ff
+    inet 10.0.0.1/24 brd 10.0.0.255 scope global eth0
+    inet 10.0.0.2/24 brd 10.0.0.255 scope global secondary eth0:1
+"""
+
+
+class Loader(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls
+
+
+@pytest.mark.ci
+class TestSysState:
+    @staticmethod
+    def test_no_cache_outside_a_window():
+        state = SysState()
+        loader = Loader()
+        assert state.get("mounts", loader) == 1
+        assert state.get("mounts", loader) == 2
+
+    @staticmethod
+    def test_shared_in_a_window_until_invalidated():
+        state = SysState()
+        loader = Loader()
+        with state.window():
+            assert state.get("mounts", loader) == 1
+            assert state.get("mounts", loader) == 1
+            state.invalidate()
+            assert state.get("mounts", loader) == 2
+        with state.window():
+            # entries outlive the window, until they expire
+            assert state.get("mounts", loader) == 2
+
+    @staticmethod
+    def test_expiration():
+        state = SysState(ttl=0)
+        loader = Loader()
+        with state.window():
+            assert state.get("mounts", loader) == 1
+            assert state.get("mounts", loader) == 2
+
+    @staticmethod
+    def test_concurrent_callers_load_once():
+        state = SysState()
+        loader = Loader()
+        results = []
+        with state.window():
+            threads = [threading.Thread(target=lambda: results.append(state.get("ifconfig", loader))) for _ in range(8)]
+            for thr in threads:
+                thr.start()
+            for thr in threads:
+                thr.join()
+        assert results == [1] * 8
+
+    @staticmethod
+    def test_invalidation_during_load_is_not_lost():
+        state = SysState()
+
+        def loader():
+            state.invalidate()
+            return "stale"
+
+        with state.window():
+            assert state.get("mounts", loader) == "stale"
+            assert state.get("mounts", lambda: "fresh") == "fresh"
+
+
+@pytest.mark.ci
+class TestMountsIndex:
+    @staticmethod
+    def mounts(tmpdir, monkeypatch):
+        fpath = tmpdir.join("mountinfo")
+        fpath.write(MOUNTINFO)
+        monkeypatch.setattr(Mounts, "parse_mounts", lambda self: self.parse_mountinfo(str(fpath)))
+        monkeypatch.setattr(utilities.devices.linux, "file_to_loop", lambda dev: [])
+        return Mounts()
+
+    def test_parse_mountinfo(self, tmpdir, monkeypatch):
+        mounts = self.mounts(tmpdir, monkeypatch)
+        data = [(m.dev, m.mnt, m.type) for m in mounts]
+        assert data == [
+            ("/dev/sda1", "/", "ext4"),
+            ("tmpfs", "/dev/shm", "tmpfs"),
+            ("/dev/loop0", "/srv/my data", "xfs"),
+            ("/dev/sda1", "/bind", "ext4"),
+        ]
+        assert mounts.has_param("mnt", "/dev/shm").mnt_opt == "rw,nosuid,nodev,size=1024k"
+
+    def test_lookups(self, tmpdir, monkeypatch):
+        mounts = self.mounts(tmpdir, monkeypatch)
+        assert mounts.has_mount("tmpfs", "/dev/shm")
+        assert not mounts.has_mount("tmpfs", "/bind")
+        assert mounts.mount("/dev/loop0", "/srv/my data").type == "xfs"
+        assert mounts.has_param("dev", "/dev/sda1").mnt == "/"
+        assert mounts.has_param("type", "xfs").dev == "/dev/loop0"
+        assert mounts.has_param("mnt", "/nope") is None
+        mounts.sort(reverse=True)
+        assert mounts.has_param("dev", "/dev/sda1").mnt == "/bind"
+
+
+@pytest.mark.ci
+class TestIfconfigIndex:
+    @staticmethod
+    def test_has_param():
+        ifconfig = Ifconfig(ip_out=IP_ADDR)
+        assert ifconfig.has_param("ipaddr", "10.0.0.2").name == "eth0:1"
+        assert ifconfig.has_param("ipaddr", "10.0.0.1").name == "eth0"
+        assert ifconfig.has_param("name", "lo").ipaddr == ["127.0.0.1"]
+        assert ifconfig.has_param("ipaddr", "10.0.0.3") is None
+        ifconfig.add_interface("eth1")
+        assert ifconfig.has_param("name", "eth1").name == "eth1"
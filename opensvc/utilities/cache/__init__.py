@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import time
 from functools import wraps
 
@@ -65,14 +66,19 @@ def cache_fpath(sig):
 def cache_put(fpath, data, log=None):
     if log:
         log.debug("cache PUT: %s" % fpath)
+    # write then rename, so the threads of the same process, which all own
+    # the cache lock, never read a partial file.
+    tmpf = "%s.%d.%d.tmp" % (fpath, os.getpid(), threading.current_thread().ident)
     try:
-        with open(fpath, "w") as f:
+        with open(tmpf, "w") as f:
             json.dump(data, f)
+        os.rename(tmpf, fpath)
     except Exception as e:
-        try:
-            os.unlink(fpath)
-        except:
-            pass
+        for path in (tmpf, fpath):
+            try:
+                os.unlink(path)
+            except:
+                pass
     return data
 
 
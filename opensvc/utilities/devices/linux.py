@@ -5,6 +5,7 @@ import glob
 import time
 
 import core.exceptions as ex
+import utilities.sysstate
 from env import Env
 from core.capabilities import capabilities
 from utilities.cache import cache
@@ -334,9 +335,9 @@ def file_to_loop(f):
     Given a file path, returns the loop device associated. For example,
     /path/to/file => /dev/loop0
     """
-    data = losetup_data()
-    if data:
-        return [_data["name"] for _data in data if _data["back-file"] == f]
+    index = utilities.sysstate.loop_devices()
+    if index:
+        return list(index[0].get(f, []))
 
     out, err, ret = justcall([Env.syspaths.losetup, '-j', f])
     if len(out) == 0:
@@ -360,12 +361,9 @@ def loop_to_file(f):
     Given a loop dev, returns the loop file associated. For example,
     /dev/loop0 => /path/to/file
     """
-    data = losetup_data()
-    if data:
-        for _data in data:
-            if _data["name"] == f:
-                return _data["back-file"]
-        return
+    index = utilities.sysstate.loop_devices()
+    if index:
+        return index[1].get(f)
 
     out, err, ret = justcall([Env.syspaths.losetup, f])
     if len(out) == 0:
@@ -1,5 +1,9 @@
+from __future__ import absolute_import
+
+import hashlib
 import importlib
-import pkgutil
+import json
+import os
 
 from env import Env
 
@@ -100,6 +104,7 @@ def driver_class(mod):
 
 
 def iter_drivers(groups=None):
+    import pkgutil
     groups = groups or []
     for group in groups:
         try:
@@ -118,3 +123,111 @@ def iter_drivers(groups=None):
 def load_drivers(groups=None):
     for mod in iter_drivers(groups):
         pass
+
+
+def drivers_signature(groups=None):
+    """
+    Return a digest of the drivers files of <groups>, used to detect a stale
+    drivers keywords index.
+    """
+    package = importlib.import_module("drivers.resource")
+    head = os.path.dirname(package.__file__)
+    data = [Env.sysname]
+    for group in sorted(groups or []):
+        for root, dirs, files in os.walk(os.path.join(head, group)):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for fname in sorted(files):
+                if not fname.endswith(".py"):
+                    continue
+                fpath = os.path.join(root, fname)
+                try:
+                    st = os.stat(fpath)
+                except OSError:
+                    continue
+                data.append("%s:%s:%d" % (os.path.relpath(fpath, head), st.st_mtime, st.st_size))
+    return hashlib.md5("\n".join(data).encode()).hexdigest()
+
+
+def _encode_kw(data):
+    if isinstance(data, dict):
+        return dict((key, _encode_kw(val)) for key, val in data.items())
+    if isinstance(data, list):
+        return [_encode_kw(val) for val in data]
+    if isinstance(data, tuple):
+        return {"__tuple__": [_encode_kw(val) for val in data]}
+    if isinstance(data, (set, frozenset)):
+        return {"__set__": [_encode_kw(val) for val in sorted(data)]}
+    return data
+
+
+def _decode_kw(data):
+    if isinstance(data, dict):
+        if "__tuple__" in data:
+            return tuple(_decode_kw(val) for val in data["__tuple__"])
+        if "__set__" in data:
+            return set(_decode_kw(val) for val in data["__set__"])
+        return dict((key, _decode_kw(val)) for key, val in data.items())
+    if isinstance(data, list):
+        return [_decode_kw(val) for val in data]
+    return data
+
+
+def read_drivers_keywords(signature):
+    """
+    Return the drivers registrations recorded in the drivers keywords index,
+    or None if the index is absent, corrupted or stale.
+    """
+    try:
+        with open(Env.paths.drivers_keywords, "r") as ofile:
+            data = json.load(ofile)
+    except (IOError, OSError, ValueError):
+        return
+    try:
+        if data["signature"] != signature:
+            return
+        return _decode_kw(data["drivers"])
+    except (KeyError, TypeError):
+        return
+
+
+def write_drivers_keywords(signature, registrations):
+    import tempfile
+    data = {
+        "signature": signature,
+        "drivers": _encode_kw([list(reg) for reg in registrations]),
+    }
+    dpath = os.path.dirname(Env.paths.drivers_keywords)
+    try:
+        if not os.path.exists(dpath):
+            os.makedirs(dpath)
+        fd, tmpf = tempfile.mkstemp(dir=dpath, prefix=".drivers_keywords.")
+        with os.fdopen(fd, "w") as ofile:
+            json.dump(data, ofile)
+        os.rename(tmpf, Env.paths.drivers_keywords)
+    except (IOError, OSError, TypeError, ValueError):
+        # not fatal: the next call rebuilds the index
+        try:
+            os.unlink(tmpf)
+        except Exception:
+            pass
+
+
+def load_drivers_keywords(kwstore, groups=None):
+    """
+    Merge in <kwstore> the keywords of all the <groups> drivers.
+
+    The registrations are read from the drivers keywords index when it is up
+    to date, which avoids importing all the drivers modules. Otherwise all
+    the drivers are imported and the index is rebuilt.
+    """
+    signature = drivers_signature(groups)
+    registrations = read_drivers_keywords(signature)
+    if registrations is None:
+        load_drivers(groups)
+        write_drivers_keywords(signature, kwstore.drivers)
+        return
+    for driver_group, driver_basename, keywords, aliases, kwargs in registrations:
+        if kwargs.get("name") in kwstore.modules:
+            continue
+        kwstore._register_driver(driver_group, driver_basename, keywords=keywords,
+                                 driver_basename_aliases=aliases, **kwargs)
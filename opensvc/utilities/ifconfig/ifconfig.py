@@ -59,7 +59,38 @@ class BaseIfconfig(object):
                 return 1
         return 0
 
+    def param_index(self, param):
+        """
+        Return a dict of the first interface having <param> set to a value,
+        indexed by value. Built on first use, and rebuilt if interfaces
+        were added since.
+        """
+        indexes = self.__dict__.setdefault("_param_indexes", {})
+        try:
+            count, index = indexes[param]
+            if count == len(self.intf):
+                return index
+        except KeyError:
+            pass
+        index = {}
+        for i in self.intf:
+            if not hasattr(i, param):
+                continue
+            values = getattr(i, param)
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                if value not in index:
+                    index[value] = i
+        indexes[param] = (len(self.intf), index)
+        return index
+
     def has_param(self, param, value):
+        try:
+            return self.param_index(param).get(value)
+        except TypeError:
+            # unhashable value
+            pass
         for i in self.intf:
             if not hasattr(i, param):
                 continue
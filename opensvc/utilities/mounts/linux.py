@@ -1,4 +1,5 @@
 import os
+import re
 
 import utilities.devices.linux
 from env import Env
@@ -6,6 +7,15 @@ from utilities.proc import justcall
 from .mounts import BaseMounts, Mount
 
 
+def unescape(word):
+    """
+    Decode the octal escaped characters of a mountinfo field.
+    """
+    if "\\" not in word:
+        return word
+    return re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), word)
+
+
 class Mounts(BaseMounts):
     df_one_cmd = [Env.syspaths.df, '-l']
 
@@ -29,6 +39,32 @@ class Mounts(BaseMounts):
         return False
 
     def parse_mounts(self):
+        try:
+            return self.parse_mountinfo()
+        except (IOError, OSError, ValueError, IndexError):
+            return self.parse_mount_cmd()
+
+    def parse_mountinfo(self, path="/proc/self/mountinfo"):
+        """
+        Parse the kernel mount table, saving the mount command fork.
+
+        36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3 /dev/root rw,errors=continue
+        """
+        with open(path, "r") as ofile:
+            buff = ofile.read()
+        mounts = []
+        for line in buff.splitlines():
+            head, tail = line.split(" - ", 1)
+            head = head.split()
+            tail = tail.split()
+            mnt = unescape(head[4]).replace(" (deleted)", "")
+            dev = unescape(tail[1]).replace(" (deleted)", "")
+            opts = head[5].split(",")
+            opts += [opt for opt in tail[2].split(",") if opt not in opts and opt not in ("rw", "ro")]
+            mounts.append(Mount(dev, mnt, tail[0], ",".join(opts)))
+        return mounts
+
+    def parse_mount_cmd(self):
         out, err, ret = justcall([Env.syspaths.mount])
         out = out.replace(" (deleted)", "")
         mounts = []
@@ -28,16 +28,28 @@ class BaseMounts(object):
             self.mounts = self.parse_mounts()  # pylint: disable=assignment-from-no-return
         except Exception as exc:
             self.mounts = None
+        self.index()
 
     def __iter__(self):
         return iter(self.mounts or [])
 
+    def index(self):
+        """
+        Index the mounts by mount point and by device, in the mounts order.
+        """
+        self.by_mnt = {}
+        self.by_dev = {}
+        for i in self.mounts or []:
+            self.by_mnt.setdefault(i.mnt, []).append(i)
+            self.by_dev.setdefault(i.dev, []).append(i)
+
     def match_mount(self, *args, **kwargs):
         """ OS dependent """
         pass
 
     def mount(self, dev, mnt):
-        for i in self.mounts or []:
+        # all match_mount() implementations require a mount point match
+        for i in self.by_mnt.get(mnt, []):
             if self.match_mount(i, dev, mnt):
                 return i
         return None
@@ -48,12 +60,15 @@ class BaseMounts(object):
     def has_mount(self, dev, mnt):
         if self.mounts is None:
             raise ex.Error("unable to parse mounts")
-        for i in self.mounts:
-            if self.match_mount(i, dev, mnt):
-                return True
-        return False
+        return self.mount(dev, mnt) is not None
 
     def has_param(self, param, value):
+        if param == "mnt":
+            mounts = self.by_mnt.get(value)
+            return mounts[0] if mounts else None
+        if param == "dev":
+            mounts = self.by_dev.get(value)
+            return mounts[0] if mounts else None
         for i in self.mounts or []:
             if getattr(i, param) == value:
                 return i
@@ -65,6 +80,7 @@ class BaseMounts(object):
         if key not in ('mnt', 'dev', 'type'):
             return
         self.mounts.sort(key=lambda x: getattr(x, key), reverse=reverse)
+        self.index()
 
     def get_fpath_dev(self, fpath):
         last = False
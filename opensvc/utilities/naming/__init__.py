@@ -420,6 +420,17 @@ def object_path_glob(pattern, pds=None, namespace=None, kind=None, negate=False)
     pds = pds or []
     if kind:
         pds = [pd for pd in pds if pd["kind"] == kind]
+    _selector = object_path_glob_pattern(pattern, namespace=namespace, kind=kind)
+    if _selector is None:
+        return []
+    return [pd["display"] for pd in pds if negate ^ fnmatch.fnmatch(pd["normalized"], _selector)]
+
+
+def object_path_glob_pattern(pattern, namespace=None, kind=None):
+    """
+    Return the fnmatch pattern to apply to the normalized object paths for
+    the <pattern> selector fragment, or None if the fragment is invalid.
+    """
     l = pattern.split("/")
     n = len(l)
     if n == 3:
@@ -451,7 +462,5 @@ def object_path_glob(pattern, pds=None, namespace=None, kind=None, negate=False)
         else:
             _selector = "%s/%s/%s" % (namespace or "root", kind or "svc", l[0])
     else:
-        return []
-    return [pd["display"] for pd in pds if negate ^ fnmatch.fnmatch(pd["normalized"], _selector)]
-
-
+        return
+    return _selector
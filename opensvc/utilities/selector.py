@@ -1,6 +1,13 @@
+import fnmatch
 import re
+import threading
+from collections import OrderedDict
 
 import core.exceptions as ex
+from utilities.naming import object_path_glob_pattern, path_data
+
+# maximum number of compiled object selectors kept by compile_object_selector()
+OBJECT_SELECTOR_CACHE_SIZE = 256
 
 def selector_value_match(current, op, value):
     if op in ("<", ">", ">=", "<="):
@@ -91,3 +98,181 @@ def selector_parse_op_fragment(elts):
             raise ValueError
     return param, op, value
 
+
+
+class ObjectSelector(object):
+    """
+    A compiled object selector expression.
+
+    The expression is parsed once: the "," separated terms are or'ed, and
+    the "+" separated fragments of a term are and'ed. The fnmatch fragments
+    are compiled to regular expressions, and the jsonpath expressions of the
+    status fragments are parsed once.
+
+    The config and status fragments need the objects data, passed to the
+    match methods as:
+
+    * objects: a dict of the objects, indexed by path
+    * object_data: a function returning the status data of a path
+    """
+    def __init__(self, selector, namespaces=None, namespace=None, kind=None):
+        self.selector = selector
+        self.kind = kind
+        if namespace:
+            if namespaces is not None and namespace not in namespaces:
+                namespaces = set()
+            else:
+                namespaces = set([namespace])
+        elif namespaces is not None:
+            namespaces = set(namespaces)
+        if namespaces is not None and "root" in namespaces:
+            namespaces.add(None)
+        self.namespaces = namespaces
+        self.terms = self.compile(selector, namespace=namespace, kind=kind)
+
+    def __repr__(self):
+        return "<ObjectSelector %s>" % self.selector
+
+    def compile(self, selector, namespace=None, kind=None):
+        if not selector:
+            return []
+        if selector == "**":
+            return [[]]
+        if selector == "*":
+            # all services
+            kind = kind or "svc"
+            return [[lambda pd, objects, object_data: pd["kind"] == kind]]
+        terms = []
+        for term in selector.split(","):
+            fragments = []
+            for fragment in term.split("+"):
+                fragment = self.compile_fragment(fragment, namespace=namespace, kind=kind)
+                if fragment is None:
+                    # never matches
+                    fragments = None
+                    break
+                fragments.append(fragment)
+            if fragments is not None:
+                terms.append(fragments)
+        return terms
+
+    @staticmethod
+    def compile_fragment(s, namespace=None, kind=None):
+        """
+        Return a function(pd, objects, object_data) returning True if the
+        <pd> path data matches the <s> fragment, or None if the fragment
+        never matches.
+        """
+        if not s:
+            return
+
+        negate, s, elts = selector_parse_fragment(s)
+
+        if len(elts) == 1:
+            pattern = object_path_glob_pattern(s, namespace=namespace, kind=kind)
+            if pattern is None:
+                return
+            regex = re.compile(fnmatch.translate(pattern))
+            # an explicit object path
+            explicit = s
+
+            def match_glob(pd, objects, object_data):
+                if pd["display"] == explicit:
+                    return not negate
+                return negate ^ bool(regex.match(pd["normalized"]))
+            return match_glob
+
+        try:
+            param, op, value = selector_parse_op_fragment(elts)
+        except ValueError:
+            return
+
+        if param.startswith("."):
+            param = "$" + param
+
+        if param.startswith("$."):
+            from foreign.jsonpath_ng.ext import parse
+            try:
+                jsonpath_expr = parse(param)
+            except Exception:
+                return
+
+            def match_status(pd, objects, object_data):
+                try:
+                    data = object_data(pd["display"])
+                    for match in jsonpath_expr.find(data):
+                        if selector_value_match(match.value, op, value):
+                            return not negate
+                except Exception:
+                    pass
+                return negate
+            return match_status
+
+        def match_config(pd, objects, object_data):
+            try:
+                svc = objects[pd["display"]]
+            except (KeyError, TypeError):
+                return negate
+            return negate ^ bool(selector_config_match(svc, param, op, value))
+        return match_config
+
+    def allowed(self, pd):
+        if self.namespaces is not None and pd["namespace"] not in self.namespaces:
+            return False
+        if self.kind and pd["kind"] != self.kind:
+            return False
+        return True
+
+    def match(self, path, objects=None, object_data=None):
+        """
+        Return True if <path> is selected.
+        """
+        return len(self.match_many([path], objects=objects, object_data=object_data)) == 1
+
+    def match_many(self, paths, objects=None, object_data=None):
+        """
+        Return the list of selected paths among <paths>, ordered like the
+        selector terms, then like <paths>.
+        """
+        if not self.terms:
+            return []
+        pds = [pd for pd in map(path_data, paths) if self.allowed(pd)]
+        if len(self.terms) == 1:
+            fragments = self.terms[0]
+            return [pd["display"] for pd in pds
+                    if all(fragment(pd, objects, object_data) for fragment in fragments)]
+        selected = []
+        seen = set()
+        for fragments in self.terms:
+            for pd in pds:
+                if pd["display"] in seen:
+                    continue
+                if all(fragment(pd, objects, object_data) for fragment in fragments):
+                    seen.add(pd["display"])
+                    selected.append(pd["display"])
+        return selected
+
+
+OBJECT_SELECTOR_CACHE = OrderedDict()
+OBJECT_SELECTOR_CACHE_LOCK = threading.Lock()
+
+
+def compile_object_selector(selector, namespaces=None, namespace=None, kind=None):
+    """
+    Return the ObjectSelector compiled from <selector>, reusing the last
+    OBJECT_SELECTOR_CACHE_SIZE compilations.
+    """
+    key = (selector, frozenset(namespaces) if namespaces is not None else None, namespace, kind)
+    with OBJECT_SELECTOR_CACHE_LOCK:
+        try:
+            compiled = OBJECT_SELECTOR_CACHE.pop(key)
+            OBJECT_SELECTOR_CACHE[key] = compiled
+            return compiled
+        except KeyError:
+            pass
+    compiled = ObjectSelector(selector, namespaces=namespaces, namespace=namespace, kind=kind)
+    with OBJECT_SELECTOR_CACHE_LOCK:
+        OBJECT_SELECTOR_CACHE[key] = compiled
+        while len(OBJECT_SELECTOR_CACHE) > OBJECT_SELECTOR_CACHE_SIZE:
+            OBJECT_SELECTOR_CACHE.popitem(last=False)
+    return compiled
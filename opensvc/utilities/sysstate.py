@@ -0,0 +1,115 @@
+"""
+A process-wide snapshot of the system state tested by the resource drivers
+status methods: the mounts, the network interfaces and the loop devices.
+
+Inside a status evaluation window, the first caller parses the system
+state, and the other callers, including the resources of the other objects
+evaluated by the same process, reuse the parsed and indexed data until it
+expires or a resource action invalidates it.
+
+Outside a window, the accessors return freshly parsed data, so the actions
+never decide on a stale state.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# The maximum age of a snapshot entry, in seconds.
+SNAPSHOT_TTL = 5
+
+
+class SysState(object):
+    def __init__(self, ttl=SNAPSHOT_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.locks = {}
+        self.data = {}
+        self.windows = 0
+        self.gen = 0
+
+    @contextmanager
+    def window(self):
+        with self.lock:
+            self.windows += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.windows -= 1
+
+    def get(self, name, loader):
+        """
+        Return the <name> entry of the snapshot, calling <loader> to set it
+        if missing or expired.
+        """
+        if not self.windows:
+            return loader()
+        with self.lock:
+            lock = self.locks.setdefault(name, threading.Lock())
+        # concurrent callers wait for the first one to load the entry
+        with lock:
+            try:
+                updated, value = self.data[name]
+                if time.time() - updated < self.ttl:
+                    return value
+            except KeyError:
+                pass
+            gen = self.gen
+            updated = time.time()
+            value = loader()
+            with self.lock:
+                if gen == self.gen:
+                    self.data[name] = (updated, value)
+            return value
+
+    def invalidate(self, *names):
+        """
+        Drop the <names> entries, or all entries if <names> is empty.
+        """
+        with self.lock:
+            self.gen += 1
+            if not names:
+                self.data.clear()
+            for name in names:
+                self.data.pop(name, None)
+
+
+STATE = SysState()
+
+
+def window():
+    return STATE.window()
+
+
+def invalidate(*names):
+    STATE.invalidate(*names)
+
+
+def mounts():
+    from utilities.mounts import Mounts
+    return STATE.get("mounts", Mounts)
+
+
+def ifconfig():
+    import utilities.ifconfig
+    return STATE.get("ifconfig", utilities.ifconfig.Ifconfig)
+
+
+def loop_devices():
+    """
+    Return the linux loop devices as a tuple of dicts, the list of loop
+    devices indexed by back file and the back file indexed by loop device,
+    or None if losetup reports no loop device in json format.
+    """
+    def load():
+        from utilities.devices.linux import losetup_data
+        data = losetup_data()
+        if not data:
+            return
+        by_file = {}
+        by_dev = {}
+        for _data in data:
+            by_file.setdefault(_data["back-file"], []).append(_data["name"])
+            by_dev[_data["name"]] = _data["back-file"]
+        return by_file, by_dev
+    return STATE.get("loop_devices", load)